@@ -0,0 +1,149 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""
+Prueba de carga del pipeline de review contra el stub local, sin red.
+
+    python benchmarks/load_test.py --files 300 --workers 4 --rpm 600 --burst-every 50 --malformed 0.02
+
+Reporta archivos/min, latencia por archivo (p50/p99) y reintentos.
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from stub_server import start_stub, add_stub_arguments, config_from_args
+from synthetic_repo import generate_repo
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def estados_finales(script, repo):
+    """
+    {estado: archivos} según la cola del job al terminar. Los contadores del
+    runner son por intento: un archivo que falla y se revisa en el reintento
+    cuenta en ambos, la cola solo guarda su estado final.
+    """
+    manifest = script.ReviewManifest(os.path.join(repo, "review"))
+    try:
+        return script.ReviewJob(manifest).resumen()
+    finally:
+        manifest.close()
+
+
+def run_load_test(args):
+    server = start_stub(config_from_args(args))
+    with tempfile.TemporaryDirectory() as tmp:
+        # Las URLs y el ledger se leen al importar script, así que van antes del import
+        os.environ.update({
+            "GEMINI_BASE_URL": f"{server.base_url}/v1beta",
+            "GITHUB_API_URL": server.base_url,
+            "GEMINI_API_KEY": "stub",
+            "GITHUB_TOKEN": "stub",
+            "OCTO_HOME": os.path.join(tmp, "octo")
+        })
+        import script
+        script.DAILY_LIMIT = 10 ** 9
+
+        repo = os.path.join(tmp, "repo")
+        generate_repo(repo, files=args.files, small_ratio=args.small_ratio,
+                      large_lines=args.large_lines, seed=args.seed or 0)
+
+        cwd = os.getcwd()
+        os.chdir(tmp)  # crear_branch_documentacion ejecuta git en el directorio actual
+        salida = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        try:
+            with salida:
+                inicio = time.monotonic()
+                runner = script.code_review_gemini(
+                    repo, "bench", "https://github.com/bench/synthetic.git", args.stack,
+                    workers=args.workers, rpm=args.rpm, chunk_tokens=args.chunk_tokens,
+                    batch_tokens=args.batch_tokens, stream=args.stream
+                )
+                elapsed = time.monotonic() - inicio
+        finally:
+            os.chdir(cwd)
+        estados = estados_finales(script, repo)
+    server.shutdown()
+
+    reviewed = estados.get("done", 0)
+    return {
+        "files": args.files,
+        "reviewed": reviewed,
+        "failed": estados.get("failed", 0),
+        "pending": estados.get("pending", 0) + estados.get("in_flight", 0),
+        "elapsed_s": round(elapsed, 3),
+        "files_per_min": round(reviewed / elapsed * 60, 1) if elapsed else 0.0,
+        "latency_p50_s": round(percentile(runner.latencias if runner else [], 50), 3),
+        "latency_p99_s": round(percentile(runner.latencias if runner else [], 99), 3),
+        "retries": runner.retries if runner else 0,
+        "ttft_p50_s": round(percentile(runner.ttfts if runner else [], 50), 3),
+        "stub": dict(server.counters)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="🏋️ Prueba de carga del review contra el stub local")
+    parser.add_argument("--files", type=int, default=200, help="Archivos .py del repo sintético")
+    parser.add_argument("--small-ratio", type=float, default=0.7, help="Proporción de archivos pequeños")
+    parser.add_argument("--large-lines", type=int, default=300, help="Líneas máximas de los archivos grandes")
+    parser.add_argument("--stack", default="django")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--chunk-tokens", type=int, default=2000)
+    parser.add_argument("--batch-tokens", type=int, default=2000)
+    parser.add_argument("--stream", action="store_true", help="Usar streamGenerateContent")
+    parser.add_argument("--json", type=str, help="Guardar resultados en este archivo JSON")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida del review")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    results = run_load_test(args)
+    print("\n🏋️ Resultados de la prueba de carga:")
+    print(f"   📄 Archivos revisados: {results['reviewed']}/{results['files']} ({results['failed']} con error, "
+          f"{results['pending']} pendientes)")
+    print(f"   ⏱️ Tiempo total: {results['elapsed_s']}s")
+    print(f"   🚀 Archivos/min: {results['files_per_min']}")
+    print(f"   📈 Latencia por archivo: p50 {results['latency_p50_s']}s | p99 {results['latency_p99_s']}s")
+    print(f"   🔁 Reintentos por 429: {results['retries']}")
+    if args.stream:
+        print(f"   ⚡ Time-to-first-token p50: {results['ttft_p50_s']}s")
+    print(f"   🧪 Stub: {results['stub']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"   💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
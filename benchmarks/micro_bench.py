@@ -0,0 +1,192 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmarks de las etapas locales del review (CPU e I/O, sin red)
+sobre repos sintéticos de distintas formas.
+
+    python benchmarks/micro_bench.py --shape all --repeat 5 --json bench.json
+    python benchmarks/micro_bench.py --shape all --baseline bench.json --tolerance 0.25
+
+Mide el walk, detectar_stacks, count_python_files, hash_code,
+aplicar_filtros_stack y find_secrets_and_update_env. Los archivos se acaban
+de generar, así que las mediciones son con la page cache caliente. Con
+--baseline compara las medianas y sale con código 1 si alguna empeoró.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_repo import SHAPES, generate_shaped_repo
+
+STAGES = ("walk", "detectar_stacks", "count_python_files", "hash_code", "aplicar_filtros_stack",
+          "find_secrets_and_update_env")
+NOISE_FLOOR_S = 0.002  # diferencias menores que esto no cuentan como regresión
+
+
+def medir(fn, repeat):
+    """Ejecuta fn `repeat` veces (más una de calentamiento) y resume los tiempos"""
+    fn()
+    tiempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return {
+        "median_s": round(statistics.median(tiempos), 6),
+        "min_s": round(min(tiempos), 6),
+        "max_s": round(max(tiempos), 6),
+        "runs": repeat
+    }
+
+
+def bench_shape(script, repo, report_dir, repeat, workers):
+    index = script.RepoIndex(repo)
+    stacks = script.detectar_stacks(repo, index)
+    python = []
+    for entry in index.python_files():
+        with open(entry.path, encoding="utf-8") as f:
+            python.append((f.read(), stacks.stack_for(entry.rel_path)))
+
+    env_path = os.path.join(repo, ".env")
+    report_path = os.path.join(report_dir, "secrets.json")
+
+    def secretos():
+        script.find_secrets_and_update_env(repo, index, report_path, workers)
+        # .env se reescribe en cada corrida para que todas midan lo mismo
+        if os.path.exists(env_path):
+            os.remove(env_path)
+
+    etapas = {
+        "walk": lambda: script.RepoIndex(repo),
+        "detectar_stacks": lambda: script.detectar_stacks(repo, index),
+        # Con el índice ya construido, como lo usa code_review_gemini: el walk se mide aparte
+        "count_python_files": lambda: script.count_python_files(repo, index),
+        "hash_code": lambda: [script.hash_code(code) for code, _ in python],
+        "aplicar_filtros_stack": lambda: [script.aplicar_filtros_stack(code, stack) for code, stack in python],
+        "find_secrets_and_update_env": secretos,
+    }
+    resultados = {name: medir(etapas[name], repeat) for name in STAGES}
+    return {
+        "indexed_files": len(index.files),
+        "python_files": len(python),
+        "python_bytes": sum(len(code.encode("utf-8")) for code, _ in python),
+        "stack": stacks.nombre(),
+        "stages": resultados
+    }
+
+
+def run_benchmarks(args):
+    shapes = list(SHAPES) if args.shape == "all" else [args.shape]
+    with tempfile.TemporaryDirectory() as tmp:
+        # script lee OCTO_HOME al importarse; la cache de GitHub no debe tocar la del usuario
+        os.environ["OCTO_HOME"] = os.path.join(tmp, "octo")
+        import script
+
+        resultados = {}
+        for shape in shapes:
+            repo = os.path.join(tmp, shape)
+            generados = generate_shaped_repo(repo, shape, args.scale, args.seed)
+            salida = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with salida:
+                resultados[shape] = bench_shape(script, repo, tmp, args.repeat, args.workers)
+            resultados[shape]["generated"] = generados
+            print(f"✅ {shape}: {resultados[shape]['indexed_files']} archivos indexados")
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "shapes": resultados
+    }
+
+
+def comparar(results, baseline, tolerance):
+    """Etapas cuya mediana supera la del baseline en más de `tolerance` (y del piso de ruido)"""
+    regresiones = []
+    for shape, data in results["shapes"].items():
+        previo = baseline.get("shapes", {}).get(shape, {}).get("stages", {})
+        for name, stat in data["stages"].items():
+            if name not in previo:
+                continue
+            antes, ahora = previo[name]["median_s"], stat["median_s"]
+            if ahora - antes > NOISE_FLOOR_S and ahora > antes * (1 + tolerance):
+                regresiones.append((shape, name, antes, ahora))
+    return regresiones
+
+
+def imprimir(results):
+    print(f"\n⏱️ Micro-benchmarks (mediana de {results['repeat']} corridas, escala {results['scale']}):")
+    for shape, data in results["shapes"].items():
+        print(f"\n   📁 {shape}: {data['indexed_files']} archivos indexados, {data['python_files']} .py "
+              f"({data['python_bytes'] / 1024 / 1024:.1f} MiB), stack {data['stack']}")
+        for name, stat in data["stages"].items():
+            print(f"      {name:<30}{stat['median_s'] * 1000:>10.2f} ms"
+                  f"   (mín {stat['min_s'] * 1000:.2f}, máx {stat['max_s'] * 1000:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="⏱️ Micro-benchmarks de las etapas locales sobre repos sintéticos")
+    parser.add_argument("--shape", choices=["all"] + list(SHAPES), default="all", help="Forma del repo sintético")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplica la cantidad de archivos de cada forma")
+    parser.add_argument("--repeat", type=int, default=5, help="Corridas medidas por etapa")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int,
+                        help="Procesos del pool del escaneo de secretos (por defecto uno por CPU)")
+    parser.add_argument("--json", type=str, help="Guardar resultados en este archivo JSON")
+    parser.add_argument("--baseline", type=str, help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Aumento relativo de la mediana que cuenta como regresión")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de las funciones medidas")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    imprimir(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regresiones = comparar(results, baseline, args.tolerance)
+        if regresiones:
+            print(f"\n❌ {len(regresiones)} etapas más lentas que el baseline (tolerancia {args.tolerance:.0%}):")
+            for shape, name, antes, ahora in regresiones:
+                print(f"   {shape}/{name}: {antes * 1000:.2f} ms → {ahora * 1000:.2f} ms")
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones respecto de {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
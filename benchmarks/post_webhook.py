@@ -0,0 +1,78 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""
+Envía un payload de webhook grabado, firmado como lo haría GitHub, al
+servidor de --action serve. Sirve para probarlo de punta a punta sin GitHub.
+
+    python benchmarks/post_webhook.py benchmarks/payloads/push.json --event push \\
+        --secret s3cr3t --clone-url /ruta/a/un/repo --after HEAD --before HEAD~1
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_server import firma, SIGNATURE_HEADER, WEBHOOK_PATH
+
+
+def resolver(repo, ref):
+    """SHA de un ref del repo local (HEAD, HEAD~1...)"""
+    return subprocess.run(["git", "-C", repo, "rev-parse", ref], check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="📮 Enviar un webhook grabado a --action serve")
+    parser.add_argument("payload", help="JSON del payload (p. ej. benchmarks/payloads/push.json)")
+    parser.add_argument("--event", default="push", help="Header X-GitHub-Event")
+    parser.add_argument("--url", default=f"http://127.0.0.1:8080{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=os.getenv("GITHUB_WEBHOOK_SECRET", ""))
+    parser.add_argument("--clone-url", help="Reemplaza repository.clone_url (p. ej. un repo local)")
+    parser.add_argument("--after", help="Ref del repo local para el sha nuevo (after / head del PR)")
+    parser.add_argument("--before", help="Ref del repo local para el sha base (before / base del PR)")
+    args = parser.parse_args()
+
+    with open(args.payload, encoding="utf-8") as f:
+        payload = json.load(f)
+    if args.clone_url:
+        payload["repository"]["clone_url"] = args.clone_url
+    pr = payload.get("pull_request")
+    for ref, key, pr_key in ((args.after, "after", "head"), (args.before, "before", "base")):
+        if not ref:
+            continue
+        sha = resolver(args.clone_url, ref) if args.clone_url else ref
+        if pr:
+            pr[pr_key]["sha"] = sha
+        else:
+            payload[key] = sha
+
+    body = json.dumps(payload).encode()
+    response = requests.post(args.url, data=body, timeout=30, headers={
+        "Content-Type": "application/json",
+        "X-GitHub-Event": args.event,
+        SIGNATURE_HEADER: firma(args.secret, body)
+    })
+    print(f"{response.status_code} {response.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""
+Compara el RedactionEngine con el filtro original (un re.sub por regla con
+el patrón como string) sobre los archivos de un repo sintético, por stack.
+
+    python benchmarks/redaction_bench.py --shape mixed --repeat 5 --json redaction.json
+
+Verifica que ambos produzcan el mismo texto y sale con código 1 si el
+motor es más lento que la referencia en algún stack.
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_repo import SHAPES, generate_shaped_repo
+from micro_bench import medir
+
+EXTENSIONS = (".py", ".js", ".yaml", ".yml", ".json")
+
+
+def filtros_por_regla(codigo, rules):
+    """Implementación anterior al RedactionEngine, como referencia"""
+    for patron, reemplazo in rules:
+        codigo = re.sub(patron, reemplazo, codigo, flags=re.IGNORECASE | re.MULTILINE)
+    return codigo
+
+
+def run_benchmark(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["OCTO_HOME"] = os.path.join(tmp, "octo")
+        import script
+
+        repo = os.path.join(tmp, "repo")
+        generate_shaped_repo(repo, args.shape, args.scale, args.seed)
+        textos = []
+        for entry in script.RepoIndex(repo).with_ext(*EXTENSIONS):
+            with open(entry.path, encoding="utf-8") as f:
+                textos.append(f.read())
+
+    resultados = {}
+    for stack, rules in script.FILTERS_BY_STACK.items():
+        engine = script.RedactionEngine(rules)
+        iguales = all(engine.redact(t)[0] == filtros_por_regla(t, rules) for t in textos)
+        referencia = medir(lambda: [filtros_por_regla(t, rules) for t in textos], args.repeat)
+        motor = medir(lambda: [engine.redact(t) for t in textos], args.repeat)
+        resultados[stack] = {
+            "same_output": iguales,
+            "per_rule": referencia,
+            "engine": motor,
+            "speedup": round(referencia["median_s"] / motor["median_s"], 3) if motor["median_s"] else None
+        }
+    return {
+        "shape": args.shape,
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "files": len(textos),
+        "bytes": sum(len(t.encode("utf-8")) for t in textos),
+        "stacks": resultados
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="🔒 RedactionEngine contra el filtro regla por regla")
+    parser.add_argument("--shape", choices=list(SHAPES), default="mixed", help="Forma del repo sintético")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, help="Guardar resultados en este archivo JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    print(f"\n🔒 Redacción de {results['files']} archivos ({results['bytes'] / 1024 / 1024:.1f} MiB), "
+          f"mediana de {results['repeat']} corridas:")
+    fallas = []
+    for stack, data in results["stacks"].items():
+        print(f"   {stack:<10} regla por regla {data['per_rule']['median_s'] * 1000:>9.2f} ms   "
+              f"motor {data['engine']['median_s'] * 1000:>9.2f} ms   ×{data['speedup']}"
+              f"{'' if data['same_output'] else '   ❌ salida distinta'}")
+        if not data["same_output"] or data["engine"]["median_s"] > data["per_rule"]["median_s"]:
+            fallas.append(stack)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json}")
+    if fallas:
+        print(f"❌ El motor no mejora a la referencia en: {', '.join(fallas)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
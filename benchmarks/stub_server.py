@@ -0,0 +1,303 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""
+Servidor HTTP local que imita a Gemini y GitHub para pruebas de carga offline.
+
+Emula generateContent, streamGenerateContent (SSE), /repos/{owner}/{repo}/statuses/{sha},
+/repos/{owner}/{repo}/commits/{branch} y los listados paginados /users/{user}/repos
+y /search/issues (con ETag y 304), con latencia configurable, ráfagas de 429 con
+retryDelay y respuestas malformadas o sin candidatos.
+
+    python benchmarks/stub_server.py --port 8765 --latency 0.3 --burst-every 40 --burst-size 3
+    GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta GITHUB_API_URL=http://127.0.0.1:8765 python script.py ...
+"""
+
+import re
+import json
+import hashlib
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+GENERATE_RE = re.compile(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)(?:\?alt=sse)?$")
+STATUS_RE = re.compile(r"^/repos/[^/]+/[^/]+/statuses/[0-9a-fA-F]+$")
+COMMIT_RE = re.compile(r"^/repos/[^/]+/[^/]+/commits/[^/]+$")
+REPOS_RE = re.compile(r"^/users/([^/]+)/repos$")
+SEARCH_RE = re.compile(r"^/search/issues$")
+ARCHIVO_RE = re.compile(r"^=== ARCHIVO: (.+?) ===$", re.MULTILINE)
+STUB_SHA = "0" * 40
+STREAM_PIECES = 4  # eventos SSE por respuesta en streamGenerateContent
+
+
+class StubConfig:
+    """Comportamiento del stub; todos los tiempos en segundos"""
+    def __init__(self, latency=0.2, jitter=0.1, burst_every=0, burst_size=3, retry_delay=1,
+                 malformed=0.0, empty=0.0, seed=None, repos=250, pulls=30):
+        self.latency = latency
+        self.jitter = jitter
+        self.burst_every = burst_every  # cada cuántos requests empieza una ráfaga de 429 (0 = nunca)
+        self.burst_size = burst_size
+        self.retry_delay = retry_delay
+        self.malformed = malformed  # probabilidad de JSON inválido
+        self.empty = empty  # probabilidad de candidates vacío
+        self.random = random.Random(seed)
+        self.repos = repos  # repos del usuario en /users/{user}/repos
+        self.pulls = pulls  # resultados de /search/issues
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.counters = {"generate": 0, "rate_limited": 0, "malformed": 0, "empty": 0, "statuses": 0, "commits": 0,
+                         "listings": 0, "not_modified": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+            return self.counters[key]
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, raw=None, headers=None):
+        payload = raw if raw is not None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", "4999")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        if COMMIT_RE.match(self.path):
+            self.server.count("commits")
+            return self._send_json(200, {"sha": STUB_SHA})
+        url = urlsplit(self.path)
+        match = REPOS_RE.match(url.path)
+        if match:
+            user = match.group(1)
+            repos = [{"name": f"repo-{i}", "forks_count": i % 4, "stargazers_count": i, "language": "Python",
+                      "html_url": f"https://github.com/{user}/repo-{i}"} for i in range(self.server.config.repos)]
+            return self._listing(url, repos)
+        if SEARCH_RE.match(url.path):
+            pulls = [{"title": f"PR {i}", "repository_url": f"https://api.github.com/repos/stub/repo-{i % 5}",
+                      "created_at": "2025-01-01T00:00:00Z", "user": {"login": "stub"},
+                      "html_url": f"https://github.com/stub/repo-{i % 5}/pull/{i}"}
+                     for i in range(self.server.config.pulls)]
+            return self._listing(url, pulls, search=True)
+        self._send_json(404, {"message": "Not Found"})
+
+    def _listing(self, url, items, search=False):
+        """Página de un listado con Link rel=next/last, ETag y 304 si If-None-Match coincide"""
+        self.server.count("listings")
+        query = parse_qs(url.query)
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        last = max(1, -(-len(items) // per_page))
+        chunk = items[(page - 1) * per_page:page * per_page]
+        body = {"total_count": len(items), "items": chunk} if search else chunk
+        payload = json.dumps(body).encode()
+        etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        base = f"{self.server.base_url}{url.path}?" + "&".join(
+            f"{k}={v[0]}" for k, v in query.items() if k != "page")
+        links = []
+        if page < last:
+            links.append(f'<{base}&page={page + 1}>; rel="next"')
+            links.append(f'<{base}&page={last}>; rel="last"')
+        headers = {"ETag": etag}
+        if links:
+            headers["Link"] = ", ".join(links)
+        self._send_json(200, None, raw=payload, headers=headers)
+
+    def do_POST(self):
+        body = self._read_json()
+        if STATUS_RE.match(self.path):
+            self.server.count("statuses")
+            return self._send_json(201, {"state": body.get("state")})
+        match = GENERATE_RE.match(self.path)
+        if match:
+            return self._generate(body, match.group(1), stream=match.group(2) == "streamGenerateContent")
+        self._send_json(404, {"message": "Not Found"})
+
+    def _prompt(self, body):
+        try:
+            return body["contents"][0]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            return ""
+
+    def _in_burst(self, n):
+        config = self.server.config
+        return bool(config.burst_every) and (n - 1) % config.burst_every < config.burst_size
+
+    def _send_sse(self, response):
+        """Envía la respuesta en STREAM_PIECES eventos, repartiendo la latencia entre ellos"""
+        text = response["candidates"][0]["content"]["parts"][0]["text"]
+        size = max(1, -(-len(text) // STREAM_PIECES))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pausa = self.server.config.latency / max(1, len(pieces))
+        for i, piece in enumerate(pieces):
+            evento = {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}}],
+                      "modelVersion": response["modelVersion"], "responseId": response["responseId"]}
+            if i == len(pieces) - 1:
+                evento["candidates"][0]["finishReason"] = "STOP"
+                evento["usageMetadata"] = response["usageMetadata"]
+            self.wfile.write(f"data: {json.dumps(evento)}\r\n\r\n".encode())
+            self.wfile.flush()
+            time.sleep(pausa)
+
+    def _generate(self, body, model, stream=False):
+        config = self.server.config
+        n = self.server.count("generate")
+        if self._in_burst(n):
+            self.server.count("rate_limited")
+            return self._send_json(429, {
+                "error": {
+                    "code": 429,
+                    "status": "RESOURCE_EXHAUSTED",
+                    "details": [{
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": f"{config.retry_delay}s"
+                    }]
+                }
+            })
+
+        if not stream:
+            time.sleep(max(0.0, config.latency + config.random.uniform(-config.jitter, config.jitter)))
+
+        roll = config.random.random()
+        if roll < config.malformed:
+            self.server.count("malformed")
+            return self._send_json(200, None, raw=b'{"candidates": [')
+        if roll < config.malformed + config.empty:
+            self.server.count("empty")
+            return self._send_json(200, {"candidates": [], "modelVersion": model})
+
+        prompt = self._prompt(body)
+        if stream:
+            return self._send_sse(self._respuesta(prompt, model, n))
+        self._send_json(200, self._respuesta(prompt, model, n))
+
+    def _respuesta(self, prompt, model, n):
+        archivos = ARCHIVO_RE.findall(prompt)
+        if archivos:
+            text = "\n\n".join(f"=== REVIEW: {path} ===\n{review_sintetico(path)}" for path in archivos)
+        else:
+            text = review_sintetico(f"request {n}")
+        prompt_tokens = len(prompt) // 4 + 1
+        output_tokens = len(text) // 4 + 1
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens
+            },
+            "modelVersion": model,
+            "responseId": f"stub-{n}"
+        }
+
+
+def review_sintetico(nombre):
+    return (f"1. **Resumen**: código de prueba ({nombre}).\n"
+            "2. **Funcionalidades principales**: ninguna relevante.\n"
+            "3. **Arquitectura y patrones**: N/A.\n"
+            "4. **Posibles mejoras**: ninguna.\n"
+            "5. **Problemas de seguridad**: ninguno.\n"
+            "6. **Recomendaciones**: ninguna.")
+
+
+def start_stub(config=None, host="127.0.0.1", port=0):
+    """Levanta el stub en un hilo daemon; devuelve el servidor (server.base_url, server.counters)"""
+    server = StubServer((host, port), config or StubConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia media por request (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variación máxima de la latencia (s)")
+    parser.add_argument("--burst-every", type=int, default=0, help="Cada cuántos requests empieza una ráfaga de 429")
+    parser.add_argument("--burst-size", type=int, default=3, help="Cantidad de 429 seguidos por ráfaga")
+    parser.add_argument("--retry-delay", type=int, default=1, help="retryDelay anunciado en los 429 (s)")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Probabilidad de JSON inválido")
+    parser.add_argument("--empty", type=float, default=0.0, help="Probabilidad de candidates vacío")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para respuestas reproducibles")
+
+
+def config_from_args(args):
+    return StubConfig(args.latency, args.jitter, args.burst_every, args.burst_size, args.retry_delay,
+                      args.malformed, args.empty, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="🧪 Stub local de Gemini y GitHub para OctoAutomator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), config_from_args(args))
+    print(f"🧪 Stub escuchando en {server.base_url}")
+    print(f"   GEMINI_BASE_URL={server.base_url}/v1beta")
+    print(f"   GITHUB_API_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {server.counters}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Generador de repositorios sintéticos para benchmarks"""
+
+import os
+import random
+
+# Formas de repo para benchmarks/micro_bench.py; cada cantidad se multiplica por --scale
+SHAPES = {
+    "small-py": {"py_files": 2000, "small_ratio": 0.95, "large_lines": 120},
+    "node-modules": {"py_files": 50, "node_modules_depth": 6, "node_modules_fanout": 3, "node_modules_files": 8},
+    "generated": {"py_files": 100, "generated_files": 4, "generated_lines": 50000},
+    "api-specs": {"py_files": 100, "api_specs": 40, "spec_endpoints": 300},
+    "mixed": {"py_files": 500, "node_modules_depth": 4, "node_modules_fanout": 3, "node_modules_files": 5,
+              "generated_files": 1, "generated_lines": 20000, "api_specs": 10, "spec_endpoints": 100},
+}
+
+
+def funcion_sintetica(nombre, lineas, rng):
+    cuerpo = [f"def {nombre}(valor, factor={rng.randint(1, 9)}):",
+              f'    """Función sintética {nombre}"""',
+              "    total = 0"]
+    for i in range(max(1, lineas - 4)):
+        cuerpo.append(f"    total += (valor * factor + {i}) % {rng.randint(2, 97)}")
+    cuerpo.append("    return total")
+    return "\n".join(cuerpo) + "\n"
+
+
+def modulo_sintetico(lineas, rng):
+    """Módulo Python válido con funciones de ~20 líneas hasta llegar a `lineas`"""
+    partes = ["import os\n", "import json\n\n", f"CONSTANTE = {rng.randint(0, 1000)}\n\n"]
+    escritas = 4
+    n = 0
+    while escritas < lineas:
+        tam = min(20, max(5, lineas - escritas))
+        partes.append(funcion_sintetica(f"funcion_{n}", tam, rng) + "\n")
+        escritas += tam + 1
+        n += 1
+    return "".join(partes)
+
+
+def generate_repo(path, files=200, small_ratio=0.7, small_lines=8, large_lines=300, packages=10, seed=0):
+    """
+    Crea un repo con `files` archivos .py repartidos en `packages` paquetes.
+    small_ratio de ellos son pequeños (small_lines); el resto llega a large_lines.
+    Devuelve la lista de paths creados.
+    """
+    rng = random.Random(seed)
+    creados = []
+    for i in range(files):
+        pkg = os.path.join(path, f"pkg_{i % packages}")
+        os.makedirs(pkg, exist_ok=True)
+        lineas = small_lines if rng.random() < small_ratio else rng.randint(large_lines // 2, large_lines)
+        filepath = os.path.join(pkg, f"mod_{i}.py")
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(modulo_sintetico(lineas, rng))
+        creados.append(filepath)
+    return creados
+
+
+def generate_django_markers(path, rng):
+    """manage.py, settings con credenciales de ejemplo y requirements, como un proyecto Django real"""
+    project = os.path.join(path, "config")
+    os.makedirs(project, exist_ok=True)
+    archivos = {
+        os.path.join(path, "manage.py"): "import os\nimport sys\n\nos.environ.setdefault('DJANGO_SETTINGS_MODULE', "
+                                         "'config.settings')\n",
+        os.path.join(path, "requirements.txt"): "django==4.2\nrequests\n",
+        os.path.join(project, "settings.py"): (
+            f"SECRET_KEY = 'django-insecure-{rng.getrandbits(64):x}'\nDEBUG = True\n"
+            "DATABASES = {'default': {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'app',\n"
+            f"    'USER': 'app', 'PASSWORD': 'pw{rng.randint(0, 9999)}', 'HOST': 'db', 'PORT': '5432'}}}}\n"
+            f"API_KEY = 'sk_{rng.getrandbits(64):x}'\n"
+        ),
+    }
+    for filepath, contenido in archivos.items():
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(contenido)
+    return list(archivos)
+
+
+def generate_node_modules(path, depth=6, fanout=3, files_per_dir=8, seed=0):
+    """
+    Árbol node_modules/ con `fanout` paquetes por nivel hasta `depth` niveles
+    (dependencias anidadas como las de npm). El walk debería podarlo entero.
+    """
+    rng = random.Random(seed)
+    creados = []
+    pendientes = [(os.path.join(path, "node_modules"), 0)]
+    while pendientes:
+        actual, nivel = pendientes.pop()
+        for p in range(fanout):
+            pkg = os.path.join(actual, f"dep_{nivel}_{p}")
+            os.makedirs(pkg, exist_ok=True)
+            with open(os.path.join(pkg, "package.json"), "w", encoding="utf-8") as f:
+                f.write(f'{{"name": "dep_{nivel}_{p}", "version": "1.{rng.randint(0, 20)}.0", "main": "index.js"}}\n')
+            for i in range(files_per_dir):
+                filepath = os.path.join(pkg, f"lib_{i}.js")
+                with open(filepath, "w", encoding="utf-8") as f:
+                    f.write(f"module.exports = function lib{i}(x) {{ return x * {rng.randint(1, 99)}; }};\n")
+                creados.append(filepath)
+            if nivel + 1 < depth:
+                pendientes.append((os.path.join(pkg, "node_modules"), nivel + 1))
+    return creados
+
+
+def generate_generated_files(path, count=4, lines=50000, seed=0):
+    """Módulos enormes como los de protoc u OpenAPI Generator: tablas y clases repetitivas"""
+    rng = random.Random(seed)
+    gen_dir = os.path.join(path, "generated")
+    os.makedirs(gen_dir, exist_ok=True)
+    creados = []
+    for n in range(count):
+        partes = ["# -*- coding: utf-8 -*-\n", "# Generated by the protocol buffer compiler.  DO NOT EDIT!\n",
+                  "DESCRIPTOR_TABLE = {\n"]
+        escritas = 3
+        mitad = lines // 2
+        while escritas < mitad:
+            tipo, byte = rng.randint(0, 18), rng.randint(16, 255)
+            partes.append(f"    'Field{escritas}': ({escritas}, {tipo}, b'\\x{byte:02x}'),\n")
+            escritas += 1
+        partes.append("}\n\n")
+        k = 0
+        while escritas < lines:
+            partes.append(f"class Message{k}(object):\n    __slots__ = ('field_{k}',)\n\n"
+                          f"    def __init__(self, field_{k}=None):\n        self.field_{k} = field_{k}\n\n")
+            escritas += 6
+            k += 1
+        filepath = os.path.join(gen_dir, f"service_{n}_pb2.py")
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write("".join(partes))
+        creados.append(filepath)
+    return creados
+
+
+def generate_api_specs(path, count=40, endpoints=300, seed=0):
+    """Especificaciones OpenAPI en YAML con `endpoints` rutas cada una"""
+    rng = random.Random(seed)
+    spec_dir = os.path.join(path, "api", "specs")
+    os.makedirs(spec_dir, exist_ok=True)
+    creados = []
+    for n in range(count):
+        partes = ["openapi: 3.0.3\n", f"info:\n  title: Servicio {n}\n  version: 1.{n}.0\n", "paths:\n"]
+        for e in range(endpoints):
+            recurso = f"recurso{e}"
+            partes.append(
+                f"  /v1/{recurso}/{{id}}:\n"
+                f"    get:\n      operationId: get_{recurso}\n"
+                f"      parameters:\n        - name: id\n          in: path\n          required: true\n"
+                f"          schema:\n            type: integer\n"
+                f"      responses:\n        '200':\n          description: OK {rng.randint(0, 999)}\n"
+            )
+        filepath = os.path.join(spec_dir, f"service_{n}.yaml")
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write("".join(partes))
+        creados.append(filepath)
+    return creados
+
+
+def generate_shaped_repo(path, shape="mixed", scale=1.0, seed=0):
+    """
+    Repo Django con la forma `shape` de SHAPES; `scale` multiplica las
+    cantidades de archivos (no la profundidad de node_modules).
+    Devuelve {tipo: cantidad de archivos creados}.
+    """
+    spec = SHAPES[shape]
+    rng = random.Random(seed)
+
+    def n(key):
+        return max(1, int(spec[key] * scale))
+
+    creados = {"markers": len(generate_django_markers(path, rng))}
+    creados["py"] = len(generate_repo(path, files=n("py_files"), small_ratio=spec.get("small_ratio", 0.7),
+                                      large_lines=spec.get("large_lines", 300), seed=seed))
+    if "node_modules_depth" in spec:
+        creados["node_modules"] = len(generate_node_modules(path, spec["node_modules_depth"],
+                                                            spec["node_modules_fanout"],
+                                                            n("node_modules_files"), seed))
+    if "generated_files" in spec:
+        creados["generated"] = len(generate_generated_files(path, n("generated_files"), n("generated_lines"), seed))
+    if "api_specs" in spec:
+        creados["api_specs"] = len(generate_api_specs(path, n("api_specs"), spec["spec_endpoints"], seed))
+    return creados
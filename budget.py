@@ -0,0 +1,156 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Presupuesto diario persistente y estimación offline de tokens"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from urllib.request import pathname2url
+
+OCTO_HOME = os.getenv("OCTO_HOME", os.path.join(os.path.expanduser("~"), ".cache", "octoautomator"))
+LEDGER_NAME = "ledger.db"
+CALIBRATION_DAYS = 7
+
+# Valores por defecto mientras el ledger no tenga historia
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_OUTPUT_TOKENS = 600
+DEFAULT_LATENCY = 8.0  # segundos por request
+
+COUNTERS = ("reviews", "files", "requests", "tokens", "prompt_chars", "prompt_tokens",
+            "output_tokens", "responses", "latency_total")
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def conectar_en_memoria(path):
+    """
+    Copia en memoria de la base en path (vacía si no existe), abierta sin
+    escribir en ella: lo que se haga sobre la copia no llega al disco.
+    """
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    if os.path.exists(path):
+        origen = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+        try:
+            origen.backup(conn)
+        finally:
+            origen.close()
+    return conn
+
+
+class BudgetLedger:
+    """
+    Consumo diario (reviews, archivos, requests, tokens) guardado en
+    OCTO_HOME/ledger.db y compartido por todas las ejecuciones y procesos.
+    Cada registro es un UPSERT atómico, así que varias instancias en paralelo
+    suman sobre la misma fila del día. Con en_memoria trabaja sobre una copia
+    (para planificar sin registrar nada).
+    """
+    def __init__(self, path=None, en_memoria=False):
+        path = path or os.path.join(OCTO_HOME, LEDGER_NAME)
+        self.path = path
+        if en_memoria:
+            self.conn = conectar_en_memoria(path)
+            self.conn.isolation_level = None
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        columns = ", ".join(f"{c} REAL DEFAULT 0" for c in COUNTERS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS usage (day TEXT PRIMARY KEY, {columns})")
+        self.lock = threading.Lock()
+
+    def record(self, **deltas):
+        """Suma los contadores indicados a la fila de hoy"""
+        deltas = {k: v for k, v in deltas.items() if v}
+        if not deltas:
+            return
+        unknown = set(deltas) - set(COUNTERS)
+        if unknown:
+            raise ValueError(f"Contadores desconocidos: {sorted(unknown)}")
+        cols = ", ".join(deltas)
+        marks = ", ".join("?" for _ in deltas)
+        updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in deltas)
+        with self.lock:
+            self.conn.execute(
+                f"INSERT INTO usage (day, {cols}) VALUES (?, {marks}) ON CONFLICT(day) DO UPDATE SET {updates}",
+                (today(), *deltas.values())
+            )
+
+    def usage(self, day=None):
+        """Contadores de un día (hoy por defecto)"""
+        with self.lock:
+            row = self.conn.execute(f"SELECT {', '.join(COUNTERS)} FROM usage WHERE day = ?",
+                                    (day or today(),)).fetchone()
+        return dict(zip(COUNTERS, row or [0] * len(COUNTERS)))
+
+    def remaining(self, daily_reviews, daily_tokens=0):
+        """(reviews, tokens) que quedan hoy; None si no hay límite de tokens"""
+        used = self.usage()
+        reviews = max(0, daily_reviews - int(used["reviews"]))
+        tokens = max(0, daily_tokens - int(used["tokens"])) if daily_tokens else None
+        return reviews, tokens
+
+    def estimator(self):
+        """TokenEstimator calibrado con el historial de los últimos días"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT SUM(prompt_chars), SUM(prompt_tokens), SUM(output_tokens), SUM(responses), SUM(latency_total) "
+                "FROM (SELECT * FROM usage ORDER BY day DESC LIMIT ?)", (CALIBRATION_DAYS,)
+            ).fetchone()
+        prompt_chars, prompt_tokens, output_tokens, responses, latency_total = [v or 0 for v in row]
+        estimator = TokenEstimator()
+        if prompt_tokens:
+            estimator.chars_per_token = prompt_chars / prompt_tokens
+        if responses and output_tokens:
+            estimator.output_tokens = output_tokens / responses
+        if responses and latency_total:
+            estimator.latency = latency_total / responses
+        return estimator
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class TokenEstimator:
+    """
+    Estimación offline de tokens para planificar una ejecución antes de enviar
+    nada. Los parámetros se calibran con lo que Gemini reportó en usageMetadata.
+    """
+    def __init__(self, chars_per_token=DEFAULT_CHARS_PER_TOKEN, output_tokens=DEFAULT_OUTPUT_TOKENS,
+                 latency=DEFAULT_LATENCY):
+        self.chars_per_token = chars_per_token
+        self.output_tokens = output_tokens
+        self.latency = latency
+
+    def prompt_tokens(self, text_or_chars):
+        chars = text_or_chars if isinstance(text_or_chars, int) else len(text_or_chars)
+        return int(chars / self.chars_per_token) + 1
+
+    def request_tokens(self, prompt_chars):
+        """Tokens totales (prompt + respuesta) de un request"""
+        return self.prompt_tokens(prompt_chars) + int(self.output_tokens)
+
+    def wall_time(self, requests, rpm, workers):
+        """Segundos estimados: lo que más limite entre el rpm y la latencia repartida en workers"""
+        if not requests:
+            return 0.0
+        by_rate = requests * 60.0 / max(1, rpm)
+        by_latency = requests * self.latency / max(1, workers)
+        return max(by_rate, by_latency)
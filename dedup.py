@@ -0,0 +1,143 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Detección de archivos casi duplicados: normalización, MinHash y LSH por bandas"""
+
+import re
+import ast
+import random
+import hashlib
+from collections import defaultdict
+
+NUM_PERM = 64  # permutaciones de la firma MinHash
+BANDS = 16  # 16 bandas de 4 filas: pares con similitud >= 0.8 son candidatos casi siempre
+SHINGLE_SIZE = 3  # tokens por shingle
+MERSENNE = (1 << 61) - 1
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+COMMENT_RE = re.compile(r"#[^\n]*")
+
+
+def _sin_docstrings(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def normalizar(code):
+    """
+    Código sin comentarios, docstrings ni diferencias de formato. Si no es
+    Python válido solo se quitan los comentarios # y se colapsan los espacios.
+    """
+    try:
+        return ast.unparse(_sin_docstrings(ast.parse(code)))
+    except (SyntaxError, ValueError, RecursionError):
+        return " ".join(COMMENT_RE.sub("", code).split())
+
+
+def shingles(texto, k=SHINGLE_SIZE):
+    """Hashes de 64 bits de las secuencias de k tokens del texto"""
+    tokens = TOKEN_RE.findall(texto)
+    if len(tokens) <= k:
+        grupos = [" ".join(tokens)]
+    else:
+        grupos = (" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1))
+    return {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "big") for g in grupos}
+
+
+class MinHasher:
+    """Firmas MinHash con permutaciones (a*x + b) mod 2^61-1 fijas por semilla"""
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.perms = [(rng.randrange(1, MERSENNE), rng.randrange(0, MERSENNE)) for _ in range(num_perm)]
+
+    def firma(self, hashes):
+        return tuple(min((a * h + b) % MERSENNE for h in hashes) for a, b in self.perms)
+
+
+def similitud(firma_a, firma_b):
+    """Jaccard estimado: fracción de posiciones iguales de las firmas"""
+    return sum(x == y for x, y in zip(firma_a, firma_b)) / len(firma_a)
+
+
+def agrupar_duplicados(items, threshold=0.9, bands=BANDS, hasher=None):
+    """
+    items: [(clave, código)]. Devuelve [(representante, [(clave, similitud), ...])]
+    con los grupos de 2 o más archivos. Primero junta los que quedan idénticos
+    tras normalizar; entre esos representantes, LSH propone candidatos que se
+    confirman si su similitud estimada llega a threshold.
+    """
+    exactos = defaultdict(list)
+    for clave, code in items:
+        exactos[hashlib.sha256(normalizar(code).encode()).hexdigest()].append((clave, code))
+
+    hasher = hasher or MinHasher()
+    rows = len(hasher.perms) // bands
+    claves = []
+    firmas = []
+    buckets = defaultdict(list)
+    for grupo in exactos.values():
+        clave, code = grupo[0]
+        firma = hasher.firma(shingles(normalizar(code)))
+        i = len(claves)
+        claves.append(clave)
+        firmas.append(firma)
+        for banda in range(bands):
+            buckets[(banda, firma[banda * rows:(banda + 1) * rows])].append(i)
+
+    # Union-find sobre los representantes exactos
+    padre = list(range(len(claves)))
+
+    def raiz(i):
+        while padre[i] != i:
+            padre[i] = padre[padre[i]]
+            i = padre[i]
+        return i
+
+    vistos = set()
+    for candidatos in buckets.values():
+        for n, i in enumerate(candidatos):
+            for j in candidatos[n + 1:]:
+                if (i, j) in vistos:
+                    continue
+                vistos.add((i, j))
+                if raiz(i) != raiz(j) and similitud(firmas[i], firmas[j]) >= threshold:
+                    padre[raiz(j)] = raiz(i)
+
+    cercanos = defaultdict(list)
+    for i in range(len(claves)):
+        cercanos[raiz(i)].append(i)
+    miembros_exactos = {grupo[0][0]: [clave for clave, _ in grupo[1:]] for grupo in exactos.values()}
+
+    grupos = []
+    for indices in cercanos.values():
+        rep = indices[0]
+        miembros = list((clave, 1.0) for clave in miembros_exactos[claves[rep]])
+        for i in indices[1:]:
+            # La unión es transitiva: quien no se parece lo suficiente al representante queda con sus exactos
+            sim = similitud(firmas[rep], firmas[i])
+            if sim >= threshold:
+                miembros.append((claves[i], sim))
+                miembros.extend((clave, 1.0) for clave in miembros_exactos[claves[i]])
+            elif miembros_exactos[claves[i]]:
+                grupos.append((claves[i], [(clave, 1.0) for clave in miembros_exactos[claves[i]]]))
+        if miembros:
+            grupos.append((claves[rep], miembros))
+    return grupos
@@ -0,0 +1,291 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Cliente HTTP para la API de GitHub con conexiones persistentes y reintentos"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit, parse_qs
+from requests.adapters import HTTPAdapter
+from requests.utils import parse_header_links
+
+GITHUB_API_URL = "https://api.github.com"
+RETRY_STATUS = (500, 502, 503, 504)
+MAX_RATE_WAIT = 120  # segundos máximos a esperar por un reset del rate limit
+PER_PAGE = 100  # máximo que acepta la API
+MAX_PAGES = 50
+
+
+class HTTPCache:
+    """
+    Última respuesta de cada GET (ETag, Link y cuerpo) en SQLite. Permite
+    enviar If-None-Match: los 304 no descuentan del rate limit de GitHub.
+    La base se abre en el primer uso.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, etag TEXT, link TEXT, body TEXT, fetched REAL)"
+            )
+        return self.conn
+
+    def get(self, url):
+        """(etag, link, body) guardados para la URL, o None"""
+        with self.lock:
+            return self._connect().execute(
+                "SELECT etag, link, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+    def put(self, url, etag, link, body):
+        with self.lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                         (url, etag, link, body, time.time()))
+            conn.commit()
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def _links(header):
+    """Header Link → {rel: url}"""
+    if not header:
+        return {}
+    return {link["rel"]: link["url"] for link in parse_header_links(header) if "rel" in link}
+
+
+def _page_number(url):
+    try:
+        return int(parse_qs(urlsplit(url).query)["page"][0])
+    except (KeyError, ValueError, IndexError):
+        return None
+
+
+class GitHubClient:
+    """
+    Sesión keep-alive compartida para todas las llamadas a GitHub.
+    Reintenta errores transitorios con backoff exponencial y registra los
+    headers X-RateLimit-* de cada respuesta.
+    """
+    def __init__(self, token=None, base_url=GITHUB_API_URL, max_retries=3, backoff=1.0, pool_size=10, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.cache = cache
+        self.not_modified = 0  # respuestas 304 servidas desde la cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.rate_reset = None
+        self.lock = threading.Lock()
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _track_rate_limit(self, response):
+        headers = response.headers
+        with self.lock:
+            if "X-RateLimit-Remaining" in headers:
+                self.rate_remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Limit" in headers:
+                self.rate_limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Reset" in headers:
+                self.rate_reset = int(headers["X-RateLimit-Reset"])
+
+    def _rate_wait(self, response):
+        """Segundos a esperar si la respuesta es un rate limit agotado, o None"""
+        if response.status_code not in (403, 429):
+            return None
+        if "Retry-After" in response.headers:
+            return float(response.headers["Retry-After"])
+        if response.headers.get("X-RateLimit-Remaining") == "0" and self.rate_reset:
+            return max(0.0, self.rate_reset - time.time()) + 1
+        return None
+
+    def request(self, method, path, **kwargs):
+        """Ejecuta un request con reintentos; devuelve la última respuesta obtenida"""
+        kwargs.setdefault("timeout", 30)
+        url = self.url(path)
+        for attempt in range(self.max_retries + 1):
+            last_try = attempt == self.max_retries
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_try:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+
+            self._track_rate_limit(response)
+            wait = self._rate_wait(response)
+            if wait is not None and wait <= MAX_RATE_WAIT and not last_try:
+                print(f"⚠️ Rate limit de GitHub agotado. Esperando {wait:.0f} segundos...")
+                time.sleep(wait)
+                continue
+            if response.status_code in RETRY_STATUS and not last_try:
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def get_json(self, path, params=None):
+        """
+        GET condicional: con cache envía If-None-Match y un 304 devuelve el
+        cuerpo guardado. Devuelve (status, data, links); si el status no es
+        200, data es el texto de la respuesta.
+        """
+        url = self.url(path)
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+        cached = self.cache.get(url) if self.cache else None
+        headers = {"If-None-Match": cached[0]} if cached and cached[0] else {}
+
+        response = self.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            with self.lock:
+                self.not_modified += 1
+            return 200, json.loads(cached[2]), _links(cached[1])
+        if response.status_code != 200:
+            return response.status_code, response.text, {}
+        if self.cache and response.headers.get("ETag"):
+            self.cache.put(url, response.headers["ETag"], response.headers.get("Link"), response.text)
+        return 200, response.json(), {rel: link["url"] for rel, link in response.links.items()}
+
+    def get_all(self, path, params=None, items_key=None, max_pages=MAX_PAGES):
+        """
+        Todas las páginas de un listado. La primera dice (Link rel="last")
+        cuántas hay y el resto se pide en paralelo. Devuelve
+        (status, items, primera_página); items_key para respuestas tipo
+        search ({"total_count", "items"}).
+        """
+        params = dict(params or {}, per_page=PER_PAGE)
+        status, first, links = self.get_json(path, params)
+        if status != 200:
+            return status, first, None
+        items = list(first[items_key] if items_key else first)
+
+        last = _page_number(links.get("last", "")) if links else None
+        pages = range(2, min(last, max_pages) + 1) if last else []
+        if pages:
+            with ThreadPoolExecutor(max_workers=min(self.pool_size, len(pages))) as pool:
+                results = pool.map(lambda page: self.get_json(path, dict(params, page=page)), pages)
+                for page, (page_status, data, _) in zip(pages, results):
+                    if page_status != 200:
+                        print(f"⚠️ Página {page} de {path}: {page_status}")
+                        continue
+                    items.extend(data[items_key] if items_key else data)
+        return 200, items, first
+
+    def rate_summary(self):
+        if self.rate_remaining is None:
+            return "rate limit desconocido"
+        summary = f"{self.rate_remaining}/{self.rate_limit} requests restantes"
+        if self.not_modified:
+            summary += f" ({self.not_modified} respuestas 304 desde cache)"
+        return summary
+
+
+class StatusAggregator:
+    """
+    Acumula el resultado de cada archivo y publica un único commit status al
+    final del review, en lugar de un POST por archivo que se sobrescribe con
+    el siguiente (todos usan el mismo context).
+    """
+    def __init__(self, client, owner, repo, sha, context="Code Review Bot"):
+        self.client = client
+        self.owner = owner
+        self.repo = repo
+        self.sha = sha
+        self.context = context
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def add(self, path, state, description=""):
+        """state: 'reviewed', 'unchanged' o 'failed'"""
+        with self.lock:
+            self.results[path] = (state, description)
+
+    def counts(self):
+        with self.lock:
+            counts = {"reviewed": 0, "unchanged": 0, "failed": 0}
+            for state, _ in self.results.values():
+                counts[state] = counts.get(state, 0) + 1
+            return counts
+
+    def publish_pending(self, total):
+        return self.create_status("pending", f"Revisando {total} archivos...")
+
+    def publish(self, incomplete=False):
+        """Publica el status resumen; incomplete=True si el review no terminó (p. ej. DAILY_LIMIT)"""
+        counts = self.counts()
+        description = (f"{counts['reviewed']} revisados, {counts['unchanged']} sin cambios, "
+                       f"{counts['failed']} con error")
+        if incomplete:
+            state = "pending"
+            description += " (incompleto)"
+        elif counts["failed"]:
+            state = "error"
+        else:
+            state = "success"
+        return self.create_status(state, description)
+
+    def create_status(self, state, description):
+        """Crea un status en GitHub para el commit SHA"""
+        url = f"/repos/{self.owner}/{self.repo}/statuses/{self.sha}"
+        data = {
+            "state": state,
+            "description": description[:140],  # límite de la API
+            "context": self.context
+        }
+        try:
+            response = self.client.post(url, json=data)
+        except requests.RequestException as e:
+            print(f"⚠️ Error creando status: {e}")
+            return False
+        if response.status_code in [201, 200]:
+            print(f"✅ Status creado: {state} para commit {self.sha} ({description})")
+            return True
+        print(f"⚠️ Error creando status: {response.status_code} {response.text}")
+        return False
@@ -0,0 +1,137 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Timers por etapa y contadores de una ejecución: tabla de --profile, JSON y textfile de Prometheus"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+from collections import Counter
+
+# Orden de las etapas en la tabla y en los exports
+STAGES = ("walk", "read", "hash", "dedup", "redact", "request", "parse", "write")
+PROMETHEUS_PREFIX = "octoautomator"
+
+
+class Metrics:
+    """
+    Acumula, por etapa, cantidad de llamadas, segundos totales y máximo, y
+    contadores sueltos (requests, 429, tokens, bytes...). Es thread-safe: los
+    segundos de una etapa son la suma de todos los hilos que la ejecutaron.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}  # etapa -> [llamadas, segundos, máximo]
+            self.counters = Counter()
+            self.inicio = time.monotonic()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - inicio)
+
+    def observe(self, name, seconds, calls=1):
+        with self.lock:
+            stat = self.stages.setdefault(name, [0, 0.0, 0.0])
+            stat[0] += calls
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+
+    def count(self, name, n=1):
+        if n:
+            with self.lock:
+                self.counters[name] += n
+
+    def snapshot(self):
+        with self.lock:
+            orden = sorted(self.stages, key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), s))
+            return {
+                "elapsed_s": round(time.monotonic() - self.inicio, 3),
+                "stages": {name: {"calls": self.stages[name][0],
+                                  "total_s": round(self.stages[name][1], 6),
+                                  "max_s": round(self.stages[name][2], 6)} for name in orden},
+                "counters": dict(sorted(self.counters.items()))
+            }
+
+    def merge(self, snapshot):
+        """Suma un snapshot de otro proceso (p. ej. cada repo de --action org)"""
+        for name, stat in snapshot.get("stages", {}).items():
+            with self.lock:
+                actual = self.stages.setdefault(name, [0, 0.0, 0.0])
+                actual[0] += stat["calls"]
+                actual[1] += stat["total_s"]
+                actual[2] = max(actual[2], stat["max_s"])
+        for name, value in snapshot.get("counters", {}).items():
+            self.count(name, value)
+
+    def tabla(self):
+        """Resumen legible para --profile"""
+        snap = self.snapshot()
+        lineas = [f"⏱️ Perfil de la ejecución ({snap['elapsed_s']:.1f}s de reloj; etapas sumadas entre hilos)",
+                  f"   {'etapa':<10}{'llamadas':>10}{'total s':>11}{'media ms':>11}{'máx ms':>11}"]
+        for name, stat in snap["stages"].items():
+            media = stat["total_s"] / stat["calls"] * 1000 if stat["calls"] else 0.0
+            lineas.append(f"   {name:<10}{stat['calls']:>10}{stat['total_s']:>11.3f}{media:>11.1f}"
+                          f"{stat['max_s'] * 1000:>11.1f}")
+        if snap["counters"]:
+            lineas.append("   " + ", ".join(f"{name}={value:g}" for name, value in snap["counters"].items()))
+        return "\n".join(lineas)
+
+    def write_json(self, path):
+        _escribir_atomico(path, json.dumps(self.snapshot(), indent=2))
+
+    def write_prometheus(self, path, labels=None):
+        """
+        Formato textfile del node_exporter. Se escribe en un temporal y se
+        renombra para que el collector nunca lea un archivo a medias.
+        """
+        snap = self.snapshot()
+        extra = "".join(f',{k}="{v}"' for k, v in sorted((labels or {}).items()))
+        base = extra.lstrip(",")
+        p = PROMETHEUS_PREFIX
+        lineas = [f"# HELP {p}_stage_seconds_total Segundos acumulados por etapa (suma entre hilos)",
+                  f"# TYPE {p}_stage_seconds_total counter"]
+        lineas += [f'{p}_stage_seconds_total{{stage="{name}"{extra}}} {stat["total_s"]}'
+                   for name, stat in snap["stages"].items()]
+        lineas += [f"# HELP {p}_stage_calls_total Ejecuciones de cada etapa",
+                   f"# TYPE {p}_stage_calls_total counter"]
+        lineas += [f'{p}_stage_calls_total{{stage="{name}"{extra}}} {stat["calls"]}'
+                   for name, stat in snap["stages"].items()]
+        lineas += [f"# HELP {p}_stage_max_seconds Duración máxima de una ejecución de la etapa",
+                   f"# TYPE {p}_stage_max_seconds gauge"]
+        lineas += [f'{p}_stage_max_seconds{{stage="{name}"{extra}}} {stat["max_s"]}'
+                   for name, stat in snap["stages"].items()]
+        for name, value in snap["counters"].items():
+            lineas += [f"# TYPE {p}_{name}_total counter", f"{p}_{name}_total{{{base}}} {value}"]
+        lineas += [f"# TYPE {p}_elapsed_seconds gauge", f"{p}_elapsed_seconds{{{base}}} {snap['elapsed_s']}"]
+        _escribir_atomico(path, "\n".join(lineas) + "\n")
+
+
+def _escribir_atomico(path, texto):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(texto)
+    os.replace(tmp, path)
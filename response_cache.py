@@ -0,0 +1,122 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Cache de respuestas de Gemini direccionada por contenido, compartida entre repos, ramas y clones"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from budget import OCTO_HOME
+
+CACHE_NAME = "responses.db"
+MAX_BYTES = int(float(os.getenv("RESPONSE_CACHE_MB", "256")) * 1024 * 1024)
+TTL = float(os.getenv("RESPONSE_CACHE_TTL_DAYS", "30")) * 86400
+EVICT_TO = 0.9  # al pasarse del tope se libera hasta este porcentaje
+
+
+def cache_key(model, stack, prompt):
+    """Clave (modelo, stack, hash del prompt): el mismo código redactado da la misma clave en cualquier checkout"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{stack}\0{prompt_hash}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Respuestas de Gemini en OCTO_HOME/responses.db, fuera de los repos.
+    Las entradas vencen a los `ttl` segundos; si el total pasa de max_bytes
+    se borran las usadas hace más tiempo (LRU). La base se abre en el primer
+    uso y en modo WAL, así varios procesos (--action org) la comparten.
+    """
+    def __init__(self, path=None, max_bytes=MAX_BYTES, ttl=TTL):
+        self.path = path or os.path.join(OCTO_HOME, CACHE_NAME)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.conn = None
+        self.size = None  # bytes guardados, leído de la base en el primer put
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, stack TEXT, "
+                "review TEXT, tokens INTEGER, size INTEGER, created REAL, accessed REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        return self.conn
+
+    def get(self, key):
+        """(review, tokens) guardados para la clave, o None si no hay o venció"""
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute("SELECT review, tokens, created, size FROM responses WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                if self.size is not None:
+                    self.size -= row[3]
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+
+    def put(self, key, model, stack, review, tokens):
+        now = time.time()
+        size = len(review.encode("utf-8"))
+        with self.lock:
+            conn = self._connect()
+            previo = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (key, model, stack, review, tokens, size, now, now))
+            if self.size is None:
+                self.size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            else:
+                self.size += size - (previo[0] if previo else 0)
+            if self.size > self.max_bytes:
+                self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        """
+        Borra lo vencido y, si el total real (otros procesos también escriben)
+        sigue pasando el tope, lo menos usado hasta quedar en EVICT_TO del tope
+        """
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self.size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self.size <= self.max_bytes:
+            return
+        limite = self.max_bytes * EVICT_TO
+        liberar = self.size - limite
+        borrar = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            borrar.append((key,))
+            liberar -= size
+            if liberar <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", borrar)
+        self.size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,178 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Rate limiting de Gemini: token bucket por ejecución y cuota global repartida entre repos y procesos"""
+
+import time
+import threading
+from collections import deque, Counter
+from multiprocessing.managers import BaseManager
+
+
+class RateLimiter:
+    """
+    Token bucket compartido por todos los workers.
+    Ante un 429 pausa a todos durante el retryDelay y reduce la tasa a la mitad;
+    cada respuesta exitosa la recupera poco a poco hasta el máximo configurado.
+    """
+    def __init__(self, rpm, burst=1):
+        self.max_rate = rpm / 60.0
+        self.rate = self.max_rate
+        self.min_rate = self.max_rate / 8
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, retry_delay):
+        """Registra un 429: pausa global y baja la tasa"""
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + retry_delay)
+            self.tokens = 0.0
+            self.updated = now
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        """Registra un request exitoso: recupera la tasa gradualmente"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class QuotaScheduler:
+    """
+    Cuota global de una ejecución multi-repo. Vive en el proceso del
+    QuotaManager y la usan por proxy los procesos que revisan cada repo.
+
+    - Requests por minuto: un único RateLimiter; los tokens se entregan por
+      turnos entre los repos que tienen requests esperando (round-robin), así
+      un repo con muchos workers no deja sin cupo a los demás.
+    - Presupuesto diario: lo que queda de reviews y tokens se reparte en
+      partes iguales entre los repos que aún no empezaron; lo que un repo no
+      usa vuelve al fondo para los siguientes.
+    """
+    def __init__(self, rpm, burst, reviews, tokens, repos):
+        self.limiter = RateLimiter(rpm, burst)
+        self.cond = threading.Condition()
+        self.turnos = deque()  # repos con requests esperando, en orden de turno
+        self.esperando = Counter()
+        self.atendiendo = False
+        self.reviews = reviews
+        self.tokens = tokens  # None = sin límite de tokens
+        self.sin_asignar = repos
+        self.requests = Counter()
+
+    def acquire(self, repo):
+        with self.cond:
+            if not self.esperando[repo]:
+                self.turnos.append(repo)
+            self.esperando[repo] += 1
+            while self.atendiendo or self.turnos[0] != repo:
+                self.cond.wait()
+            self.atendiendo = True
+        try:
+            self.limiter.acquire()
+        finally:
+            with self.cond:
+                self.turnos.popleft()
+                self.esperando[repo] -= 1
+                if self.esperando[repo]:
+                    self.turnos.append(repo)
+                self.atendiendo = False
+                self.requests[repo] += 1
+                self.cond.notify_all()
+
+    def penalize(self, retry_delay):
+        self.limiter.penalize(retry_delay)
+
+    def reward(self):
+        self.limiter.reward()
+
+    def asignar(self):
+        """(reviews, tokens) para el próximo repo: su parte de lo que queda en el fondo"""
+        with self.cond:
+            partes = max(1, self.sin_asignar)
+            self.sin_asignar = max(0, self.sin_asignar - 1)
+            reviews = self.reviews // partes
+            self.reviews -= reviews
+            tokens = None
+            if self.tokens is not None:
+                tokens = self.tokens // partes
+                self.tokens -= tokens
+            return reviews, tokens
+
+    def devolver(self, reviews, tokens=None):
+        """Reintegra al fondo la parte que un repo no llegó a usar"""
+        with self.cond:
+            self.reviews += max(0, reviews)
+            if self.tokens is not None and tokens:
+                self.tokens += max(0, tokens)
+
+    def resumen(self):
+        with self.cond:
+            return dict(self.requests)
+
+
+class RepoQuota:
+    """
+    Vista de la cuota global para un repo: expone la interfaz del RateLimiter
+    (acquire, penalize, reward) para que ReviewRunner la use como limiter.
+    """
+    def __init__(self, scheduler, repo):
+        self.scheduler = scheduler
+        self.repo = repo
+
+    def acquire(self):
+        self.scheduler.acquire(self.repo)
+
+    def penalize(self, retry_delay):
+        self.scheduler.penalize(retry_delay)
+
+    def reward(self):
+        self.scheduler.reward()
+
+    def asignar(self):
+        return self.scheduler.asignar()
+
+    def devolver(self, reviews, tokens=None):
+        self.scheduler.devolver(reviews, tokens)
+
+
+class QuotaManager(BaseManager):
+    """Proceso servidor del QuotaScheduler; sus proxies se pueden pasar a un ProcessPoolExecutor"""
+
+
+QuotaManager.register("QuotaScheduler", QuotaScheduler)
@@ -15,26 +15,95 @@
 # En caso contrario, consulta <https://www.gnu.org/licenses/>.
 
 
+import io
 import os
 import re
+import ast
+import math
+import zlib
+import difflib
 import time
 import json
+import sqlite3
 import hashlib
 import argparse
+import contextlib
 import requests
+import threading
 import subprocess
 from datetime import datetime
+from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from github_client import GitHubClient, StatusAggregator, HTTPCache
+from secret_scanner import SCAN_EXTENSIONS, scan_files, scan_text, write_report
+from budget import BudgetLedger, OCTO_HOME, conectar_en_memoria
+from webhook_server import WebhookServer, WEBHOOK_PATH
+from scheduler import RateLimiter, RepoQuota, QuotaManager
+from metrics import Metrics
+from dedup import agrupar_duplicados
+from response_cache import ResponseCache, cache_key
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 GITHUB_USERNAME = os.getenv("GITHUB_USERNAME")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
 
-GITHUB_HEADERS = {"Authorization": f"token {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
+GITHUB_CACHE = os.path.join(OCTO_HOME, "github_cache.db")
+github = GitHubClient(GITHUB_TOKEN, base_url=GITHUB_API_URL, cache=HTTPCache(GITHUB_CACHE))
+metrics = Metrics()  # timers por etapa y contadores de la ejecución (--profile, --metrics, --prometheus)
 EXCLUDE_PATHS = ["migrations/", "__pycache__/", "venv/", "env/", "node_modules/", ".git/"]
-DAILY_LIMIT = 200  # máximo archivos por día
+EXCLUDE_DIRS = tuple(ex.rstrip("/") for ex in EXCLUDE_PATHS)
+DAILY_LIMIT = 200  # máximo reviews (archivo o lote) por día, sumando todas las ejecuciones
+DAILY_TOKEN_LIMIT = int(os.getenv("DAILY_TOKEN_LIMIT", "0"))  # 0 = sin límite de tokens
+# Las URLs base (esta y GITHUB_API_URL) se pueden cambiar, p. ej. por benchmarks/stub_server.py
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_URL = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent"
+GEMINI_STREAM_URL = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse"
+STREAM_IDLE_TIMEOUT = 30  # segundos máximos sin recibir datos del stream (no del request completo)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))  # requests por minuto permitidos
+MAX_RETRIES = 5  # reintentos por archivo ante un 429
+CHUNK_TOKENS = 2000  # presupuesto de tokens por fragmento de archivo enviado a Gemini
+SMALL_FILE_TOKENS = 400  # archivos por debajo de esto se agrupan en lotes
+BATCH_TOKENS = 2000  # presupuesto de tokens de código por lote
+BATCH_MAX_FILES = 8
+PROMPT_OVERHEAD_CHARS = 700  # instrucciones fijas del prompt, para estimar tokens
+HASH_WORKERS = min(8, (os.cpu_count() or 1) * 2)  # hilos para leer y hashear
+MANIFEST_NAME = "manifest.db"  # manifest y store de reviews
+STREAMING_DIR = "streaming"  # reviews en curso con --stream
+SECRETS_REPORT = "secrets_report.json"  # .sarif para formato SARIF
+FILTERS_FILE = ".octofilters.json"  # reglas de redacción propias en la raíz del repo
+LAST_REVIEWED_KEY = "last_reviewed_commit"
+STACK_MAP_KEY = "stack_map"
+STACK_MAP_VERSION = 2  # sube cuando cambian las reglas de detección, invalida los mapas guardados
+JOB_KEY = "job"
+JOB_MAX_ATTEMPTS = 4  # intentos por archivo antes de darlo por fallido
+JOB_RETRY_BASE = 5  # segundos de espera tras el primer fallo; se duplica en cada intento
+JOB_MAX_WAIT = 120  # lo máximo que se espera un reintento en esta ejecución; el resto queda para --resume
+WATCH_INTERVAL = 1.0  # segundos entre sondeos en --action watch
+WATCH_DEBOUNCE = 2.0  # segundos sin guardados antes de revisar lo acumulado
+PROGRESS_REFRESH = 0.5  # segundos mínimos entre líneas de progreso
+DEDUP_THRESHOLD = 0.9  # similitud (Jaccard estimado) para que dos archivos compartan review
+DIFF_CONTEXT_LINES = 3  # líneas sin cambios alrededor de cada hunk
+DIFF_MAX_RATIO = 0.3  # si cambió más que esta fracción de las líneas se revisa el archivo completo
+DIFF_MAX_UPDATES = 5  # actualizaciones acumuladas antes de volver a un review completo
+REVIEW_SUMMARY_CHARS = 1500  # del review anterior que se incluye en el prompt del diff
+UPDATE_MARK = "## 🔄 Actualización"
+CHURN_DAYS = 90  # historia de git considerada para el churn
+CHURN_HALF_LIFE = 30  # días: un commit de hace un mes pesa la mitad
+STALE_DAYS = 30  # días sin review para que la antigüedad cuente completa
+SECRET_HITS_MAX = 3  # hits de secretos/filtros desde los que el factor es 1
+RISK_WEIGHTS = {"churn": 0.4, "secretos": 0.3, "antigüedad": 0.2, "tamaño": 0.1}
+# Archivos que marcan la raíz de un proyecto; sus mtimes invalidan el mapa de stacks
+STACK_MARKERS = ("manage.py", "asgi.py", "wsgi.py", "app.py", "package.json", "requirements.txt",
+                 "requirements-dev.txt", "pipfile", "pyproject.toml")
+STACK_SNIFF_BYTES = 64 * 1024  # prefijo leído de package.json y requirements
+SPEC_SNIFF_BYTES = 4096  # "openapi"/"swagger" aparecen al inicio de la especificación
 
 # Filtros por stack para limpiar código antes de enviar a Gemini
 FILTERS_BY_STACK = {
@@ -69,9 +138,17 @@ FILTERS_BY_STACK = {
 }
 
 class ProgressTracker:
-    def __init__(self, total_files):
+    """
+    Progreso del review. Imprime como mucho una línea cada `refresh` segundos
+    (más la del último archivo) para que los repos grandes no queden
+    limitados por stdout.
+    """
+    def __init__(self, total_files, refresh=PROGRESS_REFRESH):
         self.total_files = total_files
         self.current_file = 0
+        self.refresh = refresh
+        self.last_print = 0.0
+        self.lock = threading.Lock()
         
     def update_file(self, filename, stage):
         """
@@ -83,112 +160,343 @@ class ProgressTracker:
             'writing': '💾 Escribiendo review'
         }
         
-        progress = (self.current_file / self.total_files) * 100
-        print(f"\n[{progress:.1f}%] {stage_names[stage]}: {filename}")
-        print(f"Progreso: {self.current_file}/{self.total_files} archivos")
-        
-        if stage == 'writing':
+        with self.lock:
+            if stage == 'writing':
+                self.current_file += 1
+            self._print(f"{stage_names[stage]}: {filename}")
+
+    def advance(self):
+        """Marca un archivo como terminado sin pasar por 'writing'"""
+        with self.lock:
             self.current_file += 1
+            self._print("")
 
-def detectar_stack(path="."):
-    """Detecta automáticamente el stack tecnológico del proyecto"""
-    path = os.path.abspath(path)
-    files = set()
-    dirs = set()
-    
-    for root, dirnames, filenames in os.walk(path):
-        # Solo revisar el primer nivel y algunos subdirectorios importantes
-        level = root.replace(path, '').count(os.sep)
-        if level > 2:
-            continue
-            
-        for f in filenames:
-            files.add(f.lower())
-        for d in dirnames:
-            dirs.add(d.lower())
+    def _print(self, detalle):
+        now = time.monotonic()
+        if now - self.last_print < self.refresh and self.current_file < self.total_files:
+            return
+        self.last_print = now
+        progress = (self.current_file / max(1, self.total_files)) * 100
+        print(f"[{progress:.1f}%] {self.current_file}/{self.total_files} archivos" + (f" | {detalle}" if detalle else ""))
 
-    print(f"🔍 Detectando stack en {path}...")
-    print(f"   📁 Directorios: {sorted(list(dirs))[:5]}...")
-    print(f"   📄 Archivos: {sorted(list(files))[:5]}...")
+def gemini_session(pool_size=10):
+    """Sesión keep-alive para Gemini: los workers reutilizan conexiones TLS en lugar de abrir una por request"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def parse_retry_delay(response, default=60):
+    """Extrae el retryDelay (en segundos) de un 429 de Gemini"""
+    try:
+        error_data = response.json()
+        for detail in error_data.get("error", {}).get("details", []):
+            if "retryDelay" in detail:
+                return float(detail["retryDelay"].rstrip("s"))
+    except Exception:
+        pass
+    return default
+
+FileEntry = namedtuple("FileEntry", ["path", "rel_path", "size", "mtime", "ext", "depth"])
+
+class RepoIndex:
+    """
+    Índice de archivos del repo construido en una sola pasada con os.scandir.
+    Los directorios excluidos se podan antes de descender, así que node_modules/
+    o venv/ nunca se recorren. Se construye una vez por ejecución y lo comparten
+    la detección de stack, el conteo, el review y el escaneo de secretos.
+    """
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.files = []
+        self.dirs = []  # (rel_path, nivel del directorio padre)
+        self._scan()
+
+    def _scan(self):
+        with metrics.stage("walk"):
+            self._walk()
+        metrics.count("files_walked", len(self.files))
+
+    def _walk(self):
+        pending = [(self.root, 0)]
+        while pending:
+            current, depth = pending.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError as e:
+                print(f"⚠️ No se pudo listar {current}: {e}")
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Mismo criterio por sufijo que el antiguo filtro sobre root
+                        if entry.name.endswith(EXCLUDE_DIRS):
+                            continue
+                        self.dirs.append((os.path.relpath(entry.path, self.root), depth))
+                        pending.append((entry.path, depth + 1))
+                    elif entry.is_file():
+                        st = entry.stat()
+                        self.files.append(FileEntry(
+                            entry.path,
+                            os.path.relpath(entry.path, self.root),
+                            st.st_size,
+                            st.st_mtime_ns,
+                            os.path.splitext(entry.name)[1].lower(),
+                            depth
+                        ))
+                except OSError:
+                    continue
+        self.files.sort(key=lambda e: e.rel_path)
+
+    def with_ext(self, *exts):
+        return [e for e in self.files if e.ext in exts]
+
+    def python_files(self):
+        return self.with_ext(".py")
+
+def leer_prefijo(path, limit):
+    """Primeros `limit` caracteres del archivo en minúsculas ("" si no se puede leer)"""
+    try:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return f.read(limit).lower()
+    except OSError:
+        return ""
+
+class StackMap:
+    """
+    Stack de cada subárbol del repo ({rel_dir: stack}, "." es la raíz). Cada
+    archivo usa el del ancestro más cercano con stack detectado.
+    """
+    def __init__(self, stacks, default="generic"):
+        self.stacks = dict(stacks)
+        self.default = default
+
+    def stack_for(self, rel_path):
+        rel_dir = os.path.dirname(rel_path)
+        while True:
+            stack = self.stacks.get(rel_dir or ".")
+            if stack:
+                return stack
+            if not rel_dir:
+                return self.default
+            rel_dir = os.path.dirname(rel_dir)
+
+    def nombre(self):
+        """Nombre corto para logs y branches: 'django' o 'django+react'"""
+        distintos = sorted(set(self.stacks.values()))
+        return "+".join(distintos) if distintos else self.default
+
+def _detectar_en(files, propios, dirs, specs):
+    """
+    Reglas de detección para una raíz de proyecto. files = {nombre: path} y
+    dirs = nombres, hasta dos niveles bajo la raíz, solo para ver qué marcadores
+    hay; propios = {nombre: path} de los archivos de la propia raíz, los únicos
+    manifiestos que se leen. specs = yaml/json del subárbol.
+    """
+    nombres = set(files)
 
     # Django
-    if "manage.py" in files or "asgi.py" in files or "wsgi.py" in files:
-        if "settings.py" in files or any("settings" in f for f in files):
-            print("✅ Stack detectado: Django")
+    if "manage.py" in nombres or "asgi.py" in nombres or "wsgi.py" in nombres:
+        if any("settings" in f for f in nombres):
             return "django"
 
     # Flask
-    if "app.py" in files or "wsgi.py" in files:
-        req_files = [f for f in files if "requirements" in f or "pipfile" in f]
-        for req_file in req_files:
-            try:
-                req_path = os.path.join(path, req_file)
-                with open(req_path, encoding="utf-8", errors="ignore") as f:
-                    content = f.read().lower()
-                    if "flask" in content:
-                        print("✅ Stack detectado: Flask")
-                        return "flask"
-            except:
-                continue
+    if "app.py" in nombres or "wsgi.py" in nombres:
+        for name, req_path in propios.items():
+            if ("requirements" in name or "pipfile" in name) and "flask" in leer_prefijo(req_path, STACK_SNIFF_BYTES):
+                return "flask"
 
-    # React
-    if "package.json" in files:
-        try:
-            pkg_path = os.path.join(path, "package.json")
-            with open(pkg_path, encoding="utf-8") as f:
-                pkg_content = f.read().lower()
-                if "react" in pkg_content and ("src" in dirs or any("jsx" in f or "tsx" in f for f in files)):
-                    print("✅ Stack detectado: React")
-                    return "react"
-        except:
-            pass
-
-    # Node.js (genérico/Express)
-    if "package.json" in files:
-        try:
-            pkg_path = os.path.join(path, "package.json")
-            with open(pkg_path, encoding="utf-8") as f:
-                pkg_content = f.read().lower()
-                if "express" in pkg_content or "fastify" in pkg_content or "node" in pkg_content:
-                    print("✅ Stack detectado: Node.js")
-                    return "node"
-        except:
-            pass
+    # React y Node.js (genérico/Express): solo el package.json de la propia raíz
+    pkg_content = leer_prefijo(propios["package.json"], STACK_SNIFF_BYTES) if "package.json" in propios else ""
+    if "react" in pkg_content and ("src" in dirs or any("jsx" in f or "tsx" in f for f in nombres)):
+        return "react"
+    if "express" in pkg_content or "fastify" in pkg_content or "node" in pkg_content:
+        return "node"
 
     # REST API (detectar por archivos OpenAPI/Swagger)
     api_indicators = ["openapi", "swagger", "postman"]
-    for root, _, filenames in os.walk(path):
-        for filename in filenames:
-            if filename.lower().endswith(('.yaml', '.yml', '.json')):
-                try:
-                    filepath = os.path.join(root, filename)
-                    with open(filepath, encoding="utf-8", errors="ignore") as f:
-                        content = f.read().lower()
-                        if any(indicator in content for indicator in api_indicators):
-                            print("✅ Stack detectado: REST API")
-                            return "restapi"
-                except:
-                    continue
-
-    print("❓ Stack no detectado automáticamente")
+    for spec in specs:
+        content = leer_prefijo(spec, SPEC_SNIFF_BYTES)
+        if any(indicator in content for indicator in api_indicators):
+            return "restapi"
     return None
 
+def _ancestros(rel_path, niveles=None):
+    """Directorios que contienen rel_path, del más cercano a la raíz ("."), hasta `niveles`"""
+    rel_dir = os.path.dirname(rel_path)
+    n = 0
+    while niveles is None or n < niveles:
+        yield rel_dir or "."
+        if not rel_dir:
+            return
+        rel_dir = os.path.dirname(rel_dir)
+        n += 1
+
+def detectar_stacks(path=".", index=None, manifest=None):
+    """
+    Detecta el stack de cada subárbol con marcadores de proyecto (manage.py,
+    package.json, requirements...) para que en un monorepo cada archivo use
+    los filtros de su stack. Solo se leen prefijos acotados de los archivos.
+    Con manifest, el mapa se guarda con los mtimes de los marcadores y se
+    reutiliza sin leer nada mientras ninguno cambie, aparezca o desaparezca.
+    """
+    path = os.path.abspath(path)
+    index = index or RepoIndex(path)
+
+    marcadores = {e.rel_path: e.mtime for e in index.files if os.path.basename(e.rel_path).lower() in STACK_MARKERS}
+    firma = hash_code(json.dumps([STACK_MAP_VERSION, sorted(marcadores.items())]))
+    if manifest:
+        cached = manifest.get_meta(STACK_MAP_KEY)
+        if cached:
+            data = json.loads(cached)
+            if data.get("firma") == firma:
+                stacks = StackMap(data["stacks"])
+                print(f"🔁 Marcadores sin cambios, stack reutilizado: {stacks.nombre()}")
+                return stacks
+
+    print(f"🔍 Detectando stack en {path}...")
+    raices = {"."} | {os.path.dirname(rel) or "." for rel in marcadores}
+    files = {raiz: {} for raiz in raices}
+    propios = {raiz: {} for raiz in raices}
+    dirs = {raiz: set() for raiz in raices}
+    specs = {raiz: [] for raiz in raices}
+
+    # Cada raíz ve lo que tiene hasta dos niveles por debajo (el mismo alcance que en la raíz del repo)
+    for entry in index.files:
+        name = os.path.basename(entry.rel_path).lower()
+        propio = os.path.dirname(entry.rel_path) or "."
+        if propio in propios:
+            propios[propio][name] = entry.path
+        for ancestro in _ancestros(entry.rel_path, 3):
+            if ancestro in files:
+                files[ancestro].setdefault(name, entry.path)
+        if entry.ext in (".yaml", ".yml", ".json"):
+            cercana = next((a for a in _ancestros(entry.rel_path) if a in specs), ".")
+            specs[cercana].append(entry.path)
+    for rel_dir, _ in index.dirs:
+        for ancestro in _ancestros(rel_dir, 3):
+            if ancestro in dirs:
+                dirs[ancestro].add(os.path.basename(rel_dir).lower())
+
+    detectados = {}
+    for raiz in sorted(raices):
+        stack = _detectar_en(files[raiz], propios[raiz], dirs[raiz], specs[raiz])
+        if stack:
+            detectados[raiz] = stack
+            print(f"✅ Stack detectado: {raiz} → {stack}")
+
+    if not detectados:
+        print("❓ Stack no detectado automáticamente")
+    if manifest:
+        manifest.set_meta(STACK_MAP_KEY, json.dumps({"firma": firma, "stacks": detectados}))
+    return StackMap(detectados)
+
+class RedactionEngine:
+    """
+    Reglas de un stack precompiladas una sola vez por ejecución. Cada regla
+    se aplica con su propio subn, en orden y sobre el resultado de la anterior
+    (igual que el filtro original), y el conteo de reemplazos sale de la misma
+    pasada. Así cada patrón conserva sus flags inline y sus referencias \\N.
+    Las reglas que empiezan con un literal se saltean si el texto no lo contiene.
+    """
+    FLAGS = re.IGNORECASE | re.MULTILINE
+    LITERAL_RE = re.compile(r"\(*([A-Za-z0-9_]+)(\)*)(.?)")
+
+    def __init__(self, rules):
+        self.rules = []
+        self.compiled = []
+        self.literales = []
+        for patron, reemplazo in rules:
+            try:
+                compiled = re.compile(patron, self.FLAGS)
+                compiled.sub(reemplazo, "")  # valida la plantilla antes del primer archivo
+            except re.error as e:
+                print(f"⚠️ Regla de filtro inválida {patron!r}: {e}")
+                continue
+            self.rules.append((patron, reemplazo))
+            self.compiled.append(compiled)
+            self.literales.append(self._literal(patron))
+
+    @classmethod
+    def _literal(cls, patron):
+        """
+        Prefijo literal con el que empieza todo match (p. ej. "secret_key"), en
+        minúsculas, o None si la regla no tiene uno seguro (alternancias,
+        flags inline, escapes). Sirve para saltear la regla sin ejecutarla.
+        """
+        if "|" in patron:
+            return None
+        m = cls.LITERAL_RE.match(patron)
+        if not m:
+            return None
+        literal, cierre, sigue = m.groups()
+        if sigue in ("?", "*", "{"):
+            if cierre:
+                return None  # el grupo entero es opcional
+            literal = literal[:-1]  # el último carácter es opcional
+        return literal.lower() if len(literal) >= 3 else None
+
+    def redact(self, text):
+        """Devuelve (texto_redactado, hits) con hits[i] = matches de la regla i"""
+        hits = [0] * len(self.rules)
+        # Fuera de ASCII, IGNORECASE y str.lower no coinciden siempre (ſ, K): ahí se ejecutan todas
+        lowered = text.lower() if text.isascii() else None
+        for i, compiled in enumerate(self.compiled):
+            literal = self.literales[i]
+            if literal and lowered is not None and literal not in lowered:
+                continue
+            text, hits[i] = compiled.subn(self.rules[i][1], text)
+            if hits[i] and lowered is not None:
+                lowered = text.lower() if text.isascii() else None
+        return text, hits
+
+_ENGINES = {}
+USER_FILTERS = {}  # reglas extra del archivo de configuración; "*" aplica a todos los stacks
+
+def cargar_filtros_usuario(path):
+    """
+    Carga reglas propias desde un JSON con la forma
+    {"django": [["patrón", "reemplazo"], ...], "*": [...]}
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer {path}: {e}")
+        return 0
+
+    total = 0
+    for stack, rules in data.items():
+        USER_FILTERS.setdefault(stack, []).extend((p, r) for p, r in rules)
+        total += len(rules)
+    _ENGINES.clear()
+    print(f"🔒 {total} filtros propios cargados desde {path}")
+    return total
+
+def get_redaction_engine(stack):
+    """Motor de redacción del stack, compilado una sola vez por ejecución"""
+    engine = _ENGINES.get(stack)
+    if engine is None:
+        rules = FILTERS_BY_STACK.get(stack, []) + USER_FILTERS.get(stack, []) + USER_FILTERS.get("*", [])
+        engine = _ENGINES[stack] = RedactionEngine(rules)
+    return engine
+
+def redactar(codigo, stack):
+    """Redacta el código con las reglas del stack; devuelve (código, hits por patrón)"""
+    engine = get_redaction_engine(stack or "generic")
+    with metrics.stage("redact"):
+        codigo_filtrado, hits = engine.redact(codigo)
+    return codigo_filtrado, {engine.rules[i][0]: n for i, n in enumerate(hits) if n}
+
 def aplicar_filtros_stack(codigo, stack):
     """Aplica filtros de seguridad según el stack detectado"""
-    if not stack or stack not in FILTERS_BY_STACK:
-        return codigo
-    
-    codigo_filtrado = codigo
-    aplicados = 0
-    
-    for patron, reemplazo in FILTERS_BY_STACK[stack]:
-        nuevo_codigo = re.sub(patron, reemplazo, codigo_filtrado, flags=re.IGNORECASE | re.MULTILINE)
-        if nuevo_codigo != codigo_filtrado:
-            aplicados += 1
-            codigo_filtrado = nuevo_codigo
+    codigo_filtrado, hits = redactar(codigo, stack)
     
-    if aplicados > 0:
-        print(f"   🔒 {aplicados} filtros de seguridad aplicados para {stack}")
+    if hits:
+        print(f"   🔒 {len(hits)} filtros de seguridad aplicados para {stack} ({sum(hits.values())} reemplazos)")
     
     return codigo_filtrado
 
@@ -209,18 +517,14 @@ def crear_branch_documentacion(stack):
         print("⚠️ No se pudo crear branch (no es repo git o hay problemas)")
         return None
 
-def log_gemini_response(review_dir, filename, response_data, tokens_used):
-    """Guarda log de respuestas de Gemini"""
-    log_path = os.path.join(review_dir, f"{filename}_review.log")
-    
+def log_gemini_response(manifest, rel_path, response_data, tokens_used):
+    """Guarda log de respuestas de Gemini en el store de reviews"""
+    if manifest is None:
+        return
     try:
-        with open(log_path, "a", encoding="utf-8") as log_file:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            response_id = response_data.get("responseId", "N/A")
-            model_version = response_data.get("modelVersion", "N/A")
-            
-            log_file.write(f"{timestamp} | {response_id} | {tokens_used} tokens | {model_version}\n")
-            
+        response_id = response_data.get("responseId", "N/A")
+        model_version = response_data.get("modelVersion", "N/A")
+        manifest.log_response(rel_path, response_id, tokens_used, model_version)
         print(f"   📝 Log guardado: {tokens_used} tokens utilizados")
     except Exception as e:
         print(f"   ⚠️ Error guardando log: {e}")
@@ -229,147 +533,1037 @@ def hash_code(content):
     """Genera un hash SHA256 del contenido de un archivo."""
     return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
-def github_create_status(owner, repo, sha, state, description, context="Code Review Bot"):
-    """Crea un status en GitHub para un commit SHA"""
-    url = f"https://api.github.com/repos/{owner}/{repo}/statuses/{sha}"
-    data = {
-        "state": state,
-        "description": description,
-        "context": context
-    }
-    response = requests.post(url, json=data, headers=GITHUB_HEADERS)
-    if response.status_code in [201, 200]:
-        print(f"✅ Status creado: {state} para commit {sha}")
-    else:
-        print(f"⚠️ Error creando status: {response.status_code} {response.text}")
-
 def get_latest_commit_sha(owner, repo, branch="main"):
     """Obtiene el SHA del último commit de la rama principal"""
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits/{branch}"
-    response = requests.get(url, headers=GITHUB_HEADERS)
+    response = github.get(f"/repos/{owner}/{repo}/commits/{branch}")
     if response.status_code == 200:
         return response.json()["sha"]
     else:
         print(f"⚠️ Error obteniendo commit SHA: {response.status_code} {response.text}")
         return None
 
-def count_python_files(repo_path):
+def count_python_files(repo_path, index=None):
     """Cuenta el total de archivos Python para el progreso"""
-    count = 0
-    for root, _, files in os.walk(repo_path):
-        if any(ex in root for ex in EXCLUDE_PATHS):
+    index = index or RepoIndex(repo_path)
+    return len(index.python_files())
+
+Chunk = namedtuple("Chunk", ["label", "start", "end", "text"])
+
+def estimate_tokens(text):
+    """Estimación offline de tokens (~4 caracteres por token)"""
+    return (len(text) + 3) // 4
+
+def _segmentos(body, first, last, prefix=""):
+    """
+    Segmentos [label, start, end, node] que cubren las líneas first..last.
+    Funciones y clases quedan en su propio segmento (con sus decoradores);
+    el código de módulo consecutivo se agrupa. Los comentarios y líneas en
+    blanco entre nodos se pegan al segmento siguiente.
+    """
+    segs = []
+    for node in body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            label = f"def {prefix}{node.name}"
+        elif isinstance(node, ast.ClassDef):
+            label = f"class {prefix}{node.name}"
+        else:
+            label = None
+        if label is None and segs and segs[-1][0] is None:
+            segs[-1][2] = node.end_lineno
             continue
-        for f in files:
-            if f.endswith(".py"):
-                count += 1
-    return count
+        segs.append([label, start, node.end_lineno, node])
 
-def code_review_gemini(repo_path, owner, remote_url, stack_override=None):
-    """Realiza code review usando Gemini AI con detección de stack y filtros de seguridad"""
-    print(f"Resolved repo path: {os.path.abspath(repo_path)}")
-    if not GEMINI_API_KEY:
-        print("❌ Error: GEMINI_API_KEY no está configurada en .env")
-        return
+    module_label = f"class {prefix.rstrip('.')}" if prefix else "nivel de módulo"
+    if not segs:
+        return [[module_label, first, last, None]]
+    segs[0][1] = first
+    for prev, seg in zip(segs, segs[1:]):
+        seg[1] = prev[2] + 1
+    segs[-1][2] = last
+    for seg in segs:
+        if seg[0] is None:
+            seg[0] = module_label
+    return segs
 
-    # Detectar o usar stack override
-    stack = stack_override or detectar_stack(repo_path)
-    if not stack:
-        print("⚠️ Stack no detectado. Usa --stack para especificar: django, flask, node, react, restapi")
-        stack = "generic"
-    
-    print(f"🔧 Usando stack: {stack}")
+def _ventanas(lines, start, end, label, max_tokens):
+    """Parte un rango de líneas en ventanas que respetan el presupuesto"""
+    chunks = []
+    buffer = []
+    buffer_start = start
+    size = 0
+    for n in range(start, end + 1):
+        line = lines[n - 1]
+        tokens = estimate_tokens(line)
+        if buffer and size + tokens > max_tokens:
+            chunks.append(Chunk(label, buffer_start, n - 1, "".join(buffer)))
+            buffer, buffer_start, size = [], n, 0
+        if tokens > max_tokens:  # líneas minificadas gigantes
+            line = line[:max_tokens * 4] + "... (línea truncada)\n"
+            tokens = max_tokens
+        buffer.append(line)
+        size += tokens
+    if buffer:
+        chunks.append(Chunk(label, buffer_start, end, "".join(buffer)))
+    if len(chunks) > 1:
+        chunks = [c._replace(label=f"{label} (parte {i})") for i, c in enumerate(chunks, 1)]
+    return chunks
 
-    # Crear branch temporal para documentación
-    temp_branch = crear_branch_documentacion(stack)
+def _partir_segmento(lines, seg, max_tokens):
+    """Divide un segmento demasiado grande: una clase por sus métodos, el resto por líneas"""
+    label, start, end, node = seg
+    if isinstance(node, ast.ClassDef) and node.body:
+        subsegs = _segmentos(node.body, start, end, prefix=f"{node.name}.")
+        return _empaquetar(lines, subsegs, max_tokens)
+    return _ventanas(lines, start, end, label, max_tokens)
 
-    repo_name = remote_url.rstrip("/").split("/")[-1]
-    if repo_name.endswith(".git"):
-        repo_name = repo_name[:-4]
+def _etiqueta(labels):
+    if len(labels) <= 3:
+        return ", ".join(labels)
+    return f"{', '.join(labels[:3])} +{len(labels) - 3}"
 
-    review_dir = os.path.join(repo_path, "review")
-    os.makedirs(review_dir, exist_ok=True)
+def _empaquetar(lines, segs, max_tokens):
+    """Agrupa segmentos consecutivos en chunks sin pasar el presupuesto"""
+    chunks = []
+    current = []
+    size = 0
 
-    sha = get_latest_commit_sha(owner, repo_name)
-    if not sha:
-        print("⚠️ No se pudo obtener el SHA para crear status en GitHub.")
-        return
+    def flush():
+        if current:
+            text = "".join(lines[current[0][1] - 1:current[-1][2]])
+            chunks.append(Chunk(_etiqueta([s[0] for s in current]), current[0][1], current[-1][2], text))
+            current.clear()
 
-    # Contar archivos para progreso
-    total_files = count_python_files(repo_path)
-    if total_files == 0:
-        print("📄 No se encontraron archivos Python para revisar.")
-        return
-        
-    print(f"🔍 Iniciando review de {total_files} archivos Python...")
-    progress = ProgressTracker(total_files)
+    for seg in segs:
+        tokens = estimate_tokens("".join(lines[seg[1] - 1:seg[2]]))
+        if tokens > max_tokens:
+            flush()
+            size = 0
+            chunks.extend(_partir_segmento(lines, seg, max_tokens))
+            continue
+        if current and size + tokens > max_tokens:
+            flush()
+            size = 0
+        current.append(seg)
+        size += tokens
+    flush()
+    return chunks
+
+def dividir_en_chunks(code, max_tokens=CHUNK_TOKENS):
+    """
+    Divide un archivo Python en fragmentos que caben en max_tokens siguiendo
+    los límites del AST (clases y funciones de nivel superior). Si el archivo
+    cabe entero devuelve un único chunk; si no parsea, se parte por líneas.
+    """
+    lines = code.splitlines(keepends=True)
+    if estimate_tokens(code) <= max_tokens or not lines:
+        return [Chunk("archivo completo", 1, len(lines), code)]
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return _ventanas(lines, 1, len(lines), "archivo", max_tokens)
+    return _empaquetar(lines, _segmentos(tree.body, 1, len(lines)), max_tokens)
+
+def review_prefix(rel_path):
+    """Prefijo del archivo de review: directorio relativo con '_' como separador"""
+    return (os.path.dirname(rel_path) or ".").replace(os.sep, "_")
+
+def review_filename_for(rel_path):
+    return f"{review_prefix(rel_path)}_{os.path.basename(rel_path)}_review.md"
+
+def read_review_hash(review_path):
+    """Lee el hash del encabezado <!-- hash: --> de un review existente"""
+    try:
+        with open(review_path, "r", encoding="utf-8") as rf:
+            first_line = rf.readline().strip()
+    except OSError:
+        return None
+    if first_line.startswith("<!-- hash:") and first_line.endswith("-->"):
+        return first_line.split(":")[1].split("-->")[0].strip()
+    return None
+
+class ReviewManifest:
+    """
+    Manifest persistente en review/manifest.db: path → (size, mtime, sha256, review).
+    Se carga completo en memoria al iniciar y se guarda al terminar el review.
+    También es el store de reviews: el markdown de cada archivo (tabla reviews,
+    buscable por path y por hash) y el log de respuestas de Gemini (tabla logs),
+    en lugar de un .md y un .log por archivo. --action export los genera.
+    La tabla contents guarda el código de cada review vigente para los diffs.
+    Con en_memoria trabaja sobre una copia y no crea ni modifica el archivo.
+    """
+    def __init__(self, review_dir, en_memoria=False):
+        self.path = os.path.join(review_dir, MANIFEST_NAME)
+        if en_memoria:
+            self.conn = conectar_en_memoria(self.path)
+        else:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT, review TEXT)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # Fragmentos revisados de cada archivo; el mismo hash puede reutilizarse desde otro path.
+        # Las bases anteriores no guardaban el path: esas filas no se pueden podar y se descartan.
+        columnas = [row[1] for row in self.conn.execute("PRAGMA table_info(chunks)")]
+        if columnas and "path" not in columnas:
+            self.conn.execute("DROP TABLE chunks")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "path TEXT, sha256 TEXT, review TEXT, tokens INTEGER, PRIMARY KEY (path, sha256))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_sha256 ON chunks (sha256)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            "path TEXT PRIMARY KEY, sha256 TEXT, stack TEXT, tokens INTEGER, reviewed_at TEXT, markdown TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS reviews_sha256 ON reviews (sha256)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS logs ("
+            "path TEXT, logged_at TEXT, response_id TEXT, tokens INTEGER, model TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS logs_path ON logs (path)")
+        # Contenido revisado (comprimido) por hash, para revisar después solo el diff
+        self.conn.execute("CREATE TABLE IF NOT EXISTS contents (sha256 TEXT PRIMARY KEY, code BLOB)")
+        self.lock = threading.Lock()
+        self.entries = {
+            row[0]: row[1:]
+            for row in self.conn.execute("SELECT path, size, mtime_ns, sha256, review FROM manifest")
+        }
+
+    def get(self, rel_path):
+        """Devuelve (size, mtime_ns, sha256, review) o None"""
+        return self.entries.get(rel_path)
+
+    def is_fresh(self, entry):
+        """True si el stat del archivo coincide con el registrado (no hace falta leerlo)"""
+        known = self.entries.get(entry.rel_path)
+        return bool(known) and known[0] == entry.size and known[1] == entry.mtime
+
+    def update(self, rel_path, size, mtime_ns, sha256, review):
+        with self.lock:
+            self.entries[rel_path] = (size, mtime_ns, sha256, review)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?)",
+                (rel_path, size, mtime_ns, sha256, review)
+            )
+
+    def rename(self, old_path, new_path, review):
+        """Traslada la entrada de un archivo renombrado, con su review y su log"""
+        with self.lock:
+            known = self.entries.pop(old_path, None)
+            self.conn.execute("DELETE FROM manifest WHERE path = ?", (old_path,))
+            self.conn.execute("DELETE FROM reviews WHERE path = ?", (new_path,))
+            self.conn.execute("UPDATE reviews SET path = ? WHERE path = ?", (new_path, old_path))
+            self.conn.execute("UPDATE logs SET path = ? WHERE path = ?", (new_path, old_path))
+            self.conn.execute("DELETE FROM chunks WHERE path = ?", (new_path,))
+            self.conn.execute("UPDATE chunks SET path = ? WHERE path = ?", (new_path, old_path))
+        if known:
+            self.update(new_path, known[0], known[1], known[2], review)
+
+    def put_review(self, rel_path, sha256, stack, tokens, markdown):
+        """Guarda el review de un archivo; se confirma enseguida para no perderlo si el proceso muere"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?, ?)",
+                (rel_path, sha256, stack, tokens, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), markdown)
+            )
+            self.conn.commit()
+
+    def get_review(self, rel_path):
+        """(sha256, markdown) del review guardado para el path, o None"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT sha256, markdown FROM reviews WHERE path = ?", (rel_path,)
+            ).fetchone()
+
+    def reviews_by_hash(self, sha256):
+        """Paths cuyo review se hizo sobre un contenido con ese hash"""
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT path FROM reviews WHERE sha256 = ?", (sha256,))]
+
+    def reviewed_at(self):
+        """{path: fecha del último review}"""
+        with self.lock:
+            return dict(self.conn.execute("SELECT path, reviewed_at FROM reviews").fetchall())
+
+    def iter_reviews(self):
+        """(path, markdown) de todos los reviews, ordenados por path"""
+        with self.lock:
+            rows = self.conn.execute("SELECT path, markdown FROM reviews ORDER BY path").fetchall()
+        return rows
+
+    def log_response(self, rel_path, response_id, tokens, model):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO logs VALUES (?, ?, ?, ?, ?)",
+                (rel_path, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), response_id, tokens, model)
+            )
+
+    def get_logs(self, rel_path):
+        """[(fecha, response_id, tokens, modelo)] de un archivo, en orden"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT logged_at, response_id, tokens, model FROM logs WHERE path = ? ORDER BY rowid", (rel_path,)
+            ).fetchall()
+
+    def forget(self, paths):
+        """Quita del manifest y de los fragmentos los archivos que ya no existen (los reviews quedan en el store)"""
+        with self.lock:
+            for rel_path in paths:
+                self.entries.pop(rel_path, None)
+                self.conn.execute("DELETE FROM manifest WHERE path = ?", (rel_path,))
+                self.conn.execute("DELETE FROM chunks WHERE path = ?", (rel_path,))
+
+    def get_chunk(self, chunk_hash):
+        """Review de un fragmento ya revisado (en cualquier archivo): (review, tokens) o None"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT review, tokens FROM chunks WHERE sha256 = ? LIMIT 1", (chunk_hash,)
+            ).fetchone()
+
+    def put_chunk(self, rel_path, chunk_hash, review, tokens):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                              (rel_path, chunk_hash, review, tokens))
+
+    def retain_chunks(self, rel_path, chunk_hashes):
+        """Borra los fragmentos de rel_path que su review vigente ya no usa"""
+        with self.lock:
+            viejos = [row[0] for row in self.conn.execute("SELECT sha256 FROM chunks WHERE path = ?", (rel_path,))]
+            self.conn.executemany("DELETE FROM chunks WHERE path = ? AND sha256 = ?",
+                                  [(rel_path, h) for h in viejos if h not in chunk_hashes])
+
+    def put_content(self, sha256, code):
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO contents VALUES (?, ?)",
+                              (sha256, zlib.compress(code.encode("utf-8"))))
 
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    headers = {
-        "Content-Type": "application/json",
-        "X-goog-api-key": GEMINI_API_KEY
-    }
+    def get_content(self, sha256):
+        """Código que tenía el archivo cuando se revisó con ese hash, o None"""
+        with self.lock:
+            row = self.conn.execute("SELECT code FROM contents WHERE sha256 = ?", (sha256,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
 
-    reviewed_count = 0
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
 
-    for root, _, files in os.walk(repo_path):
-        if any(ex in root for ex in EXCLUDE_PATHS):
+    def set_meta(self, key, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self.lock:
+            # Las versiones que ya no respaldan ningún review no sirven para diffs
+            self.conn.execute("DELETE FROM contents WHERE sha256 NOT IN (SELECT sha256 FROM reviews)")
+            self.conn.commit()
+            self.conn.close()
+
+class ReviewJob:
+    """
+    Cola persistente del review (tabla queue de review/manifest.db): cada path
+    con su estado (pending, in_flight, done, failed), intentos, último error y
+    desde cuándo puede reintentarse. Con --resume un review cortado por un
+    crash, un kill o el DAILY_LIMIT continúa sin recorrer ni hashear el repo.
+    """
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.conn = manifest.conn
+        self.lock = manifest.lock
+        with self.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS queue ("
+                "path TEXT PRIMARY KEY, state TEXT, attempts INTEGER DEFAULT 0, error TEXT, next_attempt REAL DEFAULT 0)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS queue_state ON queue (state)")
+
+    def info(self):
+        """Datos del job en curso (stacks, head, inicio) o None"""
+        value = self.manifest.get_meta(JOB_KEY)
+        return json.loads(value) if value else None
+
+    def iniciar(self, pendientes, hechos, **info):
+        """Reemplaza la cola con un job nuevo"""
+        with self.lock:
+            self.conn.execute("DELETE FROM queue")
+            self.conn.executemany("INSERT INTO queue (path, state) VALUES (?, 'pending')",
+                                  ((p,) for p in pendientes))
+            self.conn.executemany("INSERT OR REPLACE INTO queue (path, state) VALUES (?, 'done')",
+                                  ((p,) for p in hechos))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (JOB_KEY, json.dumps(info)))
+            self.conn.commit()
+
+    def activo(self):
+        """True si hay un job con archivos por revisar o reintentables"""
+        if not self.info():
+            return False
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM queue WHERE state IN ('pending', 'in_flight') "
+                "OR (state = 'failed' AND attempts < ?)", (JOB_MAX_ATTEMPTS,)
+            ).fetchone()
+        return row[0] > 0
+
+    def por_revisar(self):
+        """Paths a retomar; los que quedaron in_flight (proceso muerto) vuelven a pending"""
+        with self.lock:
+            self.conn.execute("UPDATE queue SET state = 'pending' WHERE state = 'in_flight'")
+            self.conn.commit()
+            return [row[0] for row in self.conn.execute(
+                "SELECT path FROM queue WHERE state = 'pending' OR (state = 'failed' AND attempts < ?) ORDER BY path",
+                (JOB_MAX_ATTEMPTS,)
+            )]
+
+    def en_curso(self, paths):
+        with self.lock:
+            self.conn.executemany("UPDATE queue SET state = 'in_flight' WHERE path = ?", ((p,) for p in paths))
+            self.conn.commit()
+
+    def hechos(self, paths):
+        with self.lock:
+            self.conn.executemany("UPDATE queue SET state = 'done', error = NULL WHERE path = ?",
+                                  ((p,) for p in paths))
+            self.conn.commit()
+
+    def fallo(self, path, error, transitorio=True):
+        """Cuenta un intento fallido; los errores no transitorios no se reintentan"""
+        with self.lock:
+            row = self.conn.execute("SELECT attempts FROM queue WHERE path = ?", (path,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if not transitorio:
+                attempts = max(attempts, JOB_MAX_ATTEMPTS)
+            next_attempt = time.time() + JOB_RETRY_BASE * 2 ** (attempts - 1)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO queue VALUES (?, 'failed', ?, ?, ?)", (path, attempts, error, next_attempt)
+            )
+            self.conn.commit()
+
+    def reintentables(self):
+        """[(path, next_attempt)] de los fallidos que aún tienen intentos"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT path, next_attempt FROM queue WHERE state = 'failed' AND attempts < ? ORDER BY path",
+                (JOB_MAX_ATTEMPTS,)
+            ).fetchall()
+
+    def fallidos(self):
+        """[(path, intentos, error)] de los archivos que siguen fallidos"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT path, attempts, error FROM queue WHERE state = 'failed' ORDER BY path"
+            ).fetchall()
+
+    def resumen(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall())
+
+def leer_y_hashear(entry):
+    """Lee un archivo y calcula su hash; devuelve (entry, code, hash) o (entry, None, None)"""
+    try:
+        with metrics.stage("read"), open(entry.path, "r", encoding="utf-8") as file:
+            code = file.read()
+    except Exception as e:
+        print(f"❌ Error leyendo {entry.path}: {e}")
+        return entry, None, None
+    metrics.count("bytes_read", entry.size)
+    with metrics.stage("hash"):
+        code_hash = hash_code(code)
+    return entry, code, code_hash
+
+def importar_review_legacy(manifest, review_dir, rel_path):
+    """
+    Pasa al store el .md de una versión anterior (un archivo por review).
+    Devuelve el hash de su encabezado, o None si no hay review que importar.
+    """
+    review_path = os.path.join(review_dir, review_filename_for(rel_path))
+    code_hash = read_review_hash(review_path)
+    if not code_hash:
+        return None
+    try:
+        with open(review_path, encoding="utf-8") as rf:
+            markdown = rf.read()
+    except OSError:
+        return None
+    stack = re.search(r"^<!-- stack:(\S+) -->$", markdown, re.MULTILINE)
+    manifest.put_review(rel_path, code_hash, stack.group(1) if stack else None, 0, markdown)
+    return code_hash
+
+def detectar_cambios(entries, manifest, review_dir, workers=HASH_WORKERS):
+    """
+    Separa los archivos sin cambios de los que hay que revisar.
+    Si el stat coincide con el manifest el archivo ni se abre; el resto se lee y
+    se hashea en paralelo. Devuelve (pendientes, sin_cambios) donde pendientes
+    es una lista de (entry, code, hash).
+    """
+    sin_cambios = []
+    por_hashear = []
+    for entry in entries:
+        known = manifest.get(entry.rel_path)
+        stored = manifest.get_review(entry.rel_path) if known else None
+        if manifest.is_fresh(entry) and stored and stored[0] == known[2]:
+            sin_cambios.append(entry)
+        else:
+            por_hashear.append(entry)
+
+    pendientes = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for entry, code, code_hash in pool.map(leer_y_hashear, por_hashear):
+            if code is None:
+                continue
+            stored = manifest.get_review(entry.rel_path)
+            # Sin review en el store: se acepta el .md de versiones anteriores si su hash coincide
+            old_hash = stored[0] if stored else importar_review_legacy(manifest, review_dir, entry.rel_path)
+            if old_hash == code_hash:
+                manifest.update(entry.rel_path, entry.size, entry.mtime, code_hash, review_filename_for(entry.rel_path))
+                sin_cambios.append(entry)
+            else:
+                pendientes.append((entry, code, code_hash))
+
+    return pendientes, sin_cambios
+
+def git_head(repo_path):
+    """SHA del HEAD local del repo, o None si no es un repo git"""
+    try:
+        result = subprocess.run(["git", "-C", repo_path, "rev-parse", "HEAD"],
+                                check=True, capture_output=True, text=True)
+        return result.stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+def git_changed_files(repo_path, ref):
+    """
+    Archivos cambiados desde ref (incluye cambios sin commitear y archivos nuevos
+    sin trackear). Devuelve (cambiados, renombrados, eliminados) con paths
+    relativos a repo_path, o None si git falla.
+    """
+    try:
+        diff = subprocess.run(["git", "-C", repo_path, "diff", "--name-status", "-M", "--relative", "-z", ref],
+                              check=True, capture_output=True, text=True).stdout
+        untracked = subprocess.run(["git", "-C", repo_path, "ls-files", "--others", "--exclude-standard", "-z"],
+                                   check=True, capture_output=True, text=True).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"⚠️ No se pudo calcular git diff desde {ref}: {getattr(e, 'stderr', '') or e}")
+        return None
+
+    cambiados = set()
+    renombrados = []
+    eliminados = []
+    tokens = diff.split("\0")
+    i = 0
+    while i < len(tokens) - 1:
+        status = tokens[i]
+        if status.startswith(("R", "C")):
+            old, new = os.path.normpath(tokens[i + 1]), os.path.normpath(tokens[i + 2])
+            if status.startswith("R"):
+                renombrados.append((old, new))
+            cambiados.add(new)
+            i += 3
             continue
+        if status.startswith("D"):
+            eliminados.append(os.path.normpath(tokens[i + 1]))
+        else:
+            cambiados.add(os.path.normpath(tokens[i + 1]))
+        i += 2
+
+    cambiados.update(os.path.normpath(p) for p in untracked.split("\0") if p)
+    return sorted(cambiados), renombrados, eliminados
 
-        for f in files:
-            if not f.endswith(".py"):
+def git_churn(repo_path, days=CHURN_DAYS, half_life=CHURN_HALF_LIFE):
+    """
+    Líneas agregadas + borradas por archivo en los últimos `days` días, con un
+    único git log --numstat para todo el repo. Cada commit pesa la mitad por
+    cada `half_life` días de antigüedad. Devuelve {rel_path: churn}, vacío si git falla.
+    """
+    try:
+        out = subprocess.run(["git", "-C", repo_path, "log", "--numstat", "-z", "--no-renames", "--relative",
+                              "--format=%x01%ct", f"--since={days}.days"],
+                             check=True, capture_output=True, text=True).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return {}
+    ahora = time.time()
+    churn = defaultdict(float)
+    for bloque in out.split("\x01")[1:]:
+        campos = bloque.split("\0")
+        try:
+            peso = 0.5 ** (max(0.0, ahora - int(campos[0])) / 86400 / half_life)
+        except ValueError:
+            continue
+        for campo in campos[1:]:
+            partes = campo.lstrip("\n").split("\t")
+            if len(partes) != 3 or not partes[0].isdigit():  # binarios: "-\t-\tpath"
                 continue
+            churn[os.path.normpath(partes[2])] += (int(partes[0]) + int(partes[1])) * peso
+    return churn
 
-            filepath = os.path.join(root, f)
-            rel_dir = os.path.relpath(root, repo_path).replace(os.sep, "_")
-            review_filename = f"{rel_dir}_{f}_review.md"
-            review_path = os.path.join(review_dir, review_filename)
+def entries_from_paths(repo_path, rel_paths):
+    """Construye FileEntry para una lista de paths relativos sin recorrer el repo"""
+    root = os.path.abspath(repo_path)
+    entries = []
+    for rel_path in rel_paths:
+        parts = rel_path.split(os.sep)
+        if not rel_path.endswith(".py") or any(p.endswith(EXCLUDE_DIRS) for p in parts[:-1]):
+            continue
+        path = os.path.join(root, rel_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append(FileEntry(path, rel_path, st.st_size, st.st_mtime_ns, ".py", len(parts) - 1))
+    return entries
 
-            # Etapa 1: Leyendo archivo
-            progress.update_file(f, 'reading')
-            
-            try:
-                with open(filepath, "r", encoding="utf-8") as file:
-                    code = file.read()
-            except Exception as e:
-                print(f"❌ Error leyendo {filepath}: {e}")
-                progress.current_file += 1
+def trasladar_reviews(renombrados, manifest, review_dir):
+    """Traslada en el store el review existente de cada archivo renombrado a su nuevo path"""
+    for old, new in renombrados:
+        if not manifest.get_review(old) and not importar_review_legacy(manifest, review_dir, old):
+            continue
+        manifest.rename(old, new, review_filename_for(new))
+        print(f"   🔀 Review trasladado: {old} → {new}")
+
+REVIEW_DELIMITER = re.compile(r"^[#*\s]*=+\s*REVIEW:\s*[`*]*(.+?)[`*]*\s*=+[*\s]*$", re.MULTILINE)
+
+def separar_reviews_lote(texto, nombres):
+    """Separa la respuesta de un lote en {rel_path: review} usando los delimitadores === REVIEW: ==="""
+    partes = REVIEW_DELIMITER.split(texto)
+    reviews = {}
+    for nombre, cuerpo in zip(partes[1::2], partes[2::2]):
+        nombre = nombre.strip()
+        if nombre in nombres and cuerpo.strip():
+            reviews[nombre] = cuerpo.strip()
+    return reviews
+
+def reviews_meta(texto):
+    """Datos mínimos para log_gemini_response en reviews repartidos desde un lote"""
+    return {"responseId": f"lote-{hash_code(texto)[:12]}", "modelVersion": "lote"}
+
+def agrupar_en_lotes(pendientes, batch_tokens=BATCH_TOKENS, stacks=None):
+    """
+    Separa los archivos pequeños en lotes que caben en batch_tokens; con
+    stacks (StackMap) cada lote solo junta archivos del mismo stack.
+    Devuelve (lotes, individuales); batch_tokens=0 desactiva los lotes.
+    """
+    if batch_tokens <= 0:
+        return [], list(pendientes)
+    lotes = []
+    individuales = []
+    abiertos = {}  # stack -> (lote en curso, tokens)
+    for item in pendientes:
+        tokens = estimate_tokens(item[1])
+        if tokens > min(SMALL_FILE_TOKENS, batch_tokens):
+            individuales.append(item)
+            continue
+        clave = stacks.stack_for(item[0].rel_path) if stacks else None
+        actual, size = abiertos.get(clave, ([], 0))
+        if actual and (size + tokens > batch_tokens or len(actual) >= BATCH_MAX_FILES):
+            lotes.append(actual)
+            actual, size = [], 0
+        actual.append(item)
+        abiertos[clave] = (actual, size + tokens)
+    lotes.extend(actual for actual, _ in abiertos.values() if actual)
+    individuales.extend(lote[0] for lote in lotes if len(lote) == 1)
+    return [lote for lote in lotes if len(lote) > 1], individuales
+
+DiffPrevio = namedtuple("DiffPrevio", ["markdown", "hunks", "contexto", "cambiadas"])
+DIFF_SIN_CALCULAR = object()  # el archivo no pasó por planificar_trabajo: _procesar calcula su diff
+
+def cuerpo_review(markdown):
+    """Markdown del review sin su encabezado (hash, stack, fecha...)"""
+    return markdown.split("---\n\n", 1)[-1]
+
+def resumen_review(markdown, limit=REVIEW_SUMMARY_CHARS):
+    """Inicio del review anterior, cortado en un párrafo, para dar contexto al prompt del diff"""
+    cuerpo = cuerpo_review(markdown).strip()
+    if len(cuerpo) <= limit:
+        return cuerpo
+    corte = cuerpo.rfind("\n\n", 0, limit)
+    return cuerpo[:corte if corte > 0 else limit] + "\n\n(...)"
+
+def calcular_hunks(old, new, context=DIFF_CONTEXT_LINES):
+    """
+    Diff unificado de old a new. Devuelve ([(start, end, texto)], cambiadas)
+    con el rango de cada hunk en las líneas (desde 1) del código nuevo.
+    """
+    a = old.splitlines()
+    b = new.splitlines()
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    hunks = []
+    cambiadas = 0
+    for grupo in matcher.get_grouped_opcodes(context):
+        i1, j1 = grupo[0][1], grupo[0][3]
+        i2, j2 = grupo[-1][2], grupo[-1][4]
+        lineas = [f"@@ -{i1 + 1},{i2 - i1} +{j1 + 1},{j2 - j1} @@"]
+        for tag, a1, a2, b1, b2 in grupo:
+            if tag == "equal":
+                lineas.extend(" " + line for line in a[a1:a2])
                 continue
+            lineas.extend("-" + line for line in a[a1:a2])
+            lineas.extend("+" + line for line in b[b1:b2])
+            cambiadas += max(a2 - a1, b2 - b1)
+        hunks.append((j1 + 1, max(j1 + 1, j2), "\n".join(lineas)))
+    return hunks, cambiadas
 
-            code_hash = hash_code(code)
-
-            # Verificar si ya existe un review previo
-            if os.path.exists(review_path):
-                with open(review_path, "r", encoding="utf-8") as rf:
-                    first_line = rf.readline().strip()
-                    if first_line.startswith("<!-- hash:") and first_line.endswith("-->"):
-                        old_hash = first_line.split(":")[1].split("-->")[0].strip()
-                        if old_hash == code_hash:
-                            print(f"✅ {f} sin cambios, agregando sello de revisión...")
-                            with open(review_path, "a", encoding="utf-8") as rf_new:
-                                rf_new.write(
-                                    f"\n\n---\n✅ Sin cambios significativos - Última revisión {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                                )
-                            github_create_status(owner, repo_name, sha, "success", f"Sin cambios en {f}")
-                            progress.current_file += 1
-                            continue
+def contexto_de_hunks(code, hunks, max_tokens):
+    """
+    Función o clase más interna que contiene cada hunk, en su versión actual.
+    Va completa mientras quepa en max_tokens; después solo su primera línea.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return []
+    lines = code.splitlines(keepends=True)
+    nodos = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+    vistos = set()
+    bloques = []
+    usados = 0
+    for start, end, _ in hunks:
+        contenedores = [n for n in nodos if n.lineno <= start and n.end_lineno >= end]
+        if not contenedores:
+            continue
+        nodo = max(contenedores, key=lambda n: n.lineno)
+        if nodo.lineno in vistos:
+            continue
+        vistos.add(nodo.lineno)
+        texto = "".join(lines[nodo.lineno - 1:nodo.end_lineno])
+        if usados + estimate_tokens(texto) > max_tokens:
+            texto = lines[nodo.lineno - 1].rstrip("\n") + "\n    ...\n"
+        usados += estimate_tokens(texto)
+        tipo = "class" if isinstance(nodo, ast.ClassDef) else "def"
+        bloques.append((f"{tipo} {nodo.name}", nodo.lineno, texto))
+    return bloques
 
-            if reviewed_count >= DAILY_LIMIT:
-                print(f"⚠️ Límite diario de {DAILY_LIMIT} archivos alcanzado. Espera 24h para continuar.")
-                return
+def preparar_diff(manifest, rel_path, code, max_tokens):
+    """
+    DiffPrevio para revisar solo lo que cambió desde el último review, o None
+    si no hay review anterior con su código, cambió más de DIFF_MAX_RATIO del
+    archivo, el review ya acumula DIFF_MAX_UPDATES actualizaciones o los
+    hunks no caben en la mitad de max_tokens.
+    """
+    guardado = manifest.get_review(rel_path)
+    if not guardado:
+        return None
+    previo = manifest.get_content(guardado[0])
+    if previo is None or guardado[1].count(UPDATE_MARK) >= DIFF_MAX_UPDATES:
+        return None
+    hunks, cambiadas = calcular_hunks(previo, code)
+    if not hunks or cambiadas > DIFF_MAX_RATIO * max(1, len(code.splitlines())):
+        return None
+    if estimate_tokens("\n".join(texto for _, _, texto in hunks)) > max_tokens // 2:
+        return None
+    return DiffPrevio(guardado[1], hunks, contexto_de_hunks(code, hunks, max_tokens // 2), cambiadas)
 
-            # Etapa 2: Procesando con Gemini
-            progress.update_file(f, 'processing')
+def deduplicar(pendientes, stacks, threshold=DEDUP_THRESHOLD):
+    """
+    Agrupa los pendientes casi duplicados del mismo stack (ignorando formato,
+    comentarios y docstrings) antes de planificar: solo el representante de
+    cada grupo se envía a Gemini. Devuelve (a_revisar, duplicados) con
+    duplicados = {rel_path del representante: [((entry, code, hash), similitud), ...]}.
+    threshold <= 0 desactiva la detección.
+    """
+    if threshold <= 0 or len(pendientes) < 2:
+        return list(pendientes), {}
+    por_path = {item[0].rel_path: item for item in pendientes}
+    por_stack = defaultdict(list)
+    for entry, code, _ in pendientes:
+        por_stack[stacks.stack_for(entry.rel_path)].append((entry.rel_path, code))
 
-            # Aplicar filtros de seguridad según el stack
-            clean_code = aplicar_filtros_stack(code, stack)
-            
-            # Limpiar el código y limitarlo para evitar tokens excesivos
-            clean_code = clean_code.strip()
-            if len(clean_code) > 3000:  # Limitar tamaño
-                clean_code = clean_code[:3000] + "\n... (código truncado)"
+    duplicados = {}
+    with metrics.stage("dedup"):
+        for items in por_stack.values():
+            for rep, miembros in agrupar_duplicados(items, threshold):
+                duplicados[rep] = [(por_path[clave], sim) for clave, sim in miembros]
+    omitidos = {item[0].rel_path for miembros in duplicados.values() for item, _ in miembros}
+    return [item for item in pendientes if item[0].rel_path not in omitidos], duplicados
+
+def escribir_review(manifest, rel_path, stack, code, code_hash, secciones, total_tokens):
+    """Genera el review markdown y lo guarda en el store; secciones = [(chunk o None, review_text), ...]"""
+    f = os.path.basename(rel_path)
+    with metrics.stage("write"), io.StringIO() as md_file:
+        md_file.write(f"<!-- hash:{code_hash} -->\n")
+        md_file.write(f"<!-- stack:{stack} -->\n")
+        md_file.write(f"# 📋 Code Review: {f}\n\n")
+        md_file.write(f"**Archivo:** `{rel_path}`\n")
+        md_file.write(f"**Stack:** {stack.upper()}\n")
+        md_file.write(f"**Fecha:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        md_file.write(f"**Líneas de código:** {len(code.splitlines())}\n")
+        if len(secciones) > 1:
+            md_file.write(f"**Fragmentos:** {len(secciones)}\n")
+        md_file.write(f"**Tokens utilizados:** {total_tokens}\n\n")
+        md_file.write("---\n\n")
+        if len(secciones) == 1:
+            md_file.write(secciones[0][1] + "\n")
+        else:
+            for chunk, review_text in secciones:
+                md_file.write(f"## 🧩 {chunk.label} (líneas {chunk.start}-{chunk.end})\n\n")
+                md_file.write(review_text + "\n\n")
+        manifest.put_content(code_hash, code)
+        manifest.put_review(rel_path, code_hash, stack, total_tokens, md_file.getvalue())
+
+def planificar_trabajo(lotes, individuales, stacks, manifest, chunk_tokens, estimator, diff=True):
+    """
+    Estima cuántos requests y tokens necesita cada unidad de trabajo sin enviar
+    nada, descontando los fragmentos que ya tienen review en el manifest. Con
+    diff, los archivos ya revisados que cambiaron poco cuentan solo sus hunks.
+    Devuelve [(tipo, payload, requests, tokens)] con tipo 'lote' o 'archivo';
+    el payload de un archivo es (entry, code, hash, DiffPrevio o None) para
+    que el worker no vuelva a calcular el diff.
+    """
+    def pendiente(text, rel_path):
+        stack = stacks.stack_for(rel_path)
+        clean_code = redactar(text, stack)[0].strip()
+        if manifest.get_chunk(hash_code(f"{stack}\0{clean_code}")):
+            return 0
+        return len(clean_code)
+
+    plan = []
+    for lote in lotes:
+        sizes = [pendiente(code, entry.rel_path) for entry, code, _ in lote]
+        chars = sum(size + len(entry.rel_path) + 30 for (entry, _, _), size in zip(lote, sizes) if size)
+        requests_lote = 1 if chars else 0
+        tokens = estimator.request_tokens(chars + PROMPT_OVERHEAD_CHARS) if chars else 0
+        plan.append(("lote", lote, requests_lote, tokens))
+    for item in individuales:
+        previo = preparar_diff(manifest, item[0].rel_path, item[1], chunk_tokens) if diff else None
+        if previo:
+            chars = sum(len(t) for _, _, t in previo.hunks) + sum(len(t) for _, _, t in previo.contexto)
+            chars += len(resumen_review(previo.markdown))
+            plan.append(("archivo", (*item, previo), 1, estimator.request_tokens(chars + PROMPT_OVERHEAD_CHARS)))
+            continue
+        requests_archivo = 0
+        tokens = 0
+        for chunk in dividir_en_chunks(item[1], chunk_tokens):
+            size = pendiente(chunk.text, item[0].rel_path)
+            if size:
+                requests_archivo += 1
+                tokens += estimator.request_tokens(size + PROMPT_OVERHEAD_CHARS)
+        plan.append(("archivo", (*item, None), requests_archivo, tokens))
+    return plan
+
+def puntuar_riesgo(pendientes, repo_path, manifest, stacks):
+    """
+    Puntaje de riesgo (0 a 1) de cada archivo pendiente, ponderado con
+    RISK_WEIGHTS: churn reciente (git log), hits de secretos y de los filtros
+    de su stack, tiempo desde su último review (nunca revisado = máximo) y
+    tamaño en líneas. Devuelve {rel_path: puntaje}.
+    """
+    if not pendientes:
+        return {}
+    churn = git_churn(repo_path)
+    revisados = manifest.reviewed_at()
+    ahora = datetime.now()
+    max_churn = max(churn.get(entry.rel_path, 0.0) for entry, _, _ in pendientes) or 1.0
+    lineas = {entry.rel_path: code.count("\n") + 1 for entry, code, _ in pendientes}
+    max_lineas = math.log1p(max(lineas.values()))
+
+    puntajes = {}
+    for entry, code, _ in pendientes:
+        rel_path = entry.rel_path
+        # Motor directo y no redactar(): la etapa "redact" de las métricas cuenta solo lo que se envía
+        engine = get_redaction_engine(stacks.stack_for(rel_path) or "generic")
+        hits = len(scan_text(code, rel_path)) + sum(engine.redact(code)[1])
+        fecha = revisados.get(rel_path)
+        try:
+            dias = (ahora - datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S')).days if fecha else STALE_DAYS
+        except ValueError:
+            dias = STALE_DAYS
+        factores = {
+            "churn": churn.get(rel_path, 0.0) / max_churn,
+            "secretos": min(1.0, hits / SECRET_HITS_MAX),
+            "antigüedad": min(1.0, dias / STALE_DAYS),
+            "tamaño": math.log1p(lineas[rel_path]) / max_lineas if max_lineas else 0.0
+        }
+        puntajes[rel_path] = sum(RISK_WEIGHTS[k] * v for k, v in factores.items())
+    return puntajes
+
+def priorizar_plan(plan, riesgo):
+    """Ordena las unidades del plan por riesgo (un lote vale lo de su archivo más riesgoso)"""
+    def puntaje(item):
+        tipo, payload, _, _ = item
+        entries = [p[0] for p in payload] if tipo == "lote" else [payload[0]]
+        return max(riesgo.get(entry.rel_path, 0.0) for entry in entries)
+    return sorted(plan, key=puntaje, reverse=True)
+
+def ajustar_a_presupuesto(plan, reviews_restantes, tokens_restantes=None):
+    """
+    Conserva, en orden, las unidades que caben en lo que queda del día.
+    Las que solo reutilizan reviews en caché no consumen presupuesto.
+    Devuelve (plan_ajustado, diferidas).
+    """
+    kept = []
+    deferred = []
+    units = 0
+    tokens = 0
+    for item in plan:
+        _, _, requests_item, tokens_item = item
+        if requests_item == 0:
+            kept.append(item)
+            continue
+        if units + 1 > reviews_restantes or (tokens_restantes is not None and tokens + tokens_item > tokens_restantes):
+            deferred.append(item)
+            continue
+        units += 1
+        tokens += tokens_item
+        kept.append(item)
+    return kept, deferred
+
+def imprimir_plan(plan, deferred, sin_cambios, estimator, rpm, workers, ledger):
+    """Resumen de lo que costará la ejecución"""
+    archivos = sum(len(payload) if tipo == "lote" else 1 for tipo, payload, _, _ in plan)
+    total_requests = sum(p[2] for p in plan)
+    total_tokens = sum(p[3] for p in plan)
+    segundos = estimator.wall_time(total_requests, rpm, workers)
+    used = ledger.usage()
+    print("\n🧮 Plan del review:")
+    print(f"   📄 Archivos a revisar: {archivos} ({sin_cambios} sin cambios)")
+    print(f"   📡 Requests proyectados: {total_requests}")
+    print(f"   🔢 Tokens proyectados: ~{total_tokens} "
+          f"({estimator.chars_per_token:.2f} chars/token, ~{estimator.output_tokens:.0f} tokens por respuesta)")
+    print(f"   ⏱️ Tiempo estimado: ~{segundos / 60:.1f} min ({rpm} rpm, {workers} worker(s), "
+          f"~{estimator.latency:.1f}s por request)")
+    token_limit = f"/{DAILY_TOKEN_LIMIT}" if DAILY_TOKEN_LIMIT else ""
+    print(f"   📒 Consumido hoy: {int(used['reviews'])}/{DAILY_LIMIT} reviews, "
+          f"{int(used['requests'])} requests, {int(used['tokens'])}{token_limit} tokens")
+    if deferred:
+        diferidos = sum(len(payload) if tipo == "lote" else 1 for tipo, payload, _, _ in deferred)
+        print(f"   ⏭️ {diferidos} archivos no entran en el presupuesto de hoy y quedan para mañana")
+
+class ReviewRunner:
+    """Estado compartido por los workers de un code review"""
+    def __init__(self, repo_path, stacks, review_dir, total_files, rpm=GEMINI_RPM, workers=1, manifest=None, status=None,
+                 chunk_tokens=CHUNK_TOKENS, ledger=None, review_limit=DAILY_LIMIT, stream=False, job=None,
+                 session=None, limiter=None, duplicados=None, diff=True, cache=None):
+        """
+        El DAILY_LIMIT se consume por unidad de review: un archivo o un lote de
+        archivos pequeños que haya necesitado al menos un request. review_limit
+        es lo que queda del día según el ledger. duplicados (de deduplicar)
+        indica qué archivos reciben el review de su representante. Con diff,
+        un archivo ya revisado que cambió poco envía solo sus hunks y su review
+        se actualiza en lugar de reemplazarse. cache (ResponseCache) se consulta
+        antes de cada request a Gemini.
+        """
+        self.repo_path = repo_path
+        self.stream = stream
+        self.job = job  # ReviewJob: estado persistente de cada archivo
+        self.duplicados = duplicados or {}
+        self.chunks_usados = defaultdict(set)  # rel_path -> hashes de fragmentos de su review en curso
+        self.diff = diff
+        self.cache = cache
+        self.ledger = ledger
+        self.review_limit = review_limit
+        self.local = threading.local()
+        self.chunk_tokens = chunk_tokens
+        self.manifest = manifest
+        self.status = status
+        self.stacks = stacks  # StackMap: stack de cada archivo según su subárbol
+        self.review_dir = review_dir
+        self.progress = ProgressTracker(total_files)
+        self.limiter = limiter or RateLimiter(rpm, burst=workers)  # compartido entre jobs en --action serve
+        self.session = session or gemini_session(workers)
+        self.headers = {
+            "Content-Type": "application/json",
+            "X-goog-api-key": GEMINI_API_KEY
+        }
+        self.reviewed_count = 0
+        self.failed = 0
+        self.retries = 0
+        self.latencias = []  # segundos por archivo, para benchmarks
+        self.ttfts = []  # time-to-first-token de cada request con stream
+        self.units_used = 0
+        self.tokens_used = 0
+        self.reserved = 0
+        self.lock = threading.Lock()
+        self.limit_reached = threading.Event()
+
+    def reservar_cupo(self):
+        """Reserva un lugar del DAILY_LIMIT antes de enviar un request"""
+        self.local.enviados = 0
+        self.local.error = None
+        with self.lock:
+            if self.units_used + self.reserved >= self.review_limit:
+                if not self.limit_reached.is_set():
+                    self.limit_reached.set()
+                    print(f"⚠️ Límite diario de {DAILY_LIMIT} reviews alcanzado. Espera 24h para continuar.")
+                return False
+            self.reserved += 1
+            return True
+
+    def liberar_cupo(self, usado):
+        """Devuelve la reserva; si el review se completó enviando algo cuenta contra el límite"""
+        usado = usado and getattr(self.local, "enviados", 0) > 0
+        with self.lock:
+            self.reserved -= 1
+            if usado:
+                self.units_used += 1
+        if usado and self.ledger:
+            self.ledger.record(reviews=1)
+
+    def finalizar(self, entry, completado):
+        """Registra el resultado de un archivo en contadores, status y progreso"""
+        with self.lock:
+            if completado:
+                self.reviewed_count += 1
+            else:
+                self.failed += 1
+            inicio = getattr(self.local, "inicio", None)
+            if inicio is not None:
+                self.latencias.append(time.monotonic() - inicio)
+        if completado and self.ledger:
+            self.ledger.record(files=1)
+        with self.lock:
+            usados = self.chunks_usados.pop(entry.rel_path, set())
+        # Si falló se conservan: los fragmentos ya pagados sirven al reintentar
+        if completado and self.manifest:
+            self.manifest.retain_chunks(entry.rel_path, usados)
+        if self.job:
+            if completado:
+                self.job.hechos([entry.rel_path])
+            else:
+                error, transitorio = getattr(self.local, "error", None) or ("error desconocido", True)
+                self.job.fallo(entry.rel_path, error, transitorio)
+        if self.status:
+            self.status.add(entry.rel_path, "reviewed" if completado else "failed")
+        if not completado:
+            self.progress.advance()
+        miembros = self.duplicados.get(entry.rel_path)
+        if miembros:
+            self.compartir_review(entry, miembros, completado)
+
+    def compartir_review(self, entry, miembros, completado):
+        """Aplica el resultado del representante a sus casi duplicados: mismo review o mismo error"""
+        cuerpo = None
+        if completado:
+            guardado = self.manifest.get_review(entry.rel_path)
+            cuerpo = cuerpo_review(guardado[1]) if guardado else None
+        for (miembro, code, code_hash), sim in miembros:
+            if cuerpo is None:
+                self.finalizar(miembro, False)
+                continue
+            nota = f"> ♻️ Review compartido con `{entry.rel_path}` (similitud {sim:.0%}); no se envió a Gemini.\n\n"
+            self.guardar_review(miembro, code, code_hash, [(None, nota + cuerpo)], 0)
+            self.progress.update_file(os.path.basename(miembro.rel_path), 'writing')
+            metrics.count("deduplicated")
+            self.finalizar(miembro, True)
+
+    def _error(self, error, transitorio=True):
+        """Motivo del fallo del request en curso, para la cola del job"""
+        self.local.error = (error, transitorio)
+
+    def _error_http(self, response):
+        # 4xx distintos de 429 (prompt inválido, permisos) no se arreglan reintentando
+        self._error(f"HTTP {response.status_code}", response.status_code >= 500 or response.status_code == 429)
 
-            prompt = f"""Analiza este código {stack.upper()} y proporciona una revisión detallada:
+    def _puntos_review(self, stack):
+        return f"""1. **Resumen**: ¿Qué hace este código?
+2. **Funcionalidades principales**
+3. **Arquitectura y patrones** (específicos para {stack})
+4. **Posibles mejoras**
+5. **Problemas de seguridad** (si los hay)
+6. **Recomendaciones para {stack}**"""
 
+    def construir_prompt(self, clean_code, stack, contexto=""):
+        return f"""Analiza este código {stack.upper()} y proporciona una revisión detallada:
+{contexto}
 ```python
 {clean_code}
 ```
@@ -377,160 +1571,1176 @@ def code_review_gemini(repo_path, owner, remote_url, stack_override=None):
 CONTEXTO: Este es un proyecto {stack.upper()}.
 
 Proporciona:
-1. **Resumen**: ¿Qué hace este código?
-2. **Funcionalidades principales**
-3. **Arquitectura y patrones** (específicos para {stack})
-4. **Posibles mejoras**
-5. **Problemas de seguridad** (si los hay)
-6. **Recomendaciones para {stack}**
+{self._puntos_review(stack)}
 
 Sé conciso pero completo."""
 
-            data = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            }
+    def construir_prompt_diff(self, rel_path, stack, resumen, contexto, hunks):
+        return f"""Ya revisaste antes el archivo {stack.upper()} `{rel_path}`. Resumen de esa revisión:
 
-            try:
-                print(f"   📡 Enviando request a Gemini API...")
-                response = requests.post(url, json=data, headers=headers, timeout=30)
-                
-                print(f"   📊 Status code: {response.status_code}")
-
-                if response.status_code == 429:
-                    try:
-                        error_data = response.json()
-                        retry_time = 60  # default
-                        if "error" in error_data and "details" in error_data["error"]:
-                            details = error_data["error"]["details"]
-                            for detail in details:
-                                if "retryDelay" in detail:
-                                    retry_delay = detail["retryDelay"]
-                                    retry_time = int(retry_delay.replace("s", ""))
-                                    break
-                    except:
-                        retry_time = 60
-                    
-                    print(f"⚠️ Rate limit alcanzado. Esperando {retry_time} segundos...")
-                    time.sleep(retry_time)
-                    continue
+{resumen}
+
+El archivo cambió. Funciones y clases que contienen los cambios (versión actual):
+```python
+{contexto}
+```
+
+Diff unificado desde la versión revisada:
+```diff
+{hunks}
+```
+
+Revisa SOLO los cambios:
+1. **Qué cambió**
+2. **Problemas introducidos** (bugs, seguridad, rendimiento; específicos para {stack})
+3. **Puntos de la revisión anterior** que los cambios resuelven o dejan obsoletos
+4. **Recomendaciones**
+
+Sé conciso."""
+
+    def construir_prompt_lote(self, archivos, stack):
+        """Prompt con varios archivos pequeños; archivos = [(rel_path, clean_code), ...]"""
+        bloques = "\n\n".join(
+            f"=== ARCHIVO: {rel_path} ===\n```python\n{clean_code}\n```" for rel_path, clean_code in archivos
+        )
+        return f"""Analiza estos {len(archivos)} archivos {stack.upper()} y proporciona una revisión detallada de cada uno por separado:
+
+{bloques}
+
+CONTEXTO: Este es un proyecto {stack.upper()}.
+
+Para CADA archivo, empieza su revisión con una línea exacta
+=== REVIEW: <ruta del archivo> ===
+y luego proporciona:
+{self._puntos_review(stack)}
+
+Sé conciso pero completo."""
+
+    def solicitar_review(self, prompt, nombre, stream=False):
+        """
+        Envía el prompt a Gemini respetando el rate limiter; reintenta los 429.
+        Con stream la respuesta queda sin consumir (SSE de streamGenerateContent)
+        y el timeout de lectura aplica entre datos recibidos, no al total.
+        """
+        data = {
+            "contents": [
+                {
+                    "parts": [
+                        {
+                            "text": prompt
+                        }
+                    ]
+                }
+            ]
+        }
+
+        for intento in range(1, MAX_RETRIES + 1):
+            self.limiter.acquire()
+            print(f"   📡 Enviando request a Gemini API ({nombre})...")
+            self.local.enviados = getattr(self.local, "enviados", 0) + 1
+            if self.ledger:
+                self.ledger.record(requests=1)
+            # Con stream mide hasta los headers; el cuerpo se cuenta en parse
+            with metrics.stage("request"):
+                if stream:
+                    response = self.session.post(GEMINI_STREAM_URL, json=data, headers=self.headers, stream=True,
+                                             timeout=(10, STREAM_IDLE_TIMEOUT))
+                else:
+                    response = self.session.post(GEMINI_URL, json=data, headers=self.headers, timeout=30)
+            metrics.count("requests")
+            metrics.count("bytes_sent", len(response.request.body or b""))
+            print(f"   📊 Status code: {response.status_code}")
 
+            if response.status_code != 429:
                 if response.status_code == 200:
-                    try:
-                        result = response.json()
-                        print(f"   ✅ Response recibida de Gemini")
-                        
-                        # Extraer información de tokens para logging
-                        usage_metadata = result.get("usageMetadata", {})
-                        total_tokens = usage_metadata.get("totalTokenCount", 0)
-                        
-                        # Guardar log de respuesta
-                        log_gemini_response(review_dir, f"{rel_dir}_{f}", result, total_tokens)
-                        
-                        # Etapa 3: Escribiendo review
-                        progress.update_file(f, 'writing')
-                        
-                        candidates = result.get("candidates", [])
-                        if not candidates:
-                            print(f"   ⚠️ No se recibieron candidatos en la respuesta")
-                            progress.current_file += 1
-                            continue
-                            
-                        content = candidates[0].get("content", {})
-                        parts = content.get("parts", [])
-                        
-                        if not parts:
-                            print(f"   ⚠️ No se recibió contenido en la respuesta")
-                            progress.current_file += 1
-                            continue
-                        
-                        review_text = parts[0].get("text", "").strip()
-                        
-                        if not review_text:
-                            print(f"   ⚠️ Texto de review vacío")
-                            progress.current_file += 1
-                            continue
-                        
-                        with open(review_path, "w", encoding="utf-8") as md_file:
-                            md_file.write(f"<!-- hash:{code_hash} -->\n")
-                            md_file.write(f"<!-- stack:{stack} -->\n")
-                            md_file.write(f"# 📋 Code Review: {f}\n\n")
-                            md_file.write(f"**Archivo:** `{os.path.relpath(filepath, repo_path)}`\n")
-                            md_file.write(f"**Stack:** {stack.upper()}\n")
-                            md_file.write(f"**Fecha:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                            md_file.write(f"**Líneas de código:** {len(code.splitlines())}\n")
-                            md_file.write(f"**Tokens utilizados:** {total_tokens}\n\n")
-                            md_file.write("---\n\n")
-                            md_file.write(review_text + "\n")
-                            
-                        print(f"   ✅ Review completado y guardado")
-                        github_create_status(owner, repo_name, sha, "success", f"Code review generated for {f}")
-                        reviewed_count += 1
-                        
-                    except Exception as e:
-                        print(f"   ❌ Error procesando respuesta JSON: {e}")
-                        print(f"   📄 Response content: {response.text[:200]}...")
-                        progress.current_file += 1
-                        
+                    self.limiter.reward()
                 else:
-                    print(f"   ❌ Error HTTP {response.status_code}")
-                    print(f"   📄 Response: {response.text[:200]}...")
-                    progress.current_file += 1
-                    
-            except Exception as e:
-                print(f"❌ Error en request para {f}: {e}")
-                progress.current_file += 1
-
-    print(f"\n🎉 Review completado! {reviewed_count} archivos procesados de {total_files} totales.")
+                    metrics.count("http_errors")
+                return response
+
+            metrics.count("rate_limited")
+            retry_time = parse_retry_delay(response)
+            self.limiter.penalize(retry_time)
+            with self.lock:
+                self.retries += 1
+            if intento < MAX_RETRIES:
+                metrics.count("retries")
+            print(f"⚠️ Rate limit alcanzado. Reintento {intento}/{MAX_RETRIES} de {nombre} en {retry_time:.0f} segundos...")
+
+        print(f"   ❌ {nombre} descartado tras {MAX_RETRIES} intentos con rate limit")
+        self._error("rate limit")
+        return None
+
+    def revisar_archivo(self, entry, code, code_hash, previo=DIFF_SIN_CALCULAR):
+        """
+        Revisa un archivo Python ya leído: consulta a Gemini, escribe el review y
+        actualiza el manifest. previo es el DiffPrevio (o None) que ya calculó el plan.
+        """
+        if self.limit_reached.is_set():
+            return
+        self.local.inicio = time.monotonic()
+
+        if not self.reservar_cupo():
+            return
+        if self.job:
+            self.job.en_curso([entry.rel_path])
+
+        completado = False
+        try:
+            completado = self._procesar(entry, code, code_hash, previo)
+            if completado:
+                self.manifest.update(entry.rel_path, entry.size, entry.mtime, code_hash,
+                                     review_filename_for(entry.rel_path))
+        finally:
+            self.liberar_cupo(completado)
+            self.finalizar(entry, completado)
+
+    def revisar_lote(self, items):
+        """
+        Revisa varios archivos pequeños con un solo request. Los archivos que
+        no aparecen en la respuesta se revisan de forma individual.
+        """
+        if self.limit_reached.is_set():
+            return
+        self.local.inicio = time.monotonic()
+
+        # agrupar_en_lotes solo junta archivos del mismo stack
+        stack = self.stacks.stack_for(items[0][0].rel_path)
+        pendientes = []
+        for entry, code, code_hash in items:
+            clean_code = aplicar_filtros_stack(code, stack).strip()
+            chunk_hash = hash_code(f"{stack}\0{clean_code}")
+            cached = self.manifest.get_chunk(chunk_hash) if self.manifest else None
+            if cached:
+                print(f"   ♻️ {entry.rel_path} ya revisado con el mismo contenido, se reutiliza su review")
+                self._usar_chunk(entry.rel_path, chunk_hash, cached)
+                self.guardar_review(entry, code, code_hash, [(None, cached[0])], 0)
+                self.finalizar(entry, True)
+            else:
+                pendientes.append((entry, code, code_hash, clean_code, chunk_hash))
+
+        if not pendientes:
+            return
+        if len(pendientes) == 1:
+            self.revisar_archivo(*pendientes[0][:3])
+            return
+        if not self.reservar_cupo():
+            return
+        if self.job:
+            self.job.en_curso([entry.rel_path for entry, *_ in pendientes])
+
+        nombres = [entry.rel_path.replace(os.sep, "/") for entry, *_ in pendientes]
+        self.progress.update_file(f"lote de {len(pendientes)} archivos ({', '.join(nombres[:3])}...)", 'processing')
+        reviews = None
+        try:
+            prompt = self.construir_prompt_lote(list(zip(nombres, (p[3] for p in pendientes))), stack)
+            reviews = self._solicitar_lote(prompt, nombres, stack)
+        finally:
+            self.liberar_cupo(reviews is not None)
+
+        if reviews is None:
+            for entry, *_ in pendientes:
+                self.finalizar(entry, False)
+            return
+
+        texto, total_tokens = reviews
+        separados = separar_reviews_lote(texto, nombres)
+        total_len = sum(len(p[3]) for p in pendientes) or 1
+        for nombre, (entry, code, code_hash, clean_code, chunk_hash) in zip(nombres, pendientes):
+            review_text = separados.get(nombre)
+            if not review_text:
+                print(f"   ↩️ {nombre} no vino en la respuesta del lote, se revisa por separado")
+                self.revisar_archivo(entry, code, code_hash)
+                continue
+            tokens = round(total_tokens * len(clean_code) / total_len)
+            self._usar_chunk(entry.rel_path, chunk_hash, (review_text, tokens))
+            log_gemini_response(self.manifest, entry.rel_path, reviews_meta(texto), tokens)
+            self.progress.update_file(os.path.basename(entry.rel_path), 'writing')
+            self.guardar_review(entry, code, code_hash, [(None, review_text)], tokens)
+            self.finalizar(entry, True)
+
+    def _solicitar_lote(self, prompt, nombres, stack):
+        """Envía el prompt del lote; devuelve (texto, tokens) o None"""
+        nombre = f"lote de {len(nombres)} archivos"
+        clave, cached = self._desde_cache(prompt, stack, nombre)
+        if cached:
+            return cached
+        try:
+            response = self.solicitar_review(prompt, nombre)
+        except Exception as e:
+            print(f"❌ Error en request para {nombre}: {e}")
+            self._error(f"error de red: {e}")
+            return None
+        if response is None:
+            return None
+        if response.status_code != 200:
+            print(f"   ❌ Error HTTP {response.status_code}")
+            print(f"   📄 Response: {response.text[:200]}...")
+            self._error_http(response)
+            return None
+        resultado = self.extraer_review(response, None, prompt)
+        if resultado is None:
+            self._error("respuesta inválida")
+        else:
+            self._a_cache(clave, stack, resultado)
+        return resultado
+
+    def guardar_review(self, entry, code, code_hash, secciones, total_tokens):
+        """Guarda el review en el store y actualiza el manifest"""
+        escribir_review(self.manifest, entry.rel_path, self.stacks.stack_for(entry.rel_path),
+                        code, code_hash, secciones, total_tokens)
+        self.manifest.update(entry.rel_path, entry.size, entry.mtime, code_hash, review_filename_for(entry.rel_path))
+
+    def _procesar(self, entry, code, code_hash, previo=DIFF_SIN_CALCULAR):
+        """Etapas 2 y 3; devuelve True si el review quedó guardado"""
+        rel_path = entry.rel_path
+        f = os.path.basename(rel_path)
+        stack = self.stacks.stack_for(rel_path)
+
+        if previo is DIFF_SIN_CALCULAR:
+            previo = preparar_diff(self.manifest, rel_path, code, self.chunk_tokens) if self.diff else None
+        if previo:
+            return self._procesar_diff(entry, code, code_hash, previo)
+
+        # Etapa 2: Procesando con Gemini
+        self.progress.update_file(f, 'processing')
+
+        chunks = dividir_en_chunks(code, self.chunk_tokens)
+        if len(chunks) > 1:
+            print(f"   🧩 {f} dividido en {len(chunks)} fragmentos por clases/funciones")
+
+        # En modo stream el review se va escribiendo mientras llega en
+        # review/streaming/; al terminar pasa al store y el archivo se borra
+        sink = None
+        if self.stream:
+            stream_dir = os.path.join(self.review_dir, STREAMING_DIR)
+            os.makedirs(stream_dir, exist_ok=True)
+            stream_path = os.path.join(stream_dir, review_filename_for(rel_path))
+            sink = open(stream_path, "w", encoding="utf-8")
+            sink.write(f"<!-- streaming -->\n# 📋 Code Review: {f}\n\n**Archivo:** `{rel_path}`\n\n---\n\n")
+            sink.flush()
+
+        def _escribir_parcial(texto):
+            sink.write(texto)
+            sink.flush()
+
+        on_text = _escribir_parcial if sink else None
+
+        secciones = []
+        total_tokens = 0
+        try:
+            for i, chunk in enumerate(chunks, 1):
+                contexto = ""
+                if len(chunks) > 1:
+                    contexto = (f"\nEste es el fragmento {i} de {len(chunks)} de `{rel_path}` ({chunk.label}). "
+                                f"Revisa solo este fragmento.\n")
+                    if sink:
+                        sink.write(f"## 🧩 {chunk.label} (líneas {chunk.start}-{chunk.end})\n\n")
+                resultado = self.revisar_chunk(chunk, contexto, rel_path, stack, on_text)
+                if resultado is None:
+                    if sink:
+                        sink.write("\n\n⚠️ Review incompleto: el request falló o se interrumpió.\n")
+                    return False
+                if sink:
+                    sink.write("\n\n")
+                secciones.append((chunk, resultado[0]))
+                total_tokens += resultado[1]
+        finally:
+            if sink:
+                sink.close()
+
+        # Etapa 3: Escribiendo review
+        self.progress.update_file(f, 'writing')
+        
+        escribir_review(self.manifest, rel_path, stack, code, code_hash, secciones, total_tokens)
+        if sink:
+            os.remove(stream_path)
+        print(f"   ✅ Review completado y guardado")
+        return True
+
+    def _procesar_diff(self, entry, code, code_hash, previo):
+        """Revisa solo los hunks cambiados y agrega el resultado al review anterior"""
+        rel_path = entry.rel_path
+        f = os.path.basename(rel_path)
+        stack = self.stacks.stack_for(rel_path)
+        self.progress.update_file(f, 'processing')
+        print(f"   🔀 {f}: {previo.cambiadas} líneas cambiadas en {len(previo.hunks)} hunk(s), se revisa solo el diff")
+
+        contexto = "\n".join(texto for _, _, texto in previo.contexto) or "# (cambios a nivel de módulo)"
+        clean_contexto = aplicar_filtros_stack(contexto, stack).strip()
+        clean_hunks = aplicar_filtros_stack("\n".join(texto for _, _, texto in previo.hunks), stack).strip()
+        chunk_hash = hash_code(f"{stack}\0diff\0{clean_contexto}\0{clean_hunks}")
+
+        cached = self.manifest.get_chunk(chunk_hash) if self.manifest else None
+        if cached:
+            self._usar_chunk(rel_path, chunk_hash, cached)
+            resultado = cached[0], 0
+        else:
+            prompt = self.construir_prompt_diff(rel_path.replace(os.sep, "/"), stack,
+                                                resumen_review(previo.markdown), clean_contexto, clean_hunks)
+            resultado = self._enviar(prompt, f, rel_path, stack)
+            if resultado is None:
+                return False
+            self._usar_chunk(rel_path, chunk_hash, resultado)
+
+        cuerpo = (f"{cuerpo_review(previo.markdown).rstrip()}\n\n"
+                  f"{UPDATE_MARK} {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} "
+                  f"({previo.cambiadas} líneas en {len(previo.hunks)} hunk(s))\n\n{resultado[0]}")
+        self.progress.update_file(f, 'writing')
+        escribir_review(self.manifest, rel_path, stack, code, code_hash, [(None, cuerpo)], resultado[1])
+        metrics.count("diff_reviews")
+        print(f"   ✅ Review actualizado con los cambios")
+        return True
+
+    def revisar_chunk(self, chunk, contexto, rel_path, stack, on_text=None):
+        """
+        Revisa un fragmento; si su hash ya tiene review en el manifest no se
+        envía de nuevo. Devuelve (review_text, tokens) o None si falla.
+        Con on_text (modo stream) el texto se entrega a medida que llega.
+        """
+        # Aplicar filtros de seguridad según el stack
+        clean_code = aplicar_filtros_stack(chunk.text, stack).strip()
+        chunk_hash = hash_code(f"{stack}\0{clean_code}")
+
+        cached = self.manifest.get_chunk(chunk_hash) if self.manifest else None
+        if cached:
+            print(f"   ♻️ Fragmento sin cambios ({chunk.label}), se reutiliza su review")
+            self._usar_chunk(rel_path, chunk_hash, cached)
+            if on_text:
+                on_text(cached[0])
+            return cached[0], 0
+
+        prompt = self.construir_prompt(clean_code, stack, contexto)
+        resultado = self._enviar(prompt, os.path.basename(rel_path), rel_path, stack, on_text)
+        if resultado is not None:
+            self._usar_chunk(rel_path, chunk_hash, resultado)
+        return resultado
+
+    def _usar_chunk(self, rel_path, chunk_hash, resultado):
+        """Guarda el fragmento a nombre de rel_path y lo anota como parte de su review en curso"""
+        if not self.manifest:
+            return
+        with self.lock:
+            self.chunks_usados[rel_path].add(chunk_hash)
+        self.manifest.put_chunk(rel_path, chunk_hash, *resultado)
+
+    def _desde_cache(self, prompt, stack, nombre):
+        """(clave, (review, 0)) si la cache de respuestas compartida ya tiene este prompt; (clave, None) si no"""
+        if not self.cache:
+            return None, None
+        clave = cache_key(GEMINI_MODEL, stack, prompt)
+        cached = self.cache.get(clave)
+        if cached is None:
+            metrics.count("cache_misses")
+            return clave, None
+        metrics.count("cache_hits")
+        print(f"   🗃️ {nombre}: respuesta reutilizada de la cache compartida")
+        return clave, (cached[0], 0)
+
+    def _a_cache(self, clave, stack, resultado):
+        if clave:
+            self.cache.put(clave, GEMINI_MODEL, stack, *resultado)
+
+    def _enviar(self, prompt, f, rel_path, stack, on_text=None):
+        """Envía un prompt de un archivo y extrae el review; (review_text, tokens) o None"""
+        stream = on_text is not None
+        clave, cached = self._desde_cache(prompt, stack, f)
+        if cached:
+            if on_text:
+                on_text(cached[0])
+            return cached
+        try:
+            response = self.solicitar_review(prompt, f, stream=stream)
+        except Exception as e:
+            print(f"❌ Error en request para {f}: {e}")
+            self._error(f"error de red: {e}")
+            return None
+
+        if response is None:
+            return None
+
+        if response.status_code != 200:
+            print(f"   ❌ Error HTTP {response.status_code}")
+            print(f"   📄 Response: {response.text[:200]}...")
+            self._error_http(response)
+            return None
+
+        if stream:
+            resultado = self.extraer_review_stream(response, rel_path, prompt, on_text)
+        else:
+            resultado = self.extraer_review(response, rel_path, prompt)
+        if resultado is None:
+            self._error("stream interrumpido" if stream else "respuesta inválida")
+        else:
+            self._a_cache(clave, stack, resultado)
+        return resultado
+
+    def extraer_review_stream(self, response, log_name, prompt, on_text):
+        """
+        Consume el SSE de streamGenerateContent entregando cada trozo de texto a
+        on_text. Mide el time-to-first-token; devuelve (review_text, tokens) o None.
+        """
+        inicio = time.monotonic()
+        ttft = None
+        partes = []
+        ultimo = {}
+        recibidos = 0
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                recibidos += len(line) + 1
+                if not line or not line.startswith("data:"):
+                    continue
+                evento = json.loads(line[5:])
+                ultimo = evento
+                for candidate in evento.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        texto = part.get("text", "")
+                        if not texto:
+                            continue
+                        if ttft is None:
+                            ttft = time.monotonic() - inicio
+                            print(f"   ⚡ Primer token en {ttft:.2f}s")
+                        partes.append(texto)
+                        on_text(texto)
+        except Exception as e:
+            print(f"   ❌ Stream interrumpido: {e}")
+            return None
+        finally:
+            response.close()
+            metrics.observe("parse", time.monotonic() - inicio)
+            metrics.count("bytes_received", recibidos)
+
+        duracion = time.monotonic() - inicio
+        usage_metadata = ultimo.get("usageMetadata", {})
+        total_tokens = usage_metadata.get("totalTokenCount", 0)
+        if ttft is not None:
+            with self.lock:
+                self.ttfts.append(ttft)
+        print(f"   ✅ Stream completo en {duracion:.1f}s")
+
+        with self.lock:
+            self.tokens_used += total_tokens
+        metrics.count("tokens", total_tokens)
+        if self.ledger:
+            self.ledger.record(
+                tokens=total_tokens,
+                prompt_chars=len(prompt) if usage_metadata.get("promptTokenCount") else 0,
+                prompt_tokens=usage_metadata.get("promptTokenCount", 0),
+                output_tokens=usage_metadata.get("candidatesTokenCount", 0),
+                responses=1,
+                latency_total=duracion
+            )
+        if log_name:
+            log_gemini_response(self.manifest, log_name, ultimo, total_tokens)
+
+        review_text = "".join(partes).strip()
+        if not review_text:
+            print(f"   ⚠️ Texto de review vacío")
+            return None
+        return review_text, total_tokens
+
+    def extraer_review(self, response, log_name, prompt=""):
+        """Extrae (review_text, tokens) de una respuesta 200 de Gemini, o None"""
+        metrics.count("bytes_received", len(response.content))
+        try:
+            with metrics.stage("parse"):
+                result = response.json()
+            print(f"   ✅ Response recibida de Gemini")
+            
+            # Extraer información de tokens para logging
+            usage_metadata = result.get("usageMetadata", {})
+            total_tokens = usage_metadata.get("totalTokenCount", 0)
+
+            # Consumo real en el ledger; también calibra el estimador offline
+            with self.lock:
+                self.tokens_used += total_tokens
+            metrics.count("tokens", total_tokens)
+            if self.ledger:
+                self.ledger.record(
+                    tokens=total_tokens,
+                    prompt_chars=len(prompt) if usage_metadata.get("promptTokenCount") else 0,
+                    prompt_tokens=usage_metadata.get("promptTokenCount", 0),
+                    output_tokens=usage_metadata.get("candidatesTokenCount", 0),
+                    responses=1,
+                    latency_total=response.elapsed.total_seconds()
+                )
+            
+            # Guardar log de respuesta
+            if log_name:
+                log_gemini_response(self.manifest, log_name, result, total_tokens)
+            
+            candidates = result.get("candidates", [])
+            if not candidates:
+                print(f"   ⚠️ No se recibieron candidatos en la respuesta")
+                return None
+                
+            content = candidates[0].get("content", {})
+            parts = content.get("parts", [])
+            
+            if not parts:
+                print(f"   ⚠️ No se recibió contenido en la respuesta")
+                return None
+            
+            review_text = parts[0].get("text", "").strip()
+            
+            if not review_text:
+                print(f"   ⚠️ Texto de review vacío")
+                return None
+
+            return review_text, total_tokens
+            
+        except Exception as e:
+            print(f"   ❌ Error procesando respuesta JSON: {e}")
+            print(f"   📄 Response content: {response.text[:200]}...")
+            return None
+
+def code_review_gemini(repo_path, owner, remote_url, stack_override=None, workers=1, rpm=GEMINI_RPM, index=None, since=None,
+                       chunk_tokens=CHUNK_TOKENS, batch_tokens=BATCH_TOKENS, dry_run=False, stream=False, resume=False,
+                       paths=None, sha=None, branch=True, limiter=None, presupuesto=None,
+                       dedup_threshold=DEDUP_THRESHOLD, diff=True, cache=True):
+    """
+    Realiza code review usando Gemini AI con detección de stack y filtros de seguridad.
+    Con since (ref de git, o "" para usar el último commit revisado) solo revisa
+    los archivos que devuelve git diff desde esa referencia. Con dry_run solo
+    imprime el plan (requests, tokens y tiempo) sin enviar nada. Con resume
+    continúa el job anterior desde su cola (review/manifest.db) sin recorrer el repo.
+    paths (relativos) limita el review a esos archivos y sha fija el commit del
+    status; los usa --action serve junto con branch=False y un limiter compartido.
+    presupuesto (reviews, tokens) reemplaza lo que queda del día: es la parte
+    que el scheduler de --action org le asigna a este repo. Los archivos casi
+    duplicados (similitud >= dedup_threshold) comparten un único review. Con
+    diff, los archivos ya revisados que cambiaron poco envían solo sus hunks.
+    Con cache, cada prompt se busca antes en la cache de respuestas de OCTO_HOME.
+    """
+    print(f"Resolved repo path: {os.path.abspath(repo_path)}")
+    if not GEMINI_API_KEY and not dry_run:
+        print("❌ Error: GEMINI_API_KEY no está configurada en .env")
+        return
+
+    review_dir = os.path.join(repo_path, "review")
+    # El dry-run planifica sobre una copia en memoria: no importa reviews, ni guarda stacks ni poda nada
+    if not dry_run:
+        os.makedirs(review_dir, exist_ok=True)
+    manifest = ReviewManifest(review_dir, en_memoria=dry_run)
+    job = ReviewJob(manifest)
+
+    reanudar = resume and job.activo()
+    if resume and not reanudar:
+        print("ℹ️ No hay un review pendiente que continuar; se inicia uno nuevo.")
+
+    # En modo incremental (o al reanudar) solo hace falta recorrer el repo para detectar el stack
+    if not reanudar and ((since is None and paths is None) or not stack_override):
+        index = index or RepoIndex(repo_path)
+
+    # Detectar el stack de cada subárbol (cacheado en el manifest) o usar el override
+    if stack_override:
+        stacks = StackMap({".": stack_override})
+    elif reanudar:
+        stacks = StackMap(job.info().get("stacks", {}))
+    else:
+        stacks = detectar_stacks(repo_path, index, manifest)
+    if not stacks.stacks:
+        print("⚠️ Stack no detectado. Usa --stack para especificar: django, flask, node, react, restapi")
+    
+    print(f"🔧 Usando stack: {stacks.nombre()}")
+
+    # Crear branch temporal para documentación
+    temp_branch = None if dry_run or not branch else crear_branch_documentacion(stacks.nombre())
+
+    repo_name = (remote_url or "").rstrip("/").split("/")[-1]
+    if repo_name.endswith(".git"):
+        repo_name = repo_name[:-4]
+
+    if not dry_run and not sha:
+        sha = get_latest_commit_sha(owner, repo_name)
+        if not sha:
+            print("⚠️ No se pudo obtener el SHA para crear status en GitHub.")
+            manifest.close()
+            return
+
+    ledger = BudgetLedger(en_memoria=dry_run)
+    response_cache = ResponseCache() if cache and not dry_run else None
+    head = git_head(repo_path)
+    try:
+        entries = None
+        if reanudar:
+            entries = entries_from_paths(repo_path, job.por_revisar())
+            print(f"⏯️ Continuando el review anterior: {len(entries)} archivos pendientes ({job.resumen()})")
+        elif paths is not None:
+            entries = entries_from_paths(repo_path, [os.path.normpath(p) for p in paths])
+            print(f"🎯 {len(entries)} archivos Python a revisar")
+        elif since is not None:
+            ref = since or manifest.get_meta(LAST_REVIEWED_KEY)
+            if not ref:
+                print("⚠️ No hay un commit revisado previamente; se revisará el repositorio completo.")
+            else:
+                cambios_git = git_changed_files(repo_path, ref)
+                if cambios_git is not None:
+                    cambiados, renombrados, eliminados = cambios_git
+                    trasladar_reviews(renombrados, manifest, review_dir)
+                    manifest.forget(eliminados)
+                    entries = entries_from_paths(repo_path, cambiados)
+                    print(f"🔀 {len(entries)} archivos Python cambiados desde {ref[:12]}")
+
+        if entries is None:
+            index = index or RepoIndex(repo_path)
+            entries = index.python_files()
+            # Recorrido completo: lo que el manifest conoce y ya no está en disco se borró
+            manifest.forget(set(manifest.entries) - {entry.rel_path for entry in entries})
+
+        # Contar archivos para progreso
+        total_files = len(entries)
+        if total_files == 0:
+            print("📄 No se encontraron archivos Python para revisar.")
+            if since is not None and head:
+                manifest.set_meta(LAST_REVIEWED_KEY, head)
+            return
+
+        pendientes, sin_cambios = detectar_cambios(entries, manifest, review_dir)
+        print(f"✅ {len(sin_cambios)} archivos sin cambios desde el último review")
+
+        a_revisar, duplicados = deduplicar(pendientes, stacks, dedup_threshold)
+        if duplicados:
+            print(f"🧬 {len(pendientes) - len(a_revisar)} archivos casi duplicados compartirán el review "
+                  f"de {len(duplicados)} representantes")
+
+        # Lo más riesgoso primero: si el límite diario se agota, lo que queda afuera es lo menos crítico
+        riesgo = puntuar_riesgo(a_revisar, repo_path, manifest, stacks)
+        a_revisar.sort(key=lambda item: riesgo[item[0].rel_path], reverse=True)
+        if riesgo:
+            print("🎯 Mayor riesgo: " + ", ".join(f"{entry.rel_path} ({riesgo[entry.rel_path]:.2f})"
+                                                 for entry, _, _ in a_revisar[:5]))
+
+        workers = max(1, workers)
+        lotes, individuales = agrupar_en_lotes(a_revisar, batch_tokens, stacks)
+        if lotes:
+            print(f"📦 {sum(len(l) for l in lotes)} archivos pequeños agrupados en {len(lotes)} lotes")
+
+        # Planificar con el estimador offline y recortar a lo que queda del día
+        estimator = ledger.estimator()
+        reviews_restantes, tokens_restantes = ledger.remaining(DAILY_LIMIT, DAILY_TOKEN_LIMIT)
+        if presupuesto:
+            reviews_restantes, tokens_restantes = presupuesto
+        plan = priorizar_plan(planificar_trabajo(lotes, individuales, stacks, manifest, chunk_tokens, estimator, diff),
+                              riesgo)
+        plan, deferred = ajustar_a_presupuesto(plan, reviews_restantes, tokens_restantes)
+        imprimir_plan(plan, deferred, len(sin_cambios), estimator, rpm, workers, ledger)
+        if dry_run:
+            print("🧪 Dry-run: no se envió ningún request.")
+            return
+
+        # La cola persiste el estado de cada archivo para poder continuar con --resume
+        if reanudar:
+            job.hechos([entry.rel_path for entry in sin_cambios])
+        else:
+            job.iniciar([entry.rel_path for entry, _, _ in pendientes], [entry.rel_path for entry in sin_cambios],
+                        stacks=stacks.stacks, head=head, inicio=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+        # Un único status por ejecución: pending al inicio y resumen al final
+        status = StatusAggregator(github, owner, repo_name, sha)
+        status.publish_pending(total_files)
+        for entry in sin_cambios:
+            status.add(entry.rel_path, "unchanged")
+
+        print(f"🔍 Iniciando review de {len(pendientes)} archivos Python con {workers} worker(s)...")
+        runner = ReviewRunner(repo_path, stacks, review_dir, max(1, len(pendientes)),
+                              rpm=rpm, workers=workers, manifest=manifest, status=status,
+                              chunk_tokens=chunk_tokens, ledger=ledger, review_limit=reviews_restantes,
+                              stream=stream, job=job, limiter=limiter, duplicados=duplicados, diff=diff,
+                              cache=response_cache)
+
+        ronda = plan
+        while ronda:
+            ejecutar_plan(runner, ronda, workers)
+            ronda = reintentos_vencidos(job, repo_path, runner)
+
+        fallidos = job.fallidos()
+        incompleto = runner.limit_reached.is_set() or bool(deferred) or bool(job.reintentables())
+        status.publish(incomplete=incompleto)
+        print(f"🐙 GitHub: {github.rate_summary()}")
+        if fallidos:
+            print(f"❌ {len(fallidos)} archivos con error:")
+            for rel_path, intentos, error in fallidos[:10]:
+                print(f"   - {rel_path}: {error} ({intentos} intentos)")
+        if incompleto:
+            print("⏯️ Review incompleto; continúa con --resume")
+
+        # Solo se avanza el ancla si no quedó nada pendiente (y se revisó todo lo cambiado, no una lista dada)
+        if head and not incompleto and not fallidos and paths is None:
+            manifest.set_meta(LAST_REVIEWED_KEY, head)
+    finally:
+        manifest.close()
+        ledger.close()
+        if response_cache:
+            response_cache.close()
+
+    if incompleto:
+        return runner
+
+    print(f"\n🎉 Review completado! {runner.reviewed_count} archivos procesados de {total_files} totales.")
     
     if temp_branch:
         print(f"🌿 Documentación generada en branch: {temp_branch}")
         print("   Para mergear: git checkout main && git merge", temp_branch)
+    return runner
 
-def find_secrets_and_update_env(repo_path):
-    """Busca patrones sospechosos en código y actualiza .env"""
+def ejecutar_plan(runner, plan, workers):
+    """Reparte las unidades del plan (lotes y archivos) entre los workers y espera a que terminen"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(runner.revisar_lote if tipo == "lote" else runner.revisar_archivo,
+                               *([payload] if tipo == "lote" else payload))
+                   for tipo, payload, _, _ in plan]
+        for future in futures:
+            future.result()
+
+def reintentos_vencidos(job, repo_path, runner):
+    """
+    Espera al próximo reintento de los archivos con fallos transitorios y
+    devuelve la ronda a enviar. Si falta más de JOB_MAX_WAIT, o se agotó el
+    límite diario, no espera y los deja en la cola para --resume.
+    """
+    reintentar = job.reintentables()
+    if not reintentar or runner.limit_reached.is_set():
+        return []
+    espera = max(0.0, min(t for _, t in reintentar) - time.time())
+    if espera > JOB_MAX_WAIT:
+        print(f"⏳ {len(reintentar)} archivos con fallos transitorios quedan para --resume")
+        return []
+    print(f"🔁 Reintentando {len(reintentar)} archivo(s) fallido(s) en {espera:.0f}s...")
+    time.sleep(espera)
+
+    vencidos = [p for p, t in reintentar if t <= time.time()]
+    encontrados = entries_from_paths(repo_path, vencidos)
+    for rel_path in set(vencidos) - {entry.rel_path for entry in encontrados}:
+        job.fallo(rel_path, "archivo no encontrado", transitorio=False)
+    ronda = []
+    for entry, code, code_hash in map(leer_y_hashear, encontrados):
+        if code is None:
+            job.fallo(entry.rel_path, "no se pudo leer", transitorio=False)
+            continue
+        ronda.append(("archivo", (entry, code, code_hash), 1, 0))
+    return ronda
+
+class PollWatcher:
+    """
+    Detecta archivos .py y marcadores de stack modificados comparando mtimes.
+    Un directorio solo se vuelve a listar si cambió su propio mtime (se creó,
+    borró o renombró algo dentro); para el resto basta un stat por archivo.
+    """
+    def __init__(self, index):
+        self.root = index.root
+        self.files = {e.rel_path: e.mtime for e in index.files if self._vigilado(e.rel_path)}
+        self.dirs = {}
+        for rel_dir in ["."] + [d for d, _ in index.dirs]:
+            try:
+                self.dirs[rel_dir] = os.stat(os.path.join(self.root, rel_dir)).st_mtime_ns
+            except OSError:
+                continue
+
+    @staticmethod
+    def _vigilado(rel_path):
+        name = os.path.basename(rel_path).lower()
+        return name.endswith(".py") or name in STACK_MARKERS
+
+    def _listar(self, rel_dir, cambios):
+        """Agrega lo nuevo de un directorio; los subdirectorios nuevos se recorren completos"""
+        try:
+            entries = list(os.scandir(os.path.join(self.root, rel_dir)))
+        except OSError:
+            return
+        for entry in entries:
+            rel_path = os.path.normpath(os.path.join(rel_dir, entry.name))
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name.endswith(EXCLUDE_DIRS) or rel_path in self.dirs:
+                        continue
+                    self.dirs[rel_path] = entry.stat().st_mtime_ns
+                    self._listar(rel_path, cambios)
+                elif entry.is_file() and rel_path not in self.files and self._vigilado(rel_path):
+                    self.files[rel_path] = entry.stat().st_mtime_ns
+                    cambios.add(rel_path)
+            except OSError:
+                continue
+
+    def poll(self):
+        """Paths relativos creados o modificados desde el sondeo anterior"""
+        cambios = set()
+        for rel_dir, mtime in list(self.dirs.items()):
+            try:
+                current = os.stat(os.path.join(self.root, rel_dir)).st_mtime_ns
+            except OSError:
+                del self.dirs[rel_dir]
+                continue
+            if current != mtime:
+                self.dirs[rel_dir] = current
+                self._listar(rel_dir, cambios)
+        for rel_path, mtime in list(self.files.items()):
+            try:
+                current = os.stat(os.path.join(self.root, rel_path)).st_mtime_ns
+            except OSError:
+                del self.files[rel_path]
+                continue
+            if current != mtime:
+                self.files[rel_path] = current
+                cambios.add(rel_path)
+        return cambios
+
+def vigilar(repo_path, stack_override=None, workers=1, rpm=GEMINI_RPM, interval=WATCH_INTERVAL,
+            debounce=WATCH_DEBOUNCE, chunk_tokens=CHUNK_TOKENS, batch_tokens=BATCH_TOKENS, stream=False,
+            exportar=None, cache=True, dedup_threshold=DEDUP_THRESHOLD, diff=True):
+    """
+    Proceso de larga duración que revisa cada archivo al guardarlo. Mantiene
+    en memoria la sesión HTTP, el índice, el stack, el manifest y el rate
+    limiter (su backoff por 429 sobrevive entre rondas); sondea
+    mtimes cada `interval` segundos y, cuando pasan `debounce` segundos sin
+    guardados nuevos, revisa solo los archivos tocados cuyo contenido cambió.
+    exportar() se llama tras cada ronda para refrescar los archivos de métricas.
+    """
+    if not GEMINI_API_KEY:
+        print("❌ Error: GEMINI_API_KEY no está configurada en .env")
+        return
+
+    review_dir = os.path.join(repo_path, "review")
+    os.makedirs(review_dir, exist_ok=True)
+    manifest = ReviewManifest(review_dir)
+    ledger = BudgetLedger()
+    response_cache = ResponseCache() if cache else None
+    session = gemini_session(workers)
+    index = RepoIndex(repo_path)
+    watcher = PollWatcher(index)
+    stacks = StackMap({".": stack_override}) if stack_override else detectar_stacks(repo_path, index, manifest)
+    workers = max(1, workers)
+    limiter = RateLimiter(rpm, burst=workers)
+
+    print(f"👀 Vigilando {os.path.abspath(repo_path)} ({len(watcher.files)} archivos, stack {stacks.nombre()}). "
+          f"Ctrl+C para salir.")
+    acumulados = set()
+    ultimo_cambio = 0.0
+    try:
+        while True:
+            time.sleep(interval)
+            cambios = watcher.poll()
+            if cambios:
+                acumulados |= cambios
+                ultimo_cambio = time.monotonic()
+                continue
+            if not acumulados or time.monotonic() - ultimo_cambio < debounce:
+                continue
+
+            tocados, acumulados = sorted(acumulados), set()
+            if not stack_override and any(os.path.basename(p).lower() in STACK_MARKERS for p in tocados):
+                stacks = detectar_stacks(repo_path, RepoIndex(repo_path), manifest)
+
+            pendientes, _ = detectar_cambios(entries_from_paths(repo_path, tocados), manifest, review_dir)
+            if not pendientes:
+                continue
+            print(f"\n✏️ {len(pendientes)} archivo(s) modificado(s): "
+                  f"{', '.join(entry.rel_path for entry, _, _ in pendientes[:5])}")
+
+            a_revisar, duplicados = deduplicar(pendientes, stacks, dedup_threshold)
+            lotes, individuales = agrupar_en_lotes(a_revisar, batch_tokens, stacks)
+            reviews_restantes, tokens_restantes = ledger.remaining(DAILY_LIMIT, DAILY_TOKEN_LIMIT)
+            plan = planificar_trabajo(lotes, individuales, stacks, manifest, chunk_tokens, ledger.estimator(), diff)
+            plan, deferred = ajustar_a_presupuesto(plan, reviews_restantes, tokens_restantes)
+            if deferred:
+                print(f"⚠️ Presupuesto diario agotado: {len(deferred)} unidad(es) sin revisar")
+
+            runner = ReviewRunner(repo_path, stacks, review_dir, len(pendientes), rpm=rpm, workers=workers,
+                                  manifest=manifest, chunk_tokens=chunk_tokens, ledger=ledger,
+                                  review_limit=reviews_restantes, stream=stream, session=session,
+                                  limiter=limiter, duplicados=duplicados, diff=diff, cache=response_cache)
+            ejecutar_plan(runner, plan, workers)
+            print(f"✅ {runner.reviewed_count} revisado(s), {runner.failed} con error. Vigilando...")
+            if exportar:
+                exportar()
+    except KeyboardInterrupt:
+        print("\n👋 Watch detenido")
+    finally:
+        session.close()
+        manifest.close()
+        ledger.close()
+        if response_cache:
+            response_cache.close()
+
+def clonar_o_actualizar(workdir, full_name, clone_url):
+    """Checkout de owner/nombre en workdir: lo clona la primera vez y después solo hace fetch"""
+    path = os.path.join(workdir, *full_name.split("/"))
+    if not os.path.isdir(os.path.join(path, ".git")):
+        subprocess.run(["git", "clone", "-q", clone_url, path], check=True, capture_output=True, text=True)
+    else:
+        subprocess.run(["git", "-C", path, "fetch", "-q", "origin"], check=True, capture_output=True, text=True)
+    return path
+
+def sincronizar_checkout(workdir, job):
+    """Clona o actualiza el checkout del repo del webhook y lo deja en job.sha; devuelve su path o None"""
+    try:
+        path = clonar_o_actualizar(workdir, job.full_name, job.clone_url)
+        if job.pull_number:
+            # El head de un PR desde un fork no está en las ramas de origin
+            subprocess.run(["git", "-C", path, "fetch", "-q", "origin", f"pull/{job.pull_number}/head"],
+                           capture_output=True, text=True)
+        subprocess.run(["git", "-C", path, "checkout", "-q", "--detach", job.sha],
+                       check=True, capture_output=True, text=True)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"❌ No se pudo preparar el checkout de {job.full_name}: {getattr(e, 'stderr', '') or e}")
+        return None
+    return path
+
+def archivos_del_webhook(path, job):
+    """Paths cambiados del push (git diff desde before) o del PR (API de GitHub)"""
+    if job.pull_number:
+        status, files, _ = github.get_all(f"/repos/{job.full_name}/pulls/{job.pull_number}/files")
+        if status == 200:
+            return [f["filename"] for f in files if f.get("status") != "removed"]
+        print(f"⚠️ No se pudieron listar los archivos del PR #{job.pull_number}: {status}")
+    elif job.base:
+        # El payload trae como mucho 20 commits; el diff local no tiene ese límite
+        diff = git_changed_files(path, job.base)
+        if diff is not None:
+            return diff[0]
+    return job.paths or []
+
+def procesar_webhook(job, workdir, stack_override=None, workers=1, limiter=None, **opciones):
+    """Revisa los archivos que cambió un push o un PR y publica el status en su commit"""
+    path = sincronizar_checkout(workdir, job)
+    if not path:
+        raise RuntimeError("checkout no disponible")
+    paths = archivos_del_webhook(path, job)
+    print(f"🔔 {job.event} de {job.full_name}@{job.sha[:12]}: {len(paths)} archivos cambiados")
+    code_review_gemini(path, job.owner, job.clone_url, stack_override, workers=workers, paths=paths,
+                       sha=job.sha, branch=False, limiter=limiter, **opciones)
+
+def servir(workdir, host="127.0.0.1", port=8080, jobs=2, queue_size=100, stack_override=None, workers=1,
+           rpm=GEMINI_RPM, exportar=None, **opciones):
+    """
+    --action serve: recibe webhooks push/pull_request en WEBHOOK_PATH y los
+    revisa con `jobs` workers. Todos comparten un único rate limiter de Gemini.
+    exportar() se llama tras cada trabajo para refrescar los archivos de métricas.
+    """
+    if not GITHUB_WEBHOOK_SECRET:
+        print("❌ Error: GITHUB_WEBHOOK_SECRET no está configurado en .env")
+        return
+    if not GEMINI_API_KEY:
+        print("❌ Error: GEMINI_API_KEY no está configurada en .env")
+        return
+    os.makedirs(workdir, exist_ok=True)
+    limiter = RateLimiter(rpm, burst=max(1, workers))
+
+    def procesar(job):
+        try:
+            procesar_webhook(job, workdir, stack_override, workers, limiter, rpm=rpm, **opciones)
+        finally:
+            if exportar:
+                exportar()
+
+    server = WebhookServer((host, port), GITHUB_WEBHOOK_SECRET, procesar, workers=jobs, queue_size=queue_size)
+    print(f"🛰️ Escuchando webhooks en http://{host}:{server.server_address[1]}{WEBHOOK_PATH} "
+          f"({jobs} jobs en paralelo, cola de {queue_size}, checkouts en {workdir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Deteniendo; terminando los trabajos en cola...")
+    finally:
+        server.detener()
+        print(f"📊 {server.counters}")
+
+OrgRepo = namedtuple("OrgRepo", ["full_name", "clone_url", "path"])  # path: checkout local a revisar en el lugar
+
+def _full_name(url):
+    """owner/nombre de una URL remota de GitHub (https o ssh)"""
+    match = re.search(r"[:/]([^/:]+)/([^/]+?)(?:\.git)?/?$", url or "")
+    return f"{match.group(1)}/{match.group(2)}" if match else None
+
+def git_remote(repo_path):
+    """URL de origin del repo local, o None"""
+    try:
+        result = subprocess.run(["git", "-C", repo_path, "remote", "get-url", "origin"],
+                                capture_output=True, text=True, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    return result.stdout.strip() or None
+
+def listar_repos_org(owner=None, repos_file=None):
+    """
+    Repos de --action org: los de un archivo (una línea por repo: owner/nombre,
+    URL de clone o path de un checkout local; # comenta) y/o todos los del
+    owner en GitHub, sin archivados ni forks (se revisan en su repo de origen).
+    """
+    repos = []
+    if repos_file:
+        with open(repos_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                if os.path.isdir(line):
+                    remote = git_remote(line)
+                    repos.append(OrgRepo(_full_name(remote) or os.path.basename(os.path.abspath(line)), remote, line))
+                elif "://" in line or line.startswith("git@"):
+                    repos.append(OrgRepo(_full_name(line), line, None))
+                else:
+                    repos.append(OrgRepo(line.strip("/"), f"https://github.com/{line.strip('/')}.git", None))
+    if owner:
+        status, items, _ = github.get_all(f"/users/{owner}/repos")
+        if status != 200:
+            print(f"❌ Error listando los repos de {owner}: {status} {items}")
+        else:
+            repos.extend(OrgRepo(r["full_name"], r["clone_url"], None) for r in items
+                         if not r.get("archived") and not r.get("fork"))
+
+    vistos = set()
+    unicos = []
+    for repo in repos:
+        if not repo.full_name or repo.full_name in vistos:
+            if not repo.full_name:
+                print(f"⚠️ No se pudo identificar el repo {repo.clone_url or repo.path}; se omite")
+            continue
+        vistos.add(repo.full_name)
+        unicos.append(repo)
+    return unicos
+
+def revisar_repo_org(repo, workdir, scheduler, stack_override, workers, rpm, opciones):
+    """
+    Revisa un repo de --action org dentro de un proceso del pool. Pide su parte
+    del presupuesto diario al scheduler, devuelve lo que no usa y escribe toda
+    la salida en <workdir>/<owner>__<nombre>.log.
+    """
+    metrics.reset()  # el proceso del pool puede venir de revisar otro repo
+    cuota = RepoQuota(scheduler, repo.full_name)
+    log_path = os.path.join(workdir, f"{repo.full_name.replace('/', '__')}.log")
+    resultado = {"repo": repo.full_name, "reviewed": 0, "failed": 0, "error": None, "log": log_path}
+    inicio = time.monotonic()
+    reviews, tokens = cuota.asignar()
+    runner = None
+    with open(log_path, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        try:
+            if repo.path:
+                path = repo.path
+            else:
+                path = clonar_o_actualizar(workdir, repo.full_name, repo.clone_url)
+                subprocess.run(["git", "-C", path, "checkout", "-q", "--detach", "origin/HEAD"],
+                               check=True, capture_output=True, text=True)
+            owner = repo.full_name.split("/", 1)[0]
+            runner = code_review_gemini(path, owner, repo.clone_url or repo.full_name, stack_override, workers, rpm,
+                                        sha=git_head(path), branch=False, limiter=cuota,
+                                        presupuesto=(reviews, tokens), **opciones)
+        except Exception as e:
+            resultado["error"] = (getattr(e, "stderr", "") or str(e)).strip()
+            print(f"❌ {resultado['error']}")
+        finally:
+            usados, tokens_usados = (runner.units_used, runner.tokens_used) if runner else (0, 0)
+            cuota.devolver(reviews - usados, None if tokens is None else tokens - tokens_usados)
+    if runner:
+        resultado.update(reviewed=runner.reviewed_count, failed=runner.failed)
+    resultado["segundos"] = time.monotonic() - inicio
+    resultado["metrics"] = metrics.snapshot()
+    return resultado
+
+def revisar_org(owner=None, repos_file=None, workdir="checkouts", procs=2, stack_override=None, workers=1,
+                rpm=GEMINI_RPM, **opciones):
+    """
+    --action org: revisa varios repos en paralelo con un pool de `procs`
+    procesos. Un único QuotaScheduler (en el proceso del QuotaManager) reparte
+    entre todos el rpm de Gemini, por turnos, y lo que queda del límite diario.
+    Las métricas de cada proceso se suman a las de esta ejecución.
+    """
+    if not GEMINI_API_KEY and not opciones.get("dry_run"):
+        print("❌ Error: GEMINI_API_KEY no está configurada en .env")
+        return
+    repos = listar_repos_org(owner, repos_file)
+    if not repos:
+        print("📄 No hay repos que revisar.")
+        return
+    os.makedirs(workdir, exist_ok=True)
+
+    ledger = BudgetLedger(en_memoria=opciones.get("dry_run", False))
+    reviews, tokens = ledger.remaining(DAILY_LIMIT, DAILY_TOKEN_LIMIT)
+    ledger.close()
+    procs = max(1, min(procs, len(repos)))
+    print(f"🏢 {len(repos)} repos con {procs} procesos; compartiendo {rpm} rpm y {reviews} reviews"
+          f"{f' / {tokens} tokens' if tokens is not None else ''} restantes del día")
+
+    # Los procesos del pool heredan el cliente de GitHub: que no hereden conexiones abiertas
+    github.session.close()
+    if github.cache:
+        github.cache.close()
+
+    resultados = []
+    with QuotaManager() as manager:
+        scheduler = manager.QuotaScheduler(rpm, max(1, workers), reviews, tokens, len(repos))
+        with ProcessPoolExecutor(max_workers=procs) as pool:
+            futures = [pool.submit(revisar_repo_org, repo, workdir, scheduler, stack_override, workers, rpm, opciones)
+                       for repo in repos]
+            for future in as_completed(futures):
+                resultado = future.result()
+                resultados.append(resultado)
+                metrics.merge(resultado["metrics"])
+                estado = f"❌ {resultado['error']}" if resultado["error"] else \
+                    f"✅ {resultado['reviewed']} revisados, {resultado['failed']} con error"
+                print(f"[{len(resultados)}/{len(repos)}] {resultado['repo']}: {estado} "
+                      f"({resultado['segundos']:.0f}s, log en {resultado['log']})")
+        requests_por_repo = scheduler.resumen()
+
+    print("\n📊 Requests a Gemini por repo:")
+    for resultado in sorted(resultados, key=lambda r: r["repo"]):
+        print(f"   {resultado['repo']}: {requests_por_repo.get(resultado['repo'], 0)}")
+    con_error = [r for r in resultados if r["error"]]
+    print(f"🎉 Org completada: {len(resultados) - len(con_error)}/{len(repos)} repos revisados, "
+          f"{sum(r['reviewed'] for r in resultados)} archivos")
+    return resultados
+
+def exportar_reviews(repo_path, output=None, selector=None):
+    """
+    Genera los .md de los reviews guardados en review/manifest.db. selector
+    filtra por path relativo del archivo o por el sha256 de su contenido.
+    """
+    review_dir = os.path.join(repo_path, "review")
+    if not os.path.exists(os.path.join(review_dir, MANIFEST_NAME)):
+        print(f"❌ No hay reviews guardados en {review_dir}")
+        return 0
+    output = output or review_dir
+    os.makedirs(output, exist_ok=True)
+
+    manifest = ReviewManifest(review_dir)
+    try:
+        if selector:
+            rel_paths = manifest.reviews_by_hash(selector) or [os.path.normpath(selector)]
+            rows = [(rel_path, stored[1]) for rel_path in rel_paths
+                    for stored in [manifest.get_review(rel_path)] if stored]
+        else:
+            rows = manifest.iter_reviews()
+        for rel_path, markdown in rows:
+            with open(os.path.join(output, review_filename_for(rel_path)), "w", encoding="utf-8") as md_file:
+                md_file.write(markdown)
+    finally:
+        manifest.close()
+
+    if selector and not rows:
+        print(f"❌ No hay review guardado para {selector}")
+    else:
+        print(f"📤 {len(rows)} reviews exportados a {output}")
+    return len(rows)
+
+def find_secrets_and_update_env(repo_path, index=None, report_path=None, workers=None):
+    """Busca patrones sospechosos en código, escribe un reporte estructurado y actualiza .env"""
     print("🔍 Buscando secretos y configuraciones sensibles...")
     
-    suspicious_patterns = {
-        "DATABASE_URL": r"database[_\-]?url\s*[:=]\s*[\"']?([^\"'\n]+)",
-        "PASSWORD": r"password\s*[:=]\s*[\"']?([^\"'\n]+)",
-        "USER": r"user(?:name)?\s*[:=]\s*[\"']?([^\"'\n]+)",
-        "HOST": r"host\s*[:=]\s*[\"']?([^\"'\n]+)",
-        "PORT": r"port\s*[:=]\s*[\"']?([^\"'\n]+)",
-        "API_KEY": r"api[_\-]?key\s*[:=]\s*[\"']?([^\"'\n]+)",
-        "SECRET": r"secret\s*[:=]\s*[\"']?([^\"'\n]+)"
-    }
-    
-    secrets = {}
-    files_scanned = 0
+    index = index or RepoIndex(repo_path)
+    items = [(entry.path, entry.rel_path) for entry in index.files if entry.path.endswith(SCAN_EXTENSIONS)]
+    files_scanned = len(items)
 
-    for root, _, files in os.walk(repo_path):
-        if any(ex in root for ex in EXCLUDE_PATHS):
-            continue
-        for file in files:
-            if file.endswith((".py", ".js", ".env.example", ".env", ".yml", ".yaml")):
-                filepath = os.path.join(root, file)
-                files_scanned += 1
-                
-                try:
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        
-                    for key, pattern in suspicious_patterns.items():
-                        matches = re.findall(pattern, content, re.I)
-                        for match in matches:
-                            if match and len(match) > 3:  # Evitar matches muy cortos
-                                secrets[key] = match
-                                
-                except Exception as e:
-                    print(f"⚠️ Error leyendo {filepath}: {e}")
+    findings, errors = scan_files(items, workers)
+    for rel_path, error in errors:
+        print(f"⚠️ Error leyendo {rel_path}: {error}")
+
+    report_path = report_path or os.path.join(repo_path, SECRETS_REPORT)
+    write_report(findings, report_path)
+    print(f"📄 Reporte con {len(findings)} hallazgos: {report_path}")
+
+    # Para .env se conserva el último valor encontrado por variable
+    secrets = {}
+    for finding in findings:
+        secrets[finding["rule"]] = finding["value"]
 
     env_path = os.path.join(repo_path, ".env")
     if secrets:
@@ -555,11 +2765,10 @@ def check_pull_requests():
         
     print(f"🔍 Consultando Pull Requests para {GITHUB_USERNAME}...")
     
-    url = f"https://api.github.com/search/issues?q=is:pr+is:open+user:{GITHUB_USERNAME}"
-    response = requests.get(url, headers=GITHUB_HEADERS)
+    status, prs, data = github.get_all("/search/issues", {"q": f"is:pr is:open user:{GITHUB_USERNAME}"},
+                                       items_key="items")
     
-    if response.status_code == 200:
-        data = response.json()
+    if status == 200:
         total_prs = data.get("total_count", 0)
         
         if total_prs == 0:
@@ -567,7 +2776,7 @@ def check_pull_requests():
             return
             
         print(f"📋 Tienes {total_prs} Pull Request(s) abiertas:")
-        for i, pr in enumerate(data.get("items", [])[:10], 1):  # Mostrar máximo 10
+        for i, pr in enumerate(prs, 1):
             repo_name = pr['repository_url'].split("/")[-1]
             created = pr['created_at'][:10]  # Solo fecha
             print(f"  {i}. 📁 [{repo_name}] {pr['title']}")
@@ -575,7 +2784,7 @@ def check_pull_requests():
             print(f"     🔗 {pr['html_url']}")
             print()
     else:
-        print(f"❌ Error consultando PRs: {response.status_code} {response.text}")
+        print(f"❌ Error consultando PRs: {status} {prs}")
 
 def check_forks():
     """Consulta forks de los repositorios del usuario en GitHub"""
@@ -585,11 +2794,9 @@ def check_forks():
         
     print(f"🔍 Consultando forks para {GITHUB_USERNAME}...")
     
-    url = f"https://api.github.com/users/{GITHUB_USERNAME}/repos?per_page=100"
-    response = requests.get(url, headers=GITHUB_HEADERS)
+    status, repos, _ = github.get_all(f"/users/{GITHUB_USERNAME}/repos")
     
-    if response.status_code == 200:
-        repos = response.json()
+    if status == 200:
         forked_repos = []
         
         for repo in repos:
@@ -617,7 +2824,7 @@ def check_forks():
             print(f"     🔗 {repo['url']}")
             print()
     else:
-        print(f"❌ Error consultando repos: {response.status_code} {response.text}")
+        print(f"❌ Error consultando repos: {status} {repos}")
 
 def auto_commit():
     """Función de auto-commit mejorada"""
@@ -663,6 +2870,18 @@ def auto_commit():
     except subprocess.CalledProcessError as e:
         print(f"❌ Error en git: {e}")
 
+def exportar_metricas(profile=False, json_path=None, prometheus_path=None, labels=None):
+    """Salidas de las métricas de la ejecución: tabla (--profile), JSON (--metrics) y textfile (--prometheus)"""
+    if profile:
+        print(metrics.tabla())
+    try:
+        if json_path:
+            metrics.write_json(json_path)
+        if prometheus_path:
+            metrics.write_prometheus(prometheus_path, labels)
+    except OSError as e:
+        print(f"⚠️ No se pudieron escribir las métricas: {e}")
+
 def main():
     parser = argparse.ArgumentParser(
         description="🤖 CodeReviewBot - Herramienta unificada de automatización",
@@ -670,45 +2889,138 @@ def main():
         epilog="""
 Ejemplos de uso:
   python script.py --action review --repo ./mi-proyecto --owner miusuario --remote https://github.com/miusuario/mi-proyecto.git
+  python script.py --action review --repo ./mi-proyecto --owner miusuario --remote https://github.com/miusuario/mi-proyecto.git --workers 4
+  python script.py --action review --repo ./mi-proyecto --owner miusuario --remote https://github.com/miusuario/mi-proyecto.git --since
+  python script.py --action review --repo ./mi-proyecto --dry-run
+  python script.py --action review --repo ./mi-proyecto --owner miusuario --remote https://github.com/miusuario/mi-proyecto.git --profile --metrics metrics.json
   python script.py --action issue --repo ./mi-proyecto
+  python script.py --action issue --repo ./mi-proyecto --report hallazgos.sarif
   python script.py --action pull
   python script.py --action fork
   python script.py --action commit
+  python script.py --action export --repo ./mi-proyecto --output ./docs/reviews
+  python script.py --action watch --repo ./mi-proyecto
+  python script.py --action serve --workdir ./checkouts --port 8080
+  python script.py --action org --owner miorg --procs 4 --workers 2
+  python script.py --action org --repos repos.txt --since
         """
     )
     
     parser.add_argument("--repo", type=str, help="Ruta al repositorio local")
     parser.add_argument("--action", type=str, required=True,
-                        choices=["review", "issue", "pull", "fork", "commit"],
-                        help="Acción: review, issue, pull, fork, commit")
+                        choices=["review", "issue", "pull", "fork", "commit", "export", "watch", "serve", "org"],
+                        help="Acción: review, issue, pull, fork, commit, export, watch, serve, org")
     parser.add_argument("--remote", type=str, help="URL remota del repositorio (para review)")
-    parser.add_argument("--owner", type=str, help="Usuario dueño del repo (para review)")
-    parser.add_argument("--stack", type=str, help="Stack tecnológico (opcional): django, flask, node, react, restapi")
+    parser.add_argument("--owner", type=str, help="Usuario dueño del repo (para review; en org, revisar todos sus repos)")
+    parser.add_argument("--stack", type=str,
+                        help="Stack tecnológico para todo el repo (opcional; por defecto se detecta por subárbol): "
+                             "django, flask, node, react, restapi")
+    parser.add_argument("--report", type=str, help=f"Reporte de secretos (para issue): .json o .sarif (por defecto <repo>/{SECRETS_REPORT})")
+    parser.add_argument("--filters", type=str, help=f"JSON con reglas de redacción propias (por defecto <repo>/{FILTERS_FILE})")
+    parser.add_argument("--workers", type=int, default=1, help="Requests concurrentes a Gemini (para review)")
+    parser.add_argument("--since", type=str, nargs="?", const="",
+                        help="Revisar solo los archivos cambiados desde este ref de git (sin valor: último commit revisado)")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS,
+                        help="Tokens máximos por fragmento; archivos más grandes se dividen por clases/funciones")
+    parser.add_argument("--batch-tokens", type=int, default=BATCH_TOKENS,
+                        help="Tokens máximos por lote de archivos pequeños en un solo request (0 desactiva los lotes)")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="Similitud desde la que archivos casi duplicados comparten un review (0 lo desactiva)")
+    parser.add_argument("--full", action="store_true",
+                        help="Revisar completos los archivos cambiados en lugar de solo sus hunks")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="No consultar ni llenar la cache de respuestas compartida (OCTO_HOME/responses.db)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Solo mostrar requests, tokens y tiempo proyectados del review, sin enviar nada")
+    parser.add_argument("--stream", action="store_true",
+                        help="Usar streamGenerateContent y escribir el review a medida que llega")
+    parser.add_argument("--rpm", type=int, default=GEMINI_RPM, help="Requests por minuto compartidos por todos los workers")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continuar el review anterior desde su cola (pendientes, interrumpidos y fallidos)")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="Segundos entre sondeos (para watch)")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                        help="Segundos sin guardados antes de revisar los archivos tocados (para watch)")
+    parser.add_argument("--workdir", type=str, default="checkouts",
+                        help="Directorio de los checkouts de los repos (para serve y org)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host del servidor de webhooks (para serve)")
+    parser.add_argument("--port", type=int, default=8080, help="Puerto del servidor de webhooks (para serve)")
+    parser.add_argument("--jobs", type=int, default=2, help="Webhooks procesados en paralelo (para serve)")
+    parser.add_argument("--queue-size", type=int, default=100,
+                        help="Webhooks en espera antes de responder 503 (para serve)")
+    parser.add_argument("--repos", type=str,
+                        help="Archivo con un repo por línea: owner/nombre, URL de clone o path local (para org)")
+    parser.add_argument("--procs", type=int, default=2, help="Repos revisados en paralelo, uno por proceso (para org)")
+    parser.add_argument("--profile", action="store_true", help="Mostrar al final el tiempo por etapa y los contadores")
+    parser.add_argument("--metrics", type=str, help="Escribir las métricas de la ejecución en este JSON")
+    parser.add_argument("--prometheus", type=str,
+                        help="Escribir las métricas en formato textfile de Prometheus (node_exporter) en esta ruta")
+    parser.add_argument("--output", type=str, help="Directorio destino de los .md (para export; por defecto <repo>/review)")
+    parser.add_argument("--path", type=str, help="Exportar solo este archivo (path relativo o sha256 de su contenido)")
 
     args = parser.parse_args()
 
     print(f"🤖 CodeReviewBot iniciado - Acción: {args.action}")
     
     # Validaciones
-    if args.action in ["review", "issue"] and not args.repo:
-        print("❌ Error: --repo es requerido para las acciones 'review' y 'issue'")
+    if args.action in ["review", "issue", "export", "watch"] and not args.repo:
+        print("❌ Error: --repo es requerido para las acciones 'review', 'issue', 'export' y 'watch'")
         return
-    if args.action == "review" and (not args.remote or not args.owner):
+    if args.action == "review" and (not args.remote or not args.owner) and not args.dry_run:
         print("❌ Error: --remote y --owner son requeridos para la acción 'review'")
         return
 
+    if args.action == "org" and not args.owner and not args.repos:
+        print("❌ Error: --owner o --repos es requerido para la acción 'org'")
+        return
+
+    if args.action in ["review", "watch"]:
+        cargar_filtros_usuario(args.filters or os.path.join(args.repo, FILTERS_FILE))
+
+    # Índice de archivos compartido por todas las etapas de la ejecución
+    index = RepoIndex(args.repo) if args.action == "issue" or (
+        args.action == "review" and args.since is None and not args.resume) else None
+
+    labels = {"action": args.action}
+
+    def exportar():
+        exportar_metricas(False, args.metrics, args.prometheus, labels)
+
     # Ejecutar acciones
     if args.action == "review":
-        code_review_gemini(args.repo, args.owner, args.remote, args.stack)
+        code_review_gemini(args.repo, args.owner, args.remote, args.stack, args.workers, args.rpm, index, args.since,
+                           args.chunk_tokens, args.batch_tokens, args.dry_run, args.stream, args.resume,
+                           dedup_threshold=args.dedup_threshold, diff=not args.full, cache=not args.no_cache)
     elif args.action == "issue":
-        find_secrets_and_update_env(args.repo)
+        find_secrets_and_update_env(args.repo, index, args.report)
     elif args.action == "pull":
         check_pull_requests()
+        print(f"🐙 GitHub: {github.rate_summary()}")
     elif args.action == "fork":
         check_forks()
+        print(f"🐙 GitHub: {github.rate_summary()}")
     elif args.action == "commit":
         auto_commit()
-    
+    elif args.action == "export":
+        exportar_reviews(args.repo, args.output, args.path)
+    elif args.action == "serve":
+        if args.filters:
+            cargar_filtros_usuario(args.filters)
+        servir(args.workdir, args.host, args.port, args.jobs, args.queue_size, args.stack, args.workers, args.rpm,
+               exportar=exportar, chunk_tokens=args.chunk_tokens, batch_tokens=args.batch_tokens, stream=args.stream,
+               cache=not args.no_cache, dedup_threshold=args.dedup_threshold, diff=not args.full)
+    elif args.action == "org":
+        if args.filters:
+            cargar_filtros_usuario(args.filters)
+        revisar_org(args.owner, args.repos, args.workdir, args.procs, args.stack, args.workers, args.rpm,
+                    since=args.since, chunk_tokens=args.chunk_tokens, batch_tokens=args.batch_tokens,
+                    dry_run=args.dry_run, stream=args.stream, dedup_threshold=args.dedup_threshold,
+                    diff=not args.full, cache=not args.no_cache)
+    elif args.action == "watch":
+        vigilar(args.repo, args.stack, args.workers, args.rpm, args.interval, args.debounce,
+                args.chunk_tokens, args.batch_tokens, args.stream, exportar, not args.no_cache,
+                dedup_threshold=args.dedup_threshold, diff=not args.full)
+
+    exportar_metricas(args.profile, args.metrics, args.prometheus, labels)
     print("✅ Acción completada.")
 
 if __name__ == "__main__":
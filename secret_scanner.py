@@ -0,0 +1,216 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Escáner de secretos: cada patrón precompilado sobre el contenido o un mmap, repartido en procesos"""
+
+import os
+import re
+import mmap
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+SCAN_EXTENSIONS = (".py", ".js", ".env.example", ".env", ".yml", ".yaml")
+MMAP_THRESHOLD = 1024 * 1024  # archivos más grandes se leen con mmap
+SNIFF_BYTES = 8192
+PARALLEL_THRESHOLD = 200  # con menos archivos no compensa levantar procesos
+MIN_VALUE_LENGTH = 4  # evitar matches muy cortos
+
+SECRET_PATTERNS = {
+    "DATABASE_URL": r"database[_\-]?url\s*[:=]\s*[\"']?([^\"'\n]+)",
+    "PASSWORD": r"password\s*[:=]\s*[\"']?([^\"'\n]+)",
+    "USER": r"user(?:name)?\s*[:=]\s*[\"']?([^\"'\n]+)",
+    "HOST": r"host\s*[:=]\s*[\"']?([^\"'\n]+)",
+    "PORT": r"port\s*[:=]\s*[\"']?([^\"'\n]+)",
+    "API_KEY": r"api[_\-]?key\s*[:=]\s*[\"']?([^\"'\n]+)",
+    "SECRET": r"secret\s*[:=]\s*[\"']?([^\"'\n]+)"
+}
+
+
+def _literal(pattern):
+    """Prefijo literal en minúsculas con el que empieza todo match del patrón ("" si no tiene uno seguro)"""
+    m = re.match(r"([A-Za-z0-9_]+)(.?)", pattern)
+    if not m or "|" in pattern:
+        return b""
+    literal, sigue = m.groups()
+    if sigue in ("?", "*", "{"):
+        literal = literal[:-1]
+    return literal.lower().encode()
+
+
+def compile_patterns(patterns):
+    """Compila cada patrón como bytes; devuelve [(regla, regex, literal)] con el valor en el grupo 1"""
+    return [(rule, re.compile(pattern.encode(), re.IGNORECASE), _literal(pattern))
+            for rule, pattern in patterns.items()]
+
+
+SECRET_RULES = compile_patterns(SECRET_PATTERNS)
+
+
+def fingerprint(rule, rel_path, value):
+    """Huella estable del hallazgo: no cambia si el secreto se mueve de línea"""
+    return hashlib.sha256(f"{rule}\0{rel_path}\0{value}".encode()).hexdigest()[:32]
+
+
+def redact_value(value):
+    return value[:4] + "****" if len(value) > 4 else "****"
+
+
+def is_binary(fh):
+    chunk = fh.read(SNIFF_BYTES)
+    fh.seek(0)
+    return b"\0" in chunk
+
+
+def scan_file(item):
+    """
+    Escanea un archivo. item = (path, rel_path). Devuelve (rel_path, findings, error);
+    cada finding conserva línea, columna, regla, valor y huella.
+    """
+    path, rel_path = item
+    findings = []
+    try:
+        with open(path, "rb") as fh:
+            if is_binary(fh):
+                return rel_path, findings, None
+            size = os.fstat(fh.fileno()).st_size
+            if size == 0:
+                return rel_path, findings, None
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    findings = _scan_buffer(data, rel_path)
+            else:
+                findings = _scan_buffer(fh.read(), rel_path)
+    except OSError as e:
+        return rel_path, findings, str(e)
+    return rel_path, findings, None
+
+
+def scan_text(text, rel_path):
+    """Hallazgos de un contenido ya leído (mismo formato que scan_file)"""
+    return _scan_buffer(text.encode("utf-8", errors="replace"), rel_path)
+
+
+def _scan_buffer(data, rel_path):
+    """
+    Cada patrón corre con su propio finditer, así dos reglas que matchean el
+    mismo tramo (p. ej. `username: admin password: hunter2`) dan dos hallazgos.
+    En bytes, lower() es ASCII igual que IGNORECASE: si el literal inicial de
+    una regla no aparece, se saltea. Con mmap no se copia el archivo para eso.
+    """
+    lowered = data.lower() if isinstance(data, bytes) else None
+    matches = []
+    for orden, (rule, regex, literal) in enumerate(SECRET_RULES):
+        if literal and lowered is not None and literal not in lowered:
+            continue
+        for match in regex.finditer(data):
+            value = match.group(1).decode("utf-8", errors="replace").strip()
+            if len(value) >= MIN_VALUE_LENGTH:
+                matches.append((match.start(), orden, rule, value))
+    matches.sort()
+
+    findings = []
+    line = 1
+    line_start = 0
+    pos = 0
+    for start, _, rule, value in matches:
+        # mmap no tiene count: se cuentan los saltos con find, sin copiar el tramo
+        salto = data.find(b"\n", pos, start)
+        while salto != -1:
+            line += 1
+            line_start = salto + 1
+            salto = data.find(b"\n", salto + 1, start)
+        pos = start
+        findings.append({
+            "file": rel_path,
+            "line": line,
+            "column": start - line_start + 1,
+            "rule": rule,
+            "value": value,
+            "fingerprint": fingerprint(rule, rel_path, value)
+        })
+    return findings
+
+
+def scan_files(items, workers=None):
+    """
+    Escanea [(path, rel_path), ...] y devuelve (findings, errores). Con pocos
+    archivos se escanea en el proceso actual; con muchos, en un pool de procesos.
+    """
+    findings = []
+    errors = []
+    if len(items) < PARALLEL_THRESHOLD or workers == 1:
+        results = map(scan_file, items)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(scan_file, items, chunksize=64)
+    try:
+        for rel_path, file_findings, error in results:
+            if error:
+                errors.append((rel_path, error))
+            findings.extend(file_findings)
+    finally:
+        if not isinstance(results, map):
+            pool.shutdown()
+    return findings, errors
+
+
+def to_json(findings):
+    """Reporte JSON; los valores se guardan redactados"""
+    return {
+        "findings": [dict(f, value=redact_value(f["value"])) for f in findings],
+        "total": len(findings)
+    }
+
+
+def to_sarif(findings):
+    """Reporte SARIF 2.1.0 para subirlo a code scanning"""
+    rules = sorted({f["rule"] for f in findings})
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {
+                "driver": {
+                    "name": "OctoAutomator",
+                    "informationUri": "https://github.com/SPotes22/OctoAutomator",
+                    "rules": [
+                        {"id": rule, "shortDescription": {"text": f"Posible {rule} en el código"}}
+                        for rule in rules
+                    ]
+                }
+            },
+            "results": [{
+                "ruleId": f["rule"],
+                "level": "warning",
+                "message": {"text": f"Posible {f['rule']}: {redact_value(f['value'])}"},
+                "locations": [{
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": f["file"].replace(os.sep, "/")},
+                        "region": {"startLine": f["line"], "startColumn": f["column"]}
+                    }
+                }],
+                "partialFingerprints": {"octoSecret/v1": f["fingerprint"]}
+            } for f in findings]
+        }]
+    }
+
+
+def write_report(findings, path):
+    """Escribe el reporte; el formato sale de la extensión (.sarif → SARIF, otro → JSON)"""
+    report = to_sarif(findings) if path.endswith(".sarif") else to_json(findings)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,55 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Detección de stack por subárbol en monorepos"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# script lee OCTO_HOME al importarse; los tests no deben tocar la cache del usuario
+os.environ["OCTO_HOME"] = tempfile.mkdtemp(prefix="octo-tests-")
+
+import script
+
+
+def escribir(root, rel_path, contenido=""):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(contenido)
+
+
+def test_manifiesto_anidado_no_decide_por_la_raiz(tmp_path):
+    escribir(tmp_path, "package.json", '{"dependencies": {"express": "^4.18.0"}}')
+    escribir(tmp_path, "server.js", "require('express')().listen(3000)\n")
+    escribir(tmp_path, "svc/x.py", "print('hola')\n")
+    escribir(tmp_path, "apps/web/package.json", '{"dependencies": {"react": "^18.2.0"}}')
+    escribir(tmp_path, "apps/web/src/App.jsx", "export default function App() { return null }\n")
+
+    stacks = script.detectar_stacks(str(tmp_path))
+
+    assert stacks.stacks == {".": "node", "apps/web": "react"}
+    assert stacks.stack_for("svc/x.py") == "node"
+    assert stacks.stack_for("apps/web/src/App.jsx") == "react"
+
+
+def test_requirements_anidado_no_vuelve_flask_a_la_raiz(tmp_path):
+    escribir(tmp_path, "app.py", "print('no es flask')\n")
+    escribir(tmp_path, "requirements.txt", "requests\n")
+    escribir(tmp_path, "tools/requirements-dev.txt", "flask\n")
+
+    assert script.detectar_stacks(str(tmp_path)).stacks.get(".") != "flask"
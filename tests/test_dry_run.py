@@ -0,0 +1,64 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""--dry-run planifica sin escribir nada en el repo ni en OCTO_HOME"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# script lee OCTO_HOME al importarse; los tests no deben tocar la cache del usuario
+os.environ["OCTO_HOME"] = tempfile.mkdtemp(prefix="octo-tests-")
+
+import script
+
+
+def estado(*roots):
+    """{path: contenido} de todo lo que hay bajo roots"""
+    archivos = {}
+    for root in roots:
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                with open(path, "rb") as f:
+                    archivos[path] = f.read()
+    return archivos
+
+
+def test_dry_run_no_crea_el_manifest(tmp_path):
+    (tmp_path / "app.py").write_text("print('hola')\n")
+
+    script.code_review_gemini(str(tmp_path), None, None, dry_run=True)
+
+    assert not (tmp_path / "review").exists()
+
+
+def test_dry_run_no_modifica_el_estado_existente(tmp_path):
+    code = "def suma(a, b):\n    return a + b\n"
+    (tmp_path / "app.py").write_text(code)
+    (tmp_path / "otro.py").write_text("print('hola')\n")
+    review_dir = tmp_path / "review"
+    review_dir.mkdir()
+    script.ReviewManifest(str(review_dir)).close()
+    # Review de una versión anterior (un .md por archivo), que un review real importaría al store
+    (review_dir / script.review_filename_for("app.py")).write_text(
+        f"<!-- hash:{script.hash_code(code)} -->\n# Review\n")
+    antes = estado(tmp_path, script.OCTO_HOME)
+
+    script.code_review_gemini(str(tmp_path), None, None, dry_run=True)
+
+    assert estado(tmp_path, script.OCTO_HOME) == antes
@@ -0,0 +1,48 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Regresiones del escáner de secretos"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from secret_scanner import MMAP_THRESHOLD, scan_file, scan_text
+
+
+def test_secretos_superpuestos_en_una_linea():
+    findings = scan_text("x = 1\nusername: admin password: hunter2\n", "config.yml")
+    assert [(f["rule"], f["line"], f["column"]) for f in findings] == [("USER", 2, 1), ("PASSWORD", 2, 17)]
+    assert findings[1]["value"] == "hunter2"
+
+
+def test_orden_por_posicion_y_lineas(tmp_path):
+    path = tmp_path / "settings.py"
+    path.write_text("API_KEY = 'sk_live_123'\n\nDATABASE_URL = 'postgres://u:p@db/app'\n")
+    rel_path, findings, error = scan_file((str(path), "settings.py"))
+    assert error is None
+    assert [(f["rule"], f["line"]) for f in findings] == [("API_KEY", 1), ("DATABASE_URL", 3)]
+
+
+def test_archivo_grande_por_mmap(tmp_path):
+    path = tmp_path / "bundle.py"
+    relleno = "x = 1\n" * (MMAP_THRESHOLD // 6 + 1000)
+    path.write_text(relleno + 'password = "hunter22"\n')
+    assert path.stat().st_size >= MMAP_THRESHOLD
+    rel_path, findings, error = scan_file((str(path), "bundle.py"))
+    assert error is None
+    assert [(f["rule"], f["line"], f["column"]) for f in findings] == [("PASSWORD", relleno.count("\n") + 1, 1)]
@@ -0,0 +1,207 @@
+# GitSlave - herramienta de automatización
+# Copyright (C) 2025  Santiago Potes Giraldo
+#
+# Este programa es software libre: puedes redistribuirlo y/o modificarlo
+# bajo los términos de la Licencia Pública General de GNU publicada por
+# la Free Software Foundation, ya sea la versión 3 de la Licencia, o
+# (a tu elección) cualquier versión posterior.
+#
+# Este programa se distribuye con la esperanza de que sea útil,
+# pero SIN NINGUNA GARANTÍA; ni siquiera la garantía implícita de
+# COMERCIALIZACIÓN o IDONEIDAD PARA UN PROPÓSITO PARTICULAR.
+# Consulta la Licencia Pública General de GNU para más detalles.
+#
+# Deberías haber recibido una copia de la Licencia junto a este programa.
+# En caso contrario, consulta <https://www.gnu.org/licenses/>.
+
+"""Servidor de webhooks de GitHub: verifica la firma y encola el trabajo para un pool de workers"""
+
+import hmac
+import json
+import queue
+import hashlib
+import threading
+from collections import namedtuple, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEBHOOK_PATH = "/webhook"
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+MAX_BODY = 25 * 1024 * 1024  # tope de GitHub para un payload
+ZERO_SHA = "0" * 40
+PR_ACTIONS = ("opened", "reopened", "synchronize", "ready_for_review")
+
+# base: commit contra el que calcular el diff (before del push o base del PR)
+WebhookJob = namedtuple("WebhookJob", ["event", "owner", "repo", "full_name", "clone_url", "sha", "base",
+                                       "paths", "pull_number"])
+
+
+def firma(secret, body):
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verificar_firma(secret, body, signature):
+    """Compara en tiempo constante la firma X-Hub-Signature-256 del payload"""
+    return bool(signature) and hmac.compare_digest(firma(secret, body), signature)
+
+
+def _repo(payload):
+    repo = payload.get("repository") or {}
+    owner = repo.get("owner") or {}
+    return owner.get("login") or owner.get("name"), repo.get("name"), repo.get("full_name"), repo.get("clone_url")
+
+
+def job_from_push(payload):
+    """Push a una rama: archivos agregados o modificados por sus commits"""
+    after = payload.get("after")
+    if not after or after == ZERO_SHA or payload.get("deleted"):
+        return None
+    cambiados = set()
+    for commit in payload.get("commits", []):
+        cambiados.update(commit.get("added", []))
+        cambiados.update(commit.get("modified", []))
+        cambiados.difference_update(commit.get("removed", []))
+    before = payload.get("before")
+    return WebhookJob("push", *_repo(payload), after, None if before == ZERO_SHA else before,
+                      sorted(cambiados), None)
+
+
+def job_from_pull_request(payload):
+    """PR abierto o actualizado; los archivos se piden a la API al procesarlo"""
+    if payload.get("action") not in PR_ACTIONS:
+        return None
+    pr = payload.get("pull_request") or {}
+    if pr.get("draft"):
+        return None
+    return WebhookJob("pull_request", *_repo(payload), pr.get("head", {}).get("sha"),
+                      pr.get("base", {}).get("sha"), None, pr.get("number"))
+
+
+def parse_event(event, payload):
+    """WebhookJob del evento, o None si no hay nada que revisar"""
+    if event == "push":
+        return job_from_push(payload)
+    if event == "pull_request":
+        return job_from_pull_request(payload)
+    return None
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """
+    Recibe webhooks y los deja en una cola acotada que drenan `workers` hilos
+    llamando a procesar(job). Los trabajos de un mismo repo se ejecutan de a
+    uno (comparten checkout y manifest); repos distintos van en paralelo.
+    Con la cola llena responde 503 para que GitHub reintente la entrega.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, secret, procesar, workers=2, queue_size=100):
+        super().__init__(address, WebhookHandler)
+        self.secret = secret
+        self.procesar = procesar
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.encolados = set()  # (repo, sha) en cola: GitHub puede reenviar la misma entrega
+        self.repo_locks = defaultdict(threading.Lock)
+        self.lock = threading.Lock()
+        self.counters = {"received": 0, "rejected": 0, "ignored": 0, "queued": 0, "duplicated": 0,
+                         "full": 0, "done": 0, "failed": 0}
+        self.workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, workers))]
+        for worker in self.workers:
+            worker.start()
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    def encolar(self, job):
+        """'queued', 'duplicated' o 'full'"""
+        key = (job.full_name, job.sha)
+        with self.lock:
+            if key in self.encolados:
+                return "duplicated"
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                return "full"
+            self.encolados.add(key)
+        return "queued"
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            try:
+                with self.repo_locks[job.full_name]:
+                    self.procesar(job)
+                self.count("done")
+            except Exception as e:
+                print(f"❌ Error procesando {job.event} de {job.full_name}@{(job.sha or '')[:12]}: {e}")
+                self.count("failed")
+            finally:
+                with self.lock:
+                    self.encolados.discard((job.full_name, job.sha))
+                self.queue.task_done()
+
+    def detener(self):
+        """Deja de aceptar requests y espera a que los workers terminen lo encolado"""
+        self.shutdown()
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.server_close()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send_json(200, {"in_queue": self.server.queue.qsize(), **self.server.counters})
+        self._send_json(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        if self.path != WEBHOOK_PATH:
+            return self._send_json(404, {"message": "Not Found"})
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY:
+            self.close_connection = True
+            return self._send_json(413, {"message": "Payload demasiado grande"})
+        body = self.rfile.read(length)
+        self.server.count("received")
+
+        if not verificar_firma(self.server.secret, body, self.headers.get(SIGNATURE_HEADER)):
+            self.server.count("rejected")
+            return self._send_json(401, {"message": "Firma inválida"})
+
+        event = self.headers.get("X-GitHub-Event", "")
+        if event == "ping":
+            return self._send_json(200, {"message": "pong"})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._send_json(400, {"message": "JSON inválido"})
+
+        job = parse_event(event, payload)
+        if job is None or not job.full_name or not job.sha:
+            self.server.count("ignored")
+            return self._send_json(200, {"message": f"Evento {event} ignorado"})
+
+        result = self.server.encolar(job)
+        self.server.count(result)
+        if result == "full":
+            return self._send_json(503, {"message": "Cola llena, reintentar más tarde"})
+        print(f"📥 {event} de {job.full_name}@{job.sha[:12]}: {result}")
+        self._send_json(202, {"message": result, "repo": job.full_name, "sha": job.sha})